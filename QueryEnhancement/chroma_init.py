@@ -1,89 +1,310 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
 import os
 import glob
 import shutil
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import chromadb
-from chromadb.config import Settings
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from chunking import split_markdown_sections
+from embedding_cache import DEFAULT_EMBED_CACHE, EmbeddingCache
+from onnx_backend import BACKENDS, backend_model_key
+from lexical_index import LexicalIndexBuilder, lexical_index_path
+from technique_metadata import METADATA_VERSION, extract_metadata
+
+Record = Tuple[str, str, Dict[str, Any]]  # (id, text, metadata)
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def _doc_id(filename: str, digest: str) -> str:
+    # Stable, content-addressed ID: unchanged files keep their ID across rebuilds,
+    # edited files get a new one (and the old entry is deleted by --incremental).
+    return f"{filename}:{digest}"
+
+def iter_markdown_files(folders: Iterable[str]) -> Iterator[Record]:
+    """
+    Lazily read *.md files (one at a time) as (stable_id, text, metadata).
+    Metadata includes the technique fields from technique_metadata (family,
+    linked SCs, status flags, technology) used for pre-filtered search.
+    """
+    for folder in folders:
+        for p in sorted(glob.glob(os.path.join(folder, "*.md"))):
+            with open(p, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+            name = os.path.basename(p)
+            digest = _content_hash(text)
+            _id = _doc_id(name, digest)
+            yield _id, text, {
+                "filename": name,
+                "path": os.path.abspath(p),
+                "n_chars": len(text),
+                "content_hash": digest,
+                "parent_id": _id,
+                **extract_metadata(name, text),
+            }
 
 def load_markdown_files(folder: str):
-    paths = sorted(glob.glob(os.path.join(folder, "*.md")))
-    docs = []
-    metadatas = []
-    for i, p in enumerate(paths):
-        with open(p, "r", encoding="utf-8", errors="ignore") as f:
-            text = f.read()
+    ids, docs, metadatas = [], [], []
+    for _id, text, meta in iter_markdown_files([folder]):
+        ids.append(_id)
         docs.append(text)
-        metadatas.append({
-            "filename": os.path.basename(p),
-            "path": os.path.abspath(p),
-            "n_chars": len(text),
-        })
-    ids = [str(i) for i in range(len(docs))]
+        metadatas.append(meta)
     return ids, docs, metadatas
 
+def chunk_record(record: Record, max_chars: int = 1200) -> List[Record]:
+    """
+    Expand a whole document into heading-level passages. Each passage keeps the
+    parent's metadata plus `parent_id` (the document's stable ID), `section`
+    and `chunk_index`; passage IDs are "<parent_id>#<n>".
+    """
+    _id, text, meta = record
+    out: List[Record] = []
+    for n, chunk in enumerate(split_markdown_sections(text, max_chars=max_chars)):
+        out.append((f"{_id}#{n}", chunk["text"], {
+            **meta,
+            "parent_id": _id,
+            "section": chunk["section"],
+            "chunk_index": n,
+            "n_chars": len(chunk["text"]),
+        }))
+    return out
+
+def existing_parents(collection, outdated: Optional[set] = None) -> Dict[str, str]:
+    """
+    Map every entry ID in the collection to its parent document ID. Parents of
+    entries written with an older metadata schema are added to `outdated`, so
+    they get re-written even though their content is unchanged.
+    """
+    got = collection.get(include=["metadatas"])
+    parents: Dict[str, str] = {}
+    for _id, meta in zip(got.get("ids", []), got.get("metadatas") or []):
+        meta = meta or {}
+        parents[_id] = meta.get("parent_id", _id)
+        if outdated is not None and meta.get("meta_version") != METADATA_VERSION:
+            outdated.add(parents[_id])
+    return parents
+
+def iter_records(folders: Iterable[str], chunking: str = "document", max_chars: int = 1200,
+                 skip_parents: Optional[set] = None, seen: Optional[set] = None,
+                 lexical: Optional[LexicalIndexBuilder] = None) -> Iterator[Record]:
+    """
+    Stream the records to index. Documents whose stable ID is in `skip_parents`
+    (already indexed, unchanged) are not yielded; every document ID read is
+    added to `seen` so the caller can work out which entries were removed.
+    Every entry, skipped or not, is added to the `lexical` index builder so it
+    always covers the whole corpus.
+    """
+    for record in iter_markdown_files(folders):
+        if seen is not None:
+            seen.add(record[0])
+        entries = chunk_record(record, max_chars=max_chars) if chunking == "section" else [record]
+        if lexical is not None:
+            for entry in entries:
+                lexical.add(*entry)
+        if skip_parents and record[0] in skip_parents:
+            continue
+        yield from entries
+
+def _batched(records: Iterator[Record], size: int) -> Iterator[List[Record]]:
+    batch: List[Record] = []
+    for r in records:
+        batch.append(r)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# -------- embedding workers --------
+_worker_model = None
+
+def _init_embed_worker(model_name: str, threads: int, backend: str = "torch") -> None:
+    global _worker_model
+    if backend == "onnx-int8":
+        from onnx_backend import OnnxEmbedder
+        _worker_model = OnnxEmbedder(model_name, threads=threads)
+        return
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    st = SentenceTransformer(model_name)
+    # Same settings as chromadb's SentenceTransformerEmbeddingFunction used at query time
+    _worker_model = lambda texts: st.encode(texts, convert_to_numpy=True, normalize_embeddings=False).tolist()
+
+def _embed_texts(texts: List[str]) -> List[List[float]]:
+    return _worker_model(texts)
+
+def ingest(collection, records: Iterator[Record], model_name: str, workers: int = 1,
+           batch_size: int = 64, max_inflight: Optional[int] = None,
+           cache: Optional[EmbeddingCache] = None, backend: str = "torch") -> int:
+    """
+    Streaming ingest: records are read lazily, batches are embedded by a pool of
+    worker processes, and the main process writes precomputed embeddings to
+    Chroma. At most `max_inflight` batches are pending at once, so memory stays
+    bounded and the reader blocks (backpressure) while the pool is saturated.
+    With a `cache`, only texts missing from it are sent to the workers.
+    Returns the number of records written.
+    """
+    workers = max(1, workers)
+    max_inflight = max_inflight or workers * 2
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    written = 0
+    cache_hits = 0
+    t0 = time.perf_counter()
+
+    def write(batch: List[Record], embeddings: List[List[float]]) -> None:
+        nonlocal written
+        collection.upsert(
+            ids=[r[0] for r in batch],
+            documents=[r[1] for r in batch],
+            metadatas=[r[2] for r in batch],
+            embeddings=embeddings,
+        )
+        written += len(batch)
+        elapsed = time.perf_counter() - t0
+        print(f"[ingest] {written} docs, {written / elapsed:.1f} docs/s")
+
+    def submit(pool, batch: List[Record]):
+        nonlocal cache_hits
+        texts = [r[1] for r in batch]
+        cached = cache.get_many(texts) if cache else {}
+        cache_hits += len(cached)
+        misses = [i for i in range(len(texts)) if i not in cached]
+        # Workers are started on first submit, so a fully cached rebuild never loads the model
+        fut = pool.submit(_embed_texts, [texts[i] for i in misses]) if misses else None
+        return batch, cached, misses, fut
+
+    def finish(batch: List[Record], cached: Dict[int, List[float]], misses: List[int], fut) -> None:
+        vectors = fut.result() if fut else []
+        if cache and misses:
+            cache.put_many([batch[i][1] for i in misses], vectors)
+        embeddings = [cached.get(i) for i in range(len(batch))]
+        for i, v in zip(misses, vectors):
+            embeddings[i] = v
+        write(batch, embeddings)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_embed_worker,
+                             initargs=(model_name, threads, backend)) as pool:
+        pending = deque()
+        for batch in _batched(records, batch_size):
+            if len(pending) >= max_inflight:
+                finish(*pending.popleft())
+            pending.append(submit(pool, batch))
+        while pending:
+            finish(*pending.popleft())
+    if cache:
+        print(f"[embed-cache] {cache_hits}/{written} embeddings served from cache")
+    return written
+
 def main():
     parser = argparse.ArgumentParser(description="Build local ChromaDB from wcag_techniques/*.md")
-    parser.add_argument("--folder", default="wcag_techniques", help="Folder containing .md files")
+    parser.add_argument("--folder", nargs="+", default=["wcag_techniques"],
+                        help="Folder(s) containing .md files (e.g. techniques + Understanding docs)")
     parser.add_argument("--persist", default="./wcag_chroma", help="Chroma persist directory")
     parser.add_argument("--collection", default="wcag_docs", help="Collection name")
     parser.add_argument("--reset", action="store_true", help="Delete and rebuild persist dir")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed new/changed files (entries of removed/changed files are "
+                             "deleted on every run)")
+    parser.add_argument("--chunking", choices=["document", "section"], default="document",
+                        help="Index whole files, or ##/### sections with a parent-document pointer")
+    parser.add_argument("--max-chunk-chars", type=int, default=1200, help="Split longer sections on paragraphs")
     parser.add_argument("--model", default="all-MiniLM-L6-v2", help="SentenceTransformer model")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="Embedding inference backend (onnx-int8 needs optimum[onnxruntime])")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding worker processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per embedding batch")
+    parser.add_argument("--embed-cache", default=DEFAULT_EMBED_CACHE, help="On-disk embedding cache (SQLite)")
+    parser.add_argument("--no-embed-cache", action="store_true", help="Always re-embed; don't read/write the cache")
     args = parser.parse_args()
 
     if args.reset and os.path.isdir(args.persist):
         print(f"[reset] removing existing persist dir: {args.persist}")
         shutil.rmtree(args.persist)
 
-    # Local, persistent Chroma client
+    # Local, persistent Chroma client (imported here so --help stays instant)
+    import chromadb
+    from chromadb.config import Settings
     client = chromadb.PersistentClient(
         path=args.persist,
         settings=Settings(anonymized_telemetry=False)
     )
 
-    # Local embedding function (runs on CPU; no internet required)
-    embed_fn = SentenceTransformerEmbeddingFunction(model_name=args.model)
-
-    # Create or get the collection
+    # Create or get the collection. Embeddings are computed by the ingest workers
+    # (same SentenceTransformer model the query side uses), so no embedding
+    # function is loaded in this process.
     collection = client.get_or_create_collection(
         name=args.collection,
-        embedding_function=embed_fn,
-        metadata={"source": "wcag_techniques"}
+        embedding_function=None,
+        metadata={"source": ",".join(os.path.basename(os.path.normpath(f)) for f in args.folder),
+                  "granularity": args.chunking, "embed_backend": args.backend}
     )
+    granularity = (collection.metadata or {}).get("granularity", "document")
+    if granularity != args.chunking:
+        raise SystemExit(
+            f"Collection '{args.collection}' was built with --chunking {granularity}; "
+            f"use --reset or another --collection to index with --chunking {args.chunking}"
+        )
 
-    # Load all .md files
-    ids, docs, metadatas = load_markdown_files(args.folder)
-    if not ids:
-        print(f"No .md files found in {args.folder}")
+    t0 = time.perf_counter()
+    # Existing entries are always collected: whatever the corpus no longer
+    # produces (edited / deleted files, pre-content-ID entries) is deleted below
+    outdated: set = set()
+    existing = existing_parents(collection, outdated)
+    seen: set = set()
+    lexical = LexicalIndexBuilder()
+    records = iter_records(
+        args.folder,
+        chunking=args.chunking,
+        max_chars=args.max_chunk_chars,
+        skip_parents=set(existing.values()) - outdated if args.incremental else None,
+        seen=seen,
+        lexical=lexical,
+    )
+
+    print(f"Indexing {', '.join(args.folder)} -> {args.collection} "
+          f"({args.workers} worker(s), batch {args.batch_size})")
+    cache = None if args.no_embed_cache else EmbeddingCache(
+        backend_model_key(args.model, args.backend), path=args.embed_cache)
+    written = ingest(collection, records, args.model, workers=args.workers,
+                     batch_size=args.batch_size, cache=cache, backend=args.backend)
+
+    if not seen:
+        print(f"No .md files found in {', '.join(args.folder)}")
         return
 
-    # Clear previous contents if rebuilding same collection without --reset
-    # (Optional) Uncomment to always replace contents:
-    # existing = collection.count()
-    # if existing:
-    #     print(f"[info] Clearing existing {existing} items in collection '{args.collection}'")
-    #     collection.delete(where={})  # delete all
-
-    print(f"Indexing {len(ids)} documents from {args.folder} -> {args.collection}")
-    # Add in batches (safer for large sets)
-    B = 256
-    for start in range(0, len(ids), B):
-        end = start + B
-        collection.add(
-            ids=ids[start:end],
-            documents=docs[start:end],
-            metadatas=metadatas[start:end],
-        )
+    stale = sorted(_id for _id, parent in existing.items() if parent not in seen)
+    for start in range(0, len(stale), 256):
+        collection.delete(ids=stale[start:start + 256])
+    if stale:
+        print(f"[cleanup] {len(stale)} stale entries removed")
+    if args.incremental:
+        unchanged = len(seen & (set(existing.values()) - outdated))
+        print(f"[incremental] {len(seen) - unchanged} new/changed, {unchanged} unchanged")
+
+    if written or stale:
+        # New index version: invalidates semantic query caches built on the old contents
+        collection.modify(metadata={**(collection.metadata or {}), "index_version": uuid.uuid4().hex[:12]})
+
+    lex_path = lexical_index_path(args.persist, args.collection)
+    lexical.save(lex_path)
+    print(f"[lexical] BM25 + technique/SC lookup index over {len(lexical.ids)} entries -> {lex_path}")
 
-    print(f"Done. Persisted to: {os.path.abspath(args.persist)}")
+    elapsed = time.perf_counter() - t0
+    print(f"Done: {written} entries in {elapsed:.2f}s ({written / max(elapsed, 1e-9):.1f} docs/s). "
+          f"Persisted to: {os.path.abspath(args.persist)}")
     print(f"Collection '{args.collection}' count: {collection.count()}")
 
     # Quick sanity check: peek a couple of docs
-    sample = collection.get(ids=["0"]) if len(ids) > 0 else None
+    sample = collection.get(limit=1)
     if sample and sample.get("documents"):
-        print("\n[peek] ID=0")
+        print(f"\n[peek] ID={sample['ids'][0]}")
         print("filename:", sample["metadatas"][0]["filename"])
         print("chars:", sample["metadatas"][0]["n_chars"])
         print("preview:", (sample["documents"][0][:200] + "...").replace("\n", " "))
@@ -0,0 +1,87 @@
+# chunking.py
+"""
+Heading-aware chunking for the WCAG technique markdown.
+
+Each technique file is split on its ## / ### sections ("Description",
+"Examples > Example 1: ...", "Tests > Procedure", ...). Every chunk is
+prefixed with the technique title and its heading path so a passage still
+says which technique and section it came from once it is embedded on its own.
+Sections longer than max_chars are split further on paragraph boundaries
+(code fences are never split on a heading).
+"""
+from __future__ import annotations
+import re
+from typing import Any, Dict, List
+
+_HEADING = re.compile(r"^(#{1,3})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+def _split_long(body: str, max_chars: int) -> List[str]:
+    if len(body) <= max_chars:
+        return [body]
+    parts: List[str] = []
+    cur = ""
+    for para in re.split(r"\n\s*\n", body):
+        para = para.strip()
+        if not para:
+            continue
+        if cur and len(cur) + len(para) + 2 > max_chars:
+            parts.append(cur)
+            cur = ""
+        # A single oversized paragraph (long code block) is hard-wrapped.
+        while len(para) > max_chars:
+            parts.append(para[:max_chars])
+            para = para[max_chars:]
+        cur = f"{cur}\n\n{para}" if cur else para
+    if cur:
+        parts.append(cur)
+    return parts
+
+def split_markdown_sections(text: str, max_chars: int = 1200) -> List[Dict[str, Any]]:
+    """
+    Returns a list of {"section": str, "text": str} in document order.
+    `section` is the heading path (e.g. "Examples > Example 1: ..."); `text`
+    is the passage to embed, prefixed with the title and heading path.
+    """
+    title = ""
+    path: List[str] = []          # [h2, h3]
+    sections: List[tuple] = []     # (heading path, body lines)
+    body: List[str] = []
+    in_fence = False
+
+    def flush():
+        chunk = "\n".join(body).strip()
+        if chunk:
+            sections.append((" > ".join(path), chunk))
+        body.clear()
+
+    for line in text.splitlines():
+        if _FENCE.match(line):
+            in_fence = not in_fence
+            body.append(line)
+            continue
+        m = None if in_fence else _HEADING.match(line)
+        if not m:
+            body.append(line)
+            continue
+        level, heading = len(m.group(1)), m.group(2)
+        flush()
+        if level == 1:
+            title = heading
+            path = []
+        elif level == 2:
+            path = [heading]
+        else:
+            path = path[:1] + [heading]
+
+    flush()
+
+    chunks: List[Dict[str, Any]] = []
+    for section, chunk in sections:
+        header = "\n".join(h for h in (title, section) if h)
+        for part in _split_long(chunk, max_chars):
+            chunks.append({
+                "section": section,
+                "text": f"{header}\n\n{part}" if header else part,
+            })
+    return chunks
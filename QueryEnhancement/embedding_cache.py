@@ -0,0 +1,67 @@
+# embedding_cache.py
+"""
+Persistent embedding cache shared by the index builder (chroma_init.py) and the
+query path (QueryEnhancement). Vectors are keyed by (model name, text hash) and
+stored as float32 in a DiskLRUCache, so re-indexing unchanged text and
+repeating a query never touch the model.
+"""
+from __future__ import annotations
+import os
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskLRUCache, text_hash
+
+DEFAULT_EMBED_CACHE = os.path.join(DEFAULT_CACHE_DIR, "embeddings.sqlite")
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, path: str = DEFAULT_EMBED_CACHE, max_entries: int = 200_000):
+        self.model_name = model_name
+        self.store = DiskLRUCache(path, namespace="embeddings", max_entries=max_entries)
+
+    def _key(self, text: str) -> str:
+        return text_hash(self.model_name, text)
+
+    def get_many(self, texts: Sequence[str]) -> Dict[int, List[float]]:
+        """Returns {position_in_texts: vector} for the texts that are cached."""
+        keys = [self._key(t) for t in texts]
+        found = self.store.get_many(keys)
+        return {
+            i: array("f", found[k]).tolist()
+            for i, k in enumerate(keys) if k in found
+        }
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        self.store.put_many({
+            self._key(t): array("f", v).tobytes() for t, v in zip(texts, vectors)
+        })
+
+class CachedEmbeddingFunction:
+    """
+    Chroma-compatible embedding function: serves cached vectors and sends only
+    the misses, as one batch, to the wrapped embedding function. The wrapped
+    function is built on first miss, so a fully cached query never loads the model.
+    """
+    def __init__(self, factory: Callable[[], Any], cache: EmbeddingCache):
+        self._factory = factory
+        self._inner: Optional[Any] = None
+        self.cache = cache
+
+    def load(self) -> None:
+        """Build the wrapped embedding function now (e.g. to warm a server)."""
+        if self._inner is None:
+            self._inner = self._factory()
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        texts = list(input)
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        for i, vec in self.cache.get_many(texts).items():
+            out[i] = vec
+        misses = [i for i, v in enumerate(out) if v is None]
+        if misses:
+            self.load()
+            vectors = [list(map(float, v)) for v in self._inner([texts[i] for i in misses])]
+            for i, v in zip(misses, vectors):
+                out[i] = v
+            self.cache.put_many([texts[i] for i in misses], vectors)
+        return out
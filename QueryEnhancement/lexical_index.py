@@ -0,0 +1,142 @@
+# lexical_index.py
+"""
+In-memory lexical index over the WCAG corpus, built by chroma_init.py next to
+the Chroma collection (<persist>/<collection>.lexical.json).
+
+- BM25 over the same entries as the collection (documents or passages), used by
+  QueryEnhancement as an extra ranking in the fusion.
+- Lookup tables: technique ID ("C12", "ARIA14") -> document, and success
+  criterion number ("1.4.4") / name ("resize text") -> linked documents. A query
+  that is nothing but IDs (e.g. "ARIA14", "1.4.4 Resize Text", "C12 and G18")
+  is answered from these tables without any dense search.
+"""
+from __future__ import annotations
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+_STOP = frozenset(
+    "a an and are as at be by can for from has have in is it its of on or that the this "
+    "to was were which with not no".split()
+)
+_TECHNIQUE_ID = re.compile(r"\b(ARIA|PDF|SCR|SVR|SM|C|F|G|H|T)(\d{1,3})\b", re.I)
+_SC_NUMBER = re.compile(r"\b([1-4]\.\d{1,2}\.\d{1,2})\b")
+_SC_LINK = re.compile(r"\[([1-4]\.\d{1,2}\.\d{1,2}):\s*([^\]]+)\]")
+_FILLER = re.compile(r"\b(and|or|technique|techniques|sc|success|criterion|criteria|wcag)\b|[\s,;:/&+()\-]+", re.I)
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOP]
+
+def lexical_index_path(persist_dir: str, collection: str) -> str:
+    return os.path.join(persist_dir, f"{collection}.lexical.json")
+
+class LexicalIndexBuilder:
+    def __init__(self):
+        self.ids: List[str] = []
+        self.parents: List[str] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[List[int]]] = defaultdict(list)
+        self.technique_ids: Dict[str, str] = {}
+        self.sc_docs: Dict[str, List[str]] = defaultdict(list)
+        self.sc_names: Dict[str, str] = {}
+        self.paths: Dict[str, str] = {}
+
+    def add(self, _id: str, text: str, meta: Dict[str, Any]) -> None:
+        parent = meta.get("parent_id", _id)
+        n = len(self.ids)
+        self.ids.append(_id)
+        self.parents.append(parent)
+        tokens = tokenize(text)
+        self.lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings[term].append([n, tf])
+
+        if parent in self.paths:          # ID tables are per document, not per passage
+            return
+        self.paths[parent] = meta.get("path", "")
+        stem = os.path.splitext(meta.get("filename", ""))[0].upper()
+        if _TECHNIQUE_ID.fullmatch(stem):
+            self.technique_ids[stem] = parent
+        for number, name in _SC_LINK.findall(text):
+            if parent not in self.sc_docs[number]:
+                self.sc_docs[number].append(parent)
+            self.sc_names.setdefault(name.strip().lower(), number)
+
+    def save(self, path: str) -> None:
+        payload = {
+            "ids": self.ids, "parents": self.parents, "lengths": self.lengths,
+            "postings": self.postings, "technique_ids": self.technique_ids,
+            "sc_docs": self.sc_docs, "sc_names": self.sc_names, "paths": self.paths,
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+class LexicalIndex:
+    def __init__(self, payload: Dict[str, Any], k1: float = 1.5, b: float = 0.75):
+        self.ids: List[str] = payload["ids"]
+        self.parents: List[str] = payload["parents"]
+        self.lengths: List[int] = payload["lengths"]
+        self.postings: Dict[str, List[List[int]]] = payload["postings"]
+        self.technique_ids: Dict[str, str] = payload["technique_ids"]
+        self.sc_docs: Dict[str, List[str]] = payload["sc_docs"]
+        self.sc_names: Dict[str, str] = payload["sc_names"]
+        self.paths: Dict[str, str] = payload["paths"]
+        self.k1, self.b = k1, b
+        self.avgdl = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        n = len(self.ids)
+        self.idf = {
+            t: math.log(1.0 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self.postings.items()
+        }
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def search(self, query: str, k: int = 40) -> List[Tuple[str, float]]:
+        """BM25 top-k over the indexed entries: [(entry_id, score)], best first."""
+        scores: Dict[int, float] = defaultdict(float)
+        k1, b, avgdl = self.k1, self.b, self.avgdl or 1.0
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for n, tf in self.postings[term]:
+                dl = self.lengths[n]
+                scores[n] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [(self.ids[n], s) for n, s in top]
+
+    def exact_lookup(self, query: str) -> Optional[List[str]]:
+        """
+        If the query is only technique IDs and/or SC numbers (optionally with the
+        SC's name), return the matching document IDs in query order; else None.
+        """
+        q = query or ""
+        found: List[str] = []
+        for m in _TECHNIQUE_ID.finditer(q):
+            doc = self.technique_ids.get(f"{m.group(1)}{m.group(2)}".upper())
+            if doc is None:
+                return None
+            found.append(doc)
+        # Cut out whole matches only (a plain replace of "C1" would also eat the start of "C12")
+        rest = _SC_NUMBER.sub(" ", _TECHNIQUE_ID.sub(" ", q))
+        for number in _SC_NUMBER.findall(q):
+            docs = self.sc_docs.get(number)
+            if not docs:
+                return None
+            found.extend(docs)
+            for name, num in self.sc_names.items():
+                if num == number:
+                    rest = re.sub(re.escape(name), " ", rest, flags=re.I)
+        if not found or _FILLER.sub("", rest).strip():
+            return None
+        return list(dict.fromkeys(found))
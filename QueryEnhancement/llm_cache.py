@@ -0,0 +1,81 @@
+# llm_cache.py
+"""
+Content-addressed cache for LLM responses, shared by StepBackPrompter,
+QueryRewriter and UpdateInitProfile.
+
+Entries are keyed by (model, prompt template version, canonical JSON of the
+input the prompt is built from), so an identical profile with the same model
+and prompt skips the chat-completions round trip. Bump a caller's template
+version whenever its prompt text changes. Entries expire after `ttl_s` and
+the store is size-bounded (LRU) via DiskLRUCache.
+
+    cache = LLMResponseCache()
+    plan = cache.cached_call("gpt-5", "step_back@1", profile, lambda: call_model(profile))
+
+shared_cache(path) returns one process-wide instance per path, for callers
+created per request (the retrieval server builds a prompter/rewriter per run).
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskLRUCache, text_hash
+
+DEFAULT_LLM_CACHE = os.path.join(DEFAULT_CACHE_DIR, "llm_responses.sqlite")
+DEFAULT_LLM_TTL_S = 7 * 24 * 3600
+
+def canonical_json(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+class LLMResponseCache:
+    def __init__(self, path: str = DEFAULT_LLM_CACHE, ttl_s: Optional[float] = DEFAULT_LLM_TTL_S,
+                 max_entries: int = 10_000):
+        self.ttl_s = ttl_s
+        self.store = DiskLRUCache(path, namespace="llm_responses", max_entries=max_entries)
+
+    @staticmethod
+    def key(model: str, template: str, payload: Any) -> str:
+        return text_hash(model, template, canonical_json(payload))
+
+    def get(self, model: str, template: str, payload: Any) -> Optional[Any]:
+        raw = self.store.get(self.key(model, template, payload))
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        if self.ttl_s is not None and time.time() - entry["t"] > self.ttl_s:
+            return None   # expired; overwritten by the next put
+        return entry["v"]
+
+    def put(self, model: str, template: str, payload: Any, response: Any) -> None:
+        entry = {"t": time.time(), "v": response}
+        self.store.put(self.key(model, template, payload), canonical_json(entry).encode("utf-8"))
+
+    def cached_call(self, model: str, template: str, payload: Any, call: Callable[[], Any],
+                    bypass: bool = False) -> Any:
+        """
+        Return the cached response for (model, template, payload), or run
+        `call()` and store its (JSON-serializable) result. bypass=True skips the
+        lookup but still stores the fresh response.
+        """
+        if not bypass:
+            hit = self.get(model, template, payload)
+            if hit is not None:
+                print(f"[llm-cache] hit {template} ({model})")
+                return hit
+        response = call()
+        self.put(model, template, payload, response)
+        return response
+
+_SHARED: Dict[str, LLMResponseCache] = {}
+_SHARED_LOCK = threading.Lock()
+
+def shared_cache(path: str = DEFAULT_LLM_CACHE) -> LLMResponseCache:
+    """One LLMResponseCache (one SQLite connection) per path for the whole process."""
+    with _SHARED_LOCK:
+        cache = _SHARED.get(path)
+        if cache is None:
+            cache = _SHARED[path] = LLMResponseCache(path)
+        return cache
@@ -0,0 +1,127 @@
+# model_registry.py
+"""
+Process-wide registry for the embedding model and the cross-encoder.
+
+Each (kind, model name) is loaded at most once per process and shared by every
+QueryEnhancement instance, rerank_docs and the retrieval server. Callers hold a
+SharedModel handle rather than the model itself, so unload_idle() can drop a
+model to free memory and the next call through any handle simply reloads it.
+Calls through a handle are serialized per model (HF fast tokenizers are not
+safe to use from several threads at once).
+
+    embed_fn = get_embedder("all-MiniLM-L6-v2")        # chroma-compatible callable
+    ce = get_cross_encoder("cross-encoder/ms-marco-MiniLM-L-6-v2", backend="onnx-int8")
+    scores = ce.predict(pairs)
+    unload_idle(600)                                    # free models unused for 10 min
+"""
+from __future__ import annotations
+import gc
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from onnx_backend import BACKENDS
+
+def _load_embedder(name: str, backend: str) -> Any:
+    if backend == "onnx-int8":
+        from onnx_backend import OnnxEmbedder
+        return OnnxEmbedder(name)
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+    return SentenceTransformerEmbeddingFunction(model_name=name)
+
+def _load_cross_encoder(name: str, backend: str) -> Any:
+    if backend == "onnx-int8":
+        from onnx_backend import OnnxCrossEncoder
+        return OnnxCrossEncoder(name)
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(name, trust_remote_code=True)
+
+_LOADERS: Dict[str, Callable[[str, str], Any]] = {
+    "embedder": _load_embedder,
+    "cross-encoder": _load_cross_encoder,
+}
+
+class _Slot:
+    __slots__ = ("model", "lock", "last_used")
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+_registry_lock = threading.Lock()
+_slots: Dict[Tuple[str, str, str], _Slot] = {}
+
+def _slot(kind: str, name: str, backend: str) -> _Slot:
+    key = (kind, name, backend)
+    with _registry_lock:
+        slot = _slots.get(key)
+        if slot is None:
+            t0 = time.perf_counter()
+            slot = _slots[key] = _Slot(_LOADERS[kind](name, backend))
+            print(f"[models] loaded {kind} {name} ({backend}) in {time.perf_counter() - t0:.2f}s")
+        slot.last_used = time.monotonic()
+        return slot
+
+class SharedModel:
+    def __init__(self, kind: str, name: str, backend: str = "torch"):
+        if kind not in _LOADERS:
+            raise ValueError(f"model_registry: unknown model kind {kind!r}")
+        if backend not in BACKENDS:
+            raise ValueError(f"model_registry: unknown backend {backend!r} (expected one of {BACKENDS})")
+        self.kind = kind
+        self.name = name
+        self.backend = backend
+
+    def load(self) -> "SharedModel":
+        _slot(self.kind, self.name, self.backend)
+        return self
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        slot = _slot(self.kind, self.name, self.backend)
+        with slot.lock:
+            return slot.model(input)
+
+    def predict(self, pairs, **kwargs):
+        slot = _slot(self.kind, self.name, self.backend)
+        with slot.lock:
+            return slot.model.predict(pairs, **kwargs)
+
+def get_embedder(name: str, backend: str = "torch") -> SharedModel:
+    return SharedModel("embedder", name, backend)
+
+def get_cross_encoder(name: str, backend: str = "torch") -> SharedModel:
+    return SharedModel("cross-encoder", name, backend)
+
+def loaded() -> List[Tuple[str, str, str]]:
+    with _registry_lock:
+        return list(_slots)
+
+def unload(kind: str, name: str, backend: str = "torch") -> bool:
+    with _registry_lock:
+        dropped = _slots.pop((kind, name, backend), None) is not None
+    if dropped:
+        gc.collect()
+    return dropped
+
+def unload_idle(max_idle_s: float) -> List[Tuple[str, str, str]]:
+    """Drop every model not used for `max_idle_s` seconds; returns what was unloaded."""
+    now = time.monotonic()
+    with _registry_lock:
+        idle = [k for k, s in _slots.items() if now - s.last_used > max_idle_s and not s.lock.locked()]
+        for k in idle:
+            del _slots[k]
+    if idle:
+        gc.collect()
+        print(f"[models] unloaded idle: {', '.join(f'{n} ({b})' for _, n, b in idle)}")
+    return idle
+
+def start_idle_reaper(max_idle_s: float, interval_s: float = 60.0) -> threading.Thread:
+    """Background daemon thread calling unload_idle(max_idle_s) every interval_s."""
+    def loop():
+        while True:
+            time.sleep(interval_s)
+            unload_idle(max_idle_s)
+    t = threading.Thread(target=loop, name="model-reaper", daemon=True)
+    t.start()
+    return t
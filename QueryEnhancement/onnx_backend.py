@@ -0,0 +1,187 @@
+# onnx_backend.py
+"""
+int8-quantized ONNX Runtime backend for the embedder and the cross-encoder
+(CPU-only boxes). Models are exported from the Hugging Face checkpoint with
+optimum on first use, dynamically quantized to int8, and kept under
+DEFAULT_ONNX_DIR so later loads are just an InferenceSession.
+
+Requires: pip install "optimum[onnxruntime]"
+
+Select it with QueryEnhancement(backend="onnx-int8") / chroma_init.py --backend onnx-int8.
+benchmarks/bench_onnx.py checks ranking agreement against the fp32 PyTorch path
+and compares throughput and RSS.
+"""
+from __future__ import annotations
+import json
+import os
+import platform
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from disk_cache import DEFAULT_CACHE_DIR
+
+BACKENDS = ("torch", "onnx-int8")
+DEFAULT_ONNX_DIR = os.path.join(DEFAULT_CACHE_DIR, "onnx")
+_QUANTIZED_FILE = "model_quantized.onnx"
+
+def backend_model_key(model_name: str, backend: str) -> str:
+    """Cache key for a model under a backend (fp32 torch keeps the bare name)."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def _quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """Exclusive inter-process lock on `path` (ingest workers and the server may export at once)."""
+    with open(path, "a+b") as f:
+        try:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        except ImportError:   # Windows
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            try:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            except ImportError:
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def export_quantized(model_name: str, task: str, out_root: str = DEFAULT_ONNX_DIR) -> str:
+    """
+    Export `model_name` to ONNX and quantize it to int8 (dynamic, per-tensor).
+    task: "feature-extraction" (embedder) or "text-classification" (cross-encoder).
+    Returns the directory holding model_quantized.onnx + tokenizer files.
+
+    One process exports (under a lock file) into a temporary directory that is
+    renamed into place when complete, so readers never see a partial model.
+    """
+    out = os.path.join(out_root, model_name.replace("/", "__") + "-int8")
+    if os.path.exists(os.path.join(out, _QUANTIZED_FILE)):
+        return out
+
+    os.makedirs(out_root, exist_ok=True)
+    with _file_lock(out + ".lock"):
+        if os.path.exists(os.path.join(out, _QUANTIZED_FILE)):   # another process finished it
+            return out
+
+        from optimum.onnxruntime import (
+            ORTModelForFeatureExtraction, ORTModelForSequenceClassification, ORTQuantizer,
+        )
+        from transformers import AutoTokenizer
+
+        cls = ORTModelForFeatureExtraction if task == "feature-extraction" else ORTModelForSequenceClassification
+        tmp = tempfile.mkdtemp(prefix=os.path.basename(out) + ".", dir=out_root)
+        try:
+            fp32_dir, int8_dir = os.path.join(tmp, "fp32"), os.path.join(tmp, "int8")
+            print(f"[onnx] exporting {model_name} -> {out}")
+            cls.from_pretrained(model_name, export=True).save_pretrained(fp32_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(int8_dir)
+            ORTQuantizer.from_pretrained(fp32_dir).quantize(save_dir=int8_dir,
+                                                            quantization_config=_quantization_config())
+            if os.path.isdir(out):   # leftover of an interrupted export by an older version
+                shutil.rmtree(out)
+            os.replace(int8_dir, out)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+def _session_options(threads: Optional[int]):
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    if threads:
+        opts.intra_op_num_threads = threads
+    return opts
+
+def _st_config(model_name: str) -> Tuple[str, bool, int]:
+    """
+    (pooling mode, normalize, max_seq_length) from the sentence-transformers
+    config, so the ONNX path pools/truncates like SentenceTransformer.encode.
+    Falls back to MiniLM's mean + normalize + 256.
+    """
+    def load(filename: str) -> Any:
+        with open(hf_hub_download(model_name, filename), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    try:
+        from huggingface_hub import hf_hub_download
+        modules = load("modules.json")
+        normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+        pooling_dir = next(m["path"] for m in modules if m.get("type", "").endswith("Pooling"))
+        cfg = load(f"{pooling_dir}/config.json")
+        mode = "cls" if cfg.get("pooling_mode_cls_token") else "mean"
+        max_len = int(load("sentence_bert_config.json").get("max_seq_length", 256))
+        return mode, normalize, max_len
+    except Exception:
+        return "mean", True, 256
+
+class OnnxEmbedder:
+    """Chroma-compatible embedding function (`__call__(input)`) on an int8 ONNX model."""
+    def __init__(self, model_name: str, batch_size: int = 64, threads: Optional[int] = None):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        path = export_quantized(model_name, "feature-extraction")
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            path, file_name=_QUANTIZED_FILE, session_options=_session_options(threads))
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.pooling, self.normalize, self.max_length = _st_config(model_name)
+        self.batch_size = batch_size
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        import numpy as np
+
+        out: List[List[float]] = []
+        texts = list(input)
+        for start in range(0, len(texts), self.batch_size):
+            enc = self.tokenizer(texts[start:start + self.batch_size], padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors="np")
+            hidden = self.model(**enc).last_hidden_state
+            hidden = hidden.numpy() if hasattr(hidden, "numpy") else np.asarray(hidden)
+            if self.pooling == "cls":
+                emb = hidden[:, 0]
+            else:
+                mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+                emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                emb = emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            out.extend(emb.astype(np.float32).tolist())
+        return out
+
+class OnnxCrossEncoder:
+    """CrossEncoder-compatible `predict(pairs)` on an int8 ONNX model (returns raw logits)."""
+    def __init__(self, model_name: str, batch_size: int = 32, threads: Optional[int] = None):
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+
+        path = export_quantized(model_name, "text-classification")
+        self.model = ORTModelForSequenceClassification.from_pretrained(
+            path, file_name=_QUANTIZED_FILE, session_options=_session_options(threads))
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.batch_size = batch_size
+        self.max_length = min(getattr(self.tokenizer, "model_max_length", 512) or 512, 512)
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], **_: Any):
+        import numpy as np
+
+        pairs = list(pairs)
+        scores: List[float] = []
+        for start in range(0, len(pairs), self.batch_size):
+            batch = pairs[start:start + self.batch_size]
+            enc = self.tokenizer([q for q, _ in batch], [d for _, d in batch], padding=True,
+                                 truncation=True, max_length=self.max_length, return_tensors="np")
+            logits = self.model(**enc).logits
+            logits = logits.numpy() if hasattr(logits, "numpy") else np.asarray(logits)
+            scores.extend(logits[:, 0].tolist())
+        return np.asarray(scores, dtype=np.float32)
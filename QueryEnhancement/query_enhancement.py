@@ -27,78 +27,385 @@ Step back Prompting
 # file: query_enhancement_minimal_no_meta.py
 from __future__ import annotations
 import json, csv
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
-
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+# Heavy dependencies (chromadb, sentence-transformers, numpy, openai, dotenv) are
+# imported where they are first needed, so `--help` and the --server client path
+# start instantly; models are loaded once per process via model_registry.
 from step_back_prompter import StepBackPrompter
 from query_rewriter import QueryRewriter
-
-from dotenv import load_dotenv
-import os
-
-load_dotenv()  # looks for .env in the working dir, then parents
-api_key = os.getenv("OPENAI_API_KEY")
-
-import chromadb
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-
-from sentence_transformers import CrossEncoder
-
-def _rrf(results_list: List[Dict[str, Any]], k: int = 10, c: int = 60) -> List[str]:
-    scores: Dict[str, float] = {}
-    for res in results_list:
-        ids = res.get("ids", [[]])[0] if res.get("ids") else []
-        for rank, _id in enumerate(ids):
-            scores[_id] = scores.get(_id, 0.0) + 1.0 / (c + rank)
-    return [i for i, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]]
+from embedding_cache import DEFAULT_EMBED_CACHE, CachedEmbeddingFunction, EmbeddingCache
+from model_registry import get_cross_encoder, get_embedder
+from onnx_backend import backend_model_key
+from rerank_cache import DEFAULT_RERANK_CACHE, RerankScoreCache
+from lexical_index import LexicalIndex, lexical_index_path
+from chunking import split_markdown_sections
+from technique_metadata import constraints_to_where
+from llm_cache import DEFAULT_LLM_CACHE
+from semantic_cache import DEFAULT_SEMANTIC_CACHE, SemanticQueryCache, index_version
+
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Rewriter output field -> retrieval variant name (keys of `weights`)
+_VARIANTS = {"recall_query": "recall", "precise_query": "precise", "hyde_paragraph": "hyde"}
+
+class _PendingSearches:
+    """Per-variant dense searches submitted while the rewriter streams (pipelined mode)."""
+    def __init__(self, workers: int = 4):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qe-search")
+        self._futures: List[Any] = []
+        self._t0 = time.perf_counter()
+        self._t_llm = 0.0
+
+    def submit(self, fn, *args, **kwargs) -> None:
+        self._futures.append(self._pool.submit(fn, *args, **kwargs))
+
+    def rewrite_done(self) -> None:
+        self._t_llm = time.perf_counter() - self._t0
+
+    def collect(self) -> Dict[str, Any]:
+        """Wait for every search; dense rankings per variant for retrieve(dense=...)."""
+        dense: Dict[str, Any] = {}
+        for fut in self._futures:
+            dense.update(fut.result())
+        self._pool.shutdown()
+        print(f"[pipeline] rewriter done in {self._t_llm:.2f}s, searches done "
+              f"{time.perf_counter() - self._t0 - self._t_llm:.2f}s later")
+        return dense
+
+    def cancel(self) -> None:
+        """Drop searches that haven't started (no-op after collect())."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
 
 @dataclass
 class QueryEnhancement:
     profile_path: str = "init_profile.json"
     stepback_model: str = "gpt-5"
     rewrite_model: str = "gpt-5"
+    llm_cache_path: Optional[str] = DEFAULT_LLM_CACHE   # None disables the step-back/rewrite response cache
+    bypass_llm_cache: bool = False                     # always call the LLMs (fresh responses still cached)
 
     chroma_path: str = "./wcag_chroma"
     collection_name: str = "wcag_docs"
     embed_model: str = "all-MiniLM-L6-v2"
+    embed_cache_path: Optional[str] = DEFAULT_EMBED_CACHE   # None disables the on-disk embedding cache
+    backend: str = "torch"   # "torch" (fp32) or "onnx-int8" for the embedder and the cross-encoder
 
     n_each: int = 40
     top_k: int = 12
+    n_passages: int = 60   # fused passages to rerank when the collection is section-chunked
+    fusion: str = "rrf"    # "rrf" or "score" (min-max normalized distances)
+    # "lexical" weighs the BM25 ranking of the precise query; 0 disables it.
+    # "generalized" (the step-back query) is only searched in pipelined mode.
+    weights: Dict[str, float] = field(
+        default_factory=lambda: {"recall": 1.0, "precise": 1.0, "hyde": 1.0, "lexical": 1.0,
+                                 "generalized": 1.0})
+
+    # Search the step-back query while the rewriter runs, stream the rewriter
+    # and search each variant as soon as its field is complete.
+    pipelined: bool = False
+
+    # Turn step-back constraints ("WCAG 2.2 AA", "HTML failures") into a Chroma
+    # `where` filter; searches that come back short are retried unfiltered.
+    filter_constraints: bool = True
+
+    reranker: Optional[Any] = None   # CrossEncoder-like override; defaults to the shared registry model
+    rerank_cache_path: Optional[str] = DEFAULT_RERANK_CACHE   # None disables the cross-encoder score cache
+    # Near-duplicate query sets (every variant within this cosine) reuse cached results
+    semantic_cache_path: Optional[str] = DEFAULT_SEMANTIC_CACHE   # None disables the semantic query cache
+    semantic_threshold: float = 0.95
+    # How long a fetched collection handle is trusted before its metadata is
+    # re-read, so a long-lived instance (retrieval_server) notices rebuilds
+    collection_ttl_s: float = 2.0
+
+    # Opened once per instance; the models behind them are shared process-wide.
+    _client: Any = field(default=None, init=False, repr=False)
+    _col: Any = field(default=None, init=False, repr=False)
+    _col_checked: float = field(default=0.0, init=False, repr=False)
+    _embed_fn: Any = field(default=None, init=False, repr=False)
+    _rerank_cache: Any = field(default=None, init=False, repr=False)
+    _lexical: Any = field(default=None, init=False, repr=False)
+    _semantic: Any = field(default=None, init=False, repr=False)
 
     def _load_profile(self) -> Dict[str, Any]:
         with open(self.profile_path, "r", encoding="utf-8") as f:
             return json.load(f)
 
+    def _embedding_function(self):
+        if self.embed_cache_path:
+            return CachedEmbeddingFunction(
+                lambda: get_embedder(self.embed_model, self.backend),
+                EmbeddingCache(backend_model_key(self.embed_model, self.backend), path=self.embed_cache_path),
+            )
+        return get_embedder(self.embed_model, self.backend)
+
     def _collection(self):
-        client = chromadb.PersistentClient(path=self.chroma_path)
-        embed_fn = SentenceTransformerEmbeddingFunction(model_name=self.embed_model)
-        return client.get_collection(self.collection_name, embedding_function=embed_fn)
+        """
+        The collection, re-fetched (with fresh metadata) once `collection_ttl_s`
+        has passed: after chroma_init re-stamps index_version or --reset
+        recreates it, the new handle and version are picked up and the lexical
+        index is reloaded.
+        """
+        now = time.monotonic()
+        if self._col is not None and now - self._col_checked < self.collection_ttl_s:
+            return self._col
+        import chromadb
+        if self._embed_fn is None:
+            self._embed_fn = self._embedding_function()
+        col = None
+        if self._client is not None:
+            try:
+                col = self._client.get_collection(self.collection_name, embedding_function=self._embed_fn)
+            except Exception:
+                col = None   # e.g. persist dir removed by --reset: reopen below
+        if col is None:
+            self._client = chromadb.PersistentClient(path=self.chroma_path)
+            col = self._client.get_collection(self.collection_name, embedding_function=self._embed_fn)
+        if self._col is not None and index_version(col) != index_version(self._col):
+            print(f"[index] {self.collection_name} changed ({index_version(self._col)} -> {index_version(col)})")
+            self._lexical = None   # rebuilt alongside the collection
+        self._col, self._col_checked = col, now
+        return col
+
+    def _lexical_index(self) -> Optional[LexicalIndex]:
+        """BM25 + technique/SC-ID tables written by chroma_init.py (None if it was never built)."""
+        if self._lexical is None:
+            self._lexical = LexicalIndex.load(lexical_index_path(self.chroma_path, self.collection_name)) or False
+        return self._lexical or None
+
+    def _semantic_cache(self, col) -> Optional[SemanticQueryCache]:
+        if not self.semantic_cache_path:
+            return None
+        version = index_version(col)
+        if self._semantic is None or self._semantic.version != version:
+            self._semantic = SemanticQueryCache(version, path=self.semantic_cache_path,
+                                                threshold=self.semantic_threshold)
+        return self._semantic
+
+    def semantic_cache_stats(self) -> Optional[Dict[str, Any]]:
+        return self._semantic.stats() if self._semantic is not None else None
+
+    def exact_lookup(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Short-circuit for queries that are only technique IDs / SC numbers
+        ("ARIA14", "1.4.4 Resize Text"): answered from the lexical index's
+        lookup tables without embedding or searching. None if not such a query.
+        Results have the passage shape too (score 1.0, the document's first
+        section), so section-granularity callers can treat them alike.
+        """
+        index = self._lexical_index()
+        doc_ids = index.exact_lookup(query) if index else None
+        if doc_ids is None:
+            return None
+        results = []
+        for doc_id in doc_ids[:self.top_k]:
+            doc = self._parent_document({"path": index.paths.get(doc_id)}, "")
+            preview = (doc[:320] + "...") if len(doc) > 320 else doc
+            sections = split_markdown_sections(doc) if doc else []
+            results.append({"id": doc_id, "document": doc, "preview": preview,
+                            "section": sections[0]["section"] if sections else "", "score": 1.0})
+        return results
+
+    def rerank(self, query: str, documents: List[str], top_k: int | None = None) -> List[Dict[str, Any]]:
+        if self._rerank_cache is None and self.rerank_cache_path:
+            self._rerank_cache = RerankScoreCache(backend_model_key(RERANK_MODEL, self.backend),
+                                                  path=self.rerank_cache_path)
+        model = self.reranker or get_cross_encoder(RERANK_MODEL, self.backend)
+        return rerank_docs(query, documents, top_k=top_k, model=model, cache=self._rerank_cache)
+
+    def retrieve(self, col, queries: Dict[str, str], k: int, lexical_query: str = "",
+                 where: Optional[Dict[str, Any]] = None,
+                 dense: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Embed all query variants in one batch, search them in one call and
+        fuse with per-variant `weights`, plus the BM25 ranking of `lexical_query`
+        when the lexical index exists. With `where`, only matching entries are
+        searched; fewer than k filtered hits falls back to the whole corpus.
+        `dense`: rankings already searched (with `where`) by the pipelined run.
+        Returns [{"id","document","metadata","score"}].
+        """
+        from retrieval import dense_search, fuse_results, id_ranking
+        extra = {}
+        index = self._lexical_index()
+        if index is not None and lexical_query and self.weights.get("lexical", 1.0) > 0:
+            extra["lexical"] = id_ranking(index.search(lexical_query, k=self.n_each))
+
+        def search(filt, rankings=None):
+            if rankings is None:
+                rankings = dense_search(col, self._embed_fn, queries, n_results=self.n_each, where=filt)
+            if not rankings:
+                return []
+            return fuse_results(col, {**rankings, **extra}, weights=self.weights, k=k,
+                                fusion=self.fusion, where=filt)
+
+        if dense is not None and not where:
+            return search(None, dense)
+        if where:
+            # An index built before the metadata fields existed matches nothing here
+            hits = search(where, dense)
+            if len(hits) >= k:
+                return hits
+            print(f"[filter] only {len(hits)} hits for where={where}; searching unfiltered")
+        return search(None)
+
+    @staticmethod
+    def _parent_document(meta: Dict[str, Any], fallback: str) -> str:
+        path = meta.get("path")
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                return f.read()
+        return fallback
+
+    def _collapse_passages(self, query: str, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Rerank retrieved passages with the cross-encoder, then collapse them to
+        their parent documents (best passage score per parent), keeping top_k.
+        """
+        results: List[Dict[str, Any]] = []
+        seen = set()
+        for r in self.rerank(query, [h["document"] for h in hits]):
+            hit = hits[r["index"]]
+            meta = hit["metadata"]
+            parent = meta.get("parent_id", hit["id"])
+            if parent in seen:
+                continue
+            seen.add(parent)
+            passage = r["doc"]
+            preview = (passage[:320] + "...") if len(passage) > 320 else passage
+            results.append({
+                "id": parent,
+                "document": self._parent_document(meta, passage),
+                "preview": preview,
+                "section": meta.get("section", ""),
+                "score": r["score"],
+            })
+            if len(results) >= self.top_k:
+                break
+        return results
+
+    def _search(self, col, variants: Dict[str, str], rerank_query: str, lexical_query: str,
+                where: Optional[Dict[str, Any]] = None,
+                dense: Optional[Callable[[], Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        `dense`: returns the pipelined run's rankings; only called on a semantic
+        cache miss, so a hit doesn't wait for those searches.
+        """
+        cache = self._semantic_cache(col)
+        if cache is None:
+            return self._search_uncached(col, variants, rerank_query, lexical_query, where,
+                                         dense() if dense else None)
+
+        names = sorted(n for n, text in variants.items() if text)
+        vectors = self._embed_fn([variants[n] for n in names])   # served by the embedding cache after this
+        context = {
+            "where": where, "top_k": self.top_k, "n_each": self.n_each, "n_passages": self.n_passages,
+            "fusion": self.fusion, "weights": self.weights, "embed": backend_model_key(self.embed_model, self.backend),
+            "rerank": None if self.reranker is not None else backend_model_key(RERANK_MODEL, self.backend),
+        }
+        results = cache.get(context, names, vectors)
+        if results is None:
+            results = self._search_uncached(col, variants, rerank_query, lexical_query, where,
+                                            dense() if dense else None)
+            if self.reranker is None:   # custom rerankers aren't identifiable across runs
+                cache.put(context, names, vectors, results)
+        return results
+
+    def _search_uncached(self, col, variants: Dict[str, str], rerank_query: str, lexical_query: str,
+                         where: Optional[Dict[str, Any]] = None,
+                         dense: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        granularity = (col.metadata or {}).get("granularity", "document")
+        if granularity == "section":
+            # Passage index: rerank short passages, then collapse to documents
+            hits = self.retrieve(col, variants, k=self.n_passages, lexical_query=lexical_query,
+                                 where=where, dense=dense)
+            return self._collapse_passages(rerank_query, hits)
+
+        hits = self.retrieve(col, variants, k=self.top_k, lexical_query=lexical_query, where=where, dense=dense)
+        # Normalize to a simple list of records (already in fused order)
+        results = []
+        for h in hits:
+            doc = h["document"]
+            preview = (doc[:320] + "...") if len(doc) > 320 else doc
+            results.append({"id": h["id"], "document": doc, "preview": preview})
+        return results
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Direct search for a single query, without the LLM stages: exact
+        technique/SC-ID lookups short-circuit, anything else is dense + BM25.
+        """
+        exact = self.exact_lookup(query)
+        if exact is not None:
+            return exact
+        return self._search(self._collection(), {"query": query}, query, query)
+
+    def _rewrite_pipelined(self, col, plan: Dict[str, Any], where: Optional[Dict[str, Any]],
+                           llm_cache: Dict[str, Any]):
+        """
+        Overlap retrieval with LLM generation: the step-back `generalized_query`
+        is searched right away, then the rewriter is streamed and each variant
+        is searched the moment its field is complete. Returns (rewrite,
+        _PendingSearches); the caller collects the dense rankings only when it
+        needs them (not on an exact lookup or a semantic-cache hit).
+        """
+        from retrieval import dense_search
+
+        pending = _PendingSearches()
+
+        def fire(name: str, text: str) -> None:
+            if text:
+                pending.submit(dense_search, col, self._embed_fn, {name: text},
+                               n_results=self.n_each, where=where)
+
+        try:
+            fire("generalized", plan.get("generalized_query", ""))
+            rew = QueryRewriter(model=self.rewrite_model, **llm_cache).generate(
+                plan, on_field=lambda f, text: fire(_VARIANTS[f], text))
+        except BaseException:
+            pending.cancel()
+            raise
+        pending.rewrite_done()
+        return rew, pending
+
+    def run(self, profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        profile = profile if profile is not None else self._load_profile()
+
+        llm_cache = {"cache_path": self.llm_cache_path, "bypass_cache": self.bypass_llm_cache}
+        plan = StepBackPrompter(model=self.stepback_model, **llm_cache).generate(profile)
 
-    def run(self) -> Dict[str, Any]:
-        profile = self._load_profile()
+        col = self._collection()
+        granularity = (col.metadata or {}).get("granularity", "document")
+        where = constraints_to_where(plan.get("constraints", [])) if self.filter_constraints else None
 
-        plan = StepBackPrompter(model=self.stepback_model).generate(profile)
-        rew  = QueryRewriter(model=self.rewrite_model).generate(plan)
+        pending = None
+        if self.pipelined:
+            rew, pending = self._rewrite_pipelined(col, plan, where, llm_cache)
+        else:
+            rew = QueryRewriter(model=self.rewrite_model, **llm_cache).generate(plan)
 
         recall = rew["queries"]["recall_query"]
         precise = rew["queries"]["precise_query"]
         hyde = rew["queries"]["hyde_paragraph"]
 
-        col = self._collection()
-        c1 = col.query(query_texts=[recall],  n_results=self.n_each)   # ids, documents only
-        c2 = col.query(query_texts=[precise], n_results=self.n_each)
-        c3 = col.query(query_texts=[hyde],    n_results=self.n_each)
-
-        fused_ids = _rrf([c1, c2, c3], k=self.top_k)
-        fetched = col.get(ids=fused_ids)  # returns {"ids": [...], "documents": [...]} (no metadatas)
-
-        # Normalize to a simple list of records
-        results = []
-        for _id, doc in zip(fetched.get("ids", []), fetched.get("documents", [])):
-            preview = (doc[:320] + "...") if doc and len(doc) > 320 else (doc or "")
-            results.append({"id": _id, "document": doc or "", "preview": preview})
+        try:
+            results = self.exact_lookup(precise)
+            if results is None:
+                variants = {"recall": recall, "precise": precise, "hyde": hyde}
+                if self.pipelined:
+                    variants["generalized"] = plan.get("generalized_query", "")
+                results = self._search(col, variants, precise, precise, where=where,
+                                       dense=pending.collect if pending else None)
+        finally:
+            if pending is not None:
+                pending.cancel()   # exact lookup / semantic hit: drop searches still queued
 
         return {
+            "granularity": granularity,
+            "where": where,
             "step_back": {
                 "objective": plan.get("objective"),
                 "constraints": plan.get("constraints", []),
@@ -111,7 +418,7 @@ class QueryEnhancement:
                 "precise_query": precise,
                 "hyde_paragraph": hyde
             },
-            "results": results  # list[{"id","document","preview"}]
+            "results": results  # list[{"id","document","preview","section","score"}] (section/score: passages, exact lookups)
         }
 
 # -------- write helpers --------
@@ -126,25 +433,37 @@ def write_results_jsonl(path: str, results: List[Dict[str, Any]]) -> None:
 
 def write_results_csv(path: str, results: List[Dict[str, Any]]) -> None:
     with open(path, "w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=["id", "document", "preview"])
+        w = csv.DictWriter(f, fieldnames=["id", "document", "preview"], extrasaction="ignore")
         w.writeheader()
         for r in results:
             w.writerow(r)
 
-def rerank_docs(query: str, documents: list[str], top_k: int | None = None):
+def rerank_docs(query: str, documents: list[str], top_k: int | None = None, model: Any = None,
+                cache: Optional[RerankScoreCache] = None):
     """
     Pointwise rerank with a cross-encoder.
     query: your precise_query (or HyDE paragraph)
     documents: list[str] from your fused Top-N
+    model: CrossEncoder-like object (defaults to the shared registry model)
+    cache: optional RerankScoreCache; only uncached pairs are sent to the model (in one batch)
     returns: list of dicts sorted by ce score desc
     """
     # Optional: truncate very long docs to control latency/cost
     pruned = [(i, d if d is not None else "") for i, d in enumerate(documents)]
-    # Make (query, doc) pairs
-    pairs = [(query, d[:2000]) for _, d in pruned]  # 2k chars is a practical cap
-
-    ce = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2", trust_remote_code=True)
-    scores = ce.predict(pairs)  # numpy array of floats; higher = more relevant
+    texts = [d[:2000] for _, d in pruned]  # 2k chars is a practical cap
+
+    scores: List[Optional[float]] = [None] * len(texts)
+    if cache is not None:
+        for i, s in cache.get_many(query, texts).items():
+            scores[i] = s
+    misses = [i for i, s in enumerate(scores) if s is None]
+    if misses:
+        ce = model or get_cross_encoder(RERANK_MODEL)
+        fresh = ce.predict([(query, texts[i]) for i in misses])  # higher = more relevant
+        for i, s in zip(misses, fresh):
+            scores[i] = float(s)
+        if cache is not None:
+            cache.put_many(query, [texts[i] for i in misses], [scores[i] for i in misses])
     ranked = sorted(
         [{"index": i, "doc": d, "score": float(s)} for (i, d), s in zip(pruned, scores)],
         key=lambda x: x["score"],
@@ -161,15 +480,50 @@ if __name__ == "__main__":
     ap.add_argument("--collection", default="wcag_docs")
     ap.add_argument("--k", type=int, default=20)
     ap.add_argument("--out", default="results.jsonl", help="results.{json|jsonl|csv}")
+    ap.add_argument("--backend", choices=["torch", "onnx-int8"], default="torch",
+                    help="Inference backend for the embedder and cross-encoder")
+    ap.add_argument("--query", default=None,
+                    help="Search this query directly (exact technique/SC IDs + dense + BM25), skipping the LLM stages")
+    ap.add_argument("--bypass-llm-cache", action="store_true",
+                    help="Call the step-back/rewrite LLMs even if a cached response exists")
+    ap.add_argument("--pipelined", action="store_true",
+                    help="Stream the rewriter and search each query variant as soon as it is generated")
+    ap.add_argument("--semantic-threshold", type=float, default=0.95,
+                    help="Cosine similarity at which a cached result list is reused (>1 disables reuse)")
+    ap.add_argument("--no-filter", action="store_true",
+                    help="Don't turn step-back constraints into metadata filters")
+    ap.add_argument("--server", default=None,
+                    help="URL of a running retrieval_server.py (e.g. http://127.0.0.1:8765); "
+                         "the server's --persist/--collection/--k apply")
     args = ap.parse_args()
 
-    qe = QueryEnhancement(
-        profile_path=args.profile,
-        chroma_path=args.persist,
-        collection_name=args.collection,
-        top_k=args.k
-    )
-    out = qe.run()
+    if args.query:
+        qe = QueryEnhancement(chroma_path=args.persist, collection_name=args.collection,
+                              top_k=args.k, backend=args.backend)
+        for r in qe.search(args.query):
+            print(f"{r['id']}\t{r.get('section', '')}\t{r['preview'][:120]!r}")
+        raise SystemExit(0)
+
+    if args.server:
+        from retrieval_client import RetrievalClient
+        client = RetrievalClient(args.server)
+        with open(args.profile, "r", encoding="utf-8") as f:
+            out = client.run(profile=json.load(f))
+        rerank = client.rerank
+    else:
+        qe = QueryEnhancement(
+            profile_path=args.profile,
+            chroma_path=args.persist,
+            collection_name=args.collection,
+            top_k=args.k,
+            backend=args.backend,
+            filter_constraints=not args.no_filter,
+            bypass_llm_cache=args.bypass_llm_cache,
+            pipelined=args.pipelined,
+            semantic_threshold=args.semantic_threshold,
+        )
+        out = qe.run()
+        rerank = qe.rerank
 
     # choose writer by extension
     ext = args.out.lower().split(".")[-1]
@@ -187,8 +541,15 @@ if __name__ == "__main__":
 
     precise_query = out["queries"]["precise_query"]
 
-    docs = [r.get("document", "") for r in out["results"]]
-    top_k_docs = rerank_docs(precise_query, docs, top_k=10)
+    if out["granularity"] == "section":
+        # run() already reranked passages; keep its document-level order
+        top_k_docs = [
+            {"index": i, "doc": r["document"], "score": r.get("score"), "section": r.get("section", "")}
+            for i, r in enumerate(out["results"][:10])
+        ]
+    else:
+        docs = [r.get("document", "") for r in out["results"]]
+        top_k_docs = rerank(precise_query, docs, top_k=10)
 
     with open("top_k_docs.json", "w", encoding="utf-8") as f:
         json.dump(top_k_docs, f, ensure_ascii=False, indent=2)
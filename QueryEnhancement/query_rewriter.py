@@ -1,15 +1,13 @@
 # query_rewriter.py
 from __future__ import annotations
 import json
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
-from openai import OpenAI  # pip install openai
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
 
-from dotenv import load_dotenv
-import os
+from llm_cache import DEFAULT_LLM_CACHE, LLMResponseCache, shared_cache
 
-load_dotenv()  # looks for .env in the working dir, then parents
-api_key = os.getenv("OPENAI_API_KEY")
+PROMPT_VERSION = "rewrite@1"   # bump when the prompt below changes (invalidates cached rewrites)
 
 def _extract_json_block(text: str) -> Dict[str, Any]:
     i, j = text.find("{"), text.rfind("}")
@@ -17,6 +15,31 @@ def _extract_json_block(text: str) -> Dict[str, Any]:
         raise ValueError("QueryRewriter: model did not return JSON.")
     return json.loads(text[i:j+1])
 
+QUERY_FIELDS = ("recall_query", "precise_query", "hyde_paragraph")
+
+class StreamedFields:
+    """
+    Incremental parser for the rewriter's JSON as it streams in: feed() returns
+    the (field, value) pairs whose string value has just been closed.
+    """
+    _PATTERNS = {f: re.compile(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % f) for f in QUERY_FIELDS}
+
+    def __init__(self):
+        self.buffer = ""
+        self.done: Dict[str, str] = {}
+
+    def feed(self, chunk: str) -> List[tuple]:
+        self.buffer += chunk or ""
+        new = []
+        for field, rx in self._PATTERNS.items():
+            if field in self.done:
+                continue
+            m = rx.search(self.buffer)
+            if m:
+                self.done[field] = json.loads(f'"{m.group(1)}"')
+                new.append((field, self.done[field]))
+        return new
+
 @dataclass
 class QueryRewriter:
     """
@@ -45,11 +68,33 @@ class QueryRewriter:
     model: str = "gpt-5"
     temperature: float = 0.1
     client: Optional[Any] = None
+    cache_path: Optional[str] = DEFAULT_LLM_CACHE   # None disables the response cache
+    bypass_cache: bool = False                      # always call the model (still refreshes the cache)
+    _cache: Optional[LLMResponseCache] = field(default=None, init=False, repr=False)
+
+    def _response_cache(self) -> LLMResponseCache:
+        """Opened on first use and kept (one connection per cache path per process)."""
+        if self._cache is None:
+            self._cache = shared_cache(self.cache_path)
+        return self._cache
 
-    def __post_init__(self):
-        self.client = self.client or OpenAI()
+    def _get_client(self):
+        """The OpenAI client, created on the first cache miss (cache hits need no API key)."""
+        if self.client is None:
+            # openai/dotenv are imported lazily so importing this module stays cheap
+            from dotenv import load_dotenv
+            from openai import OpenAI  # pip install openai
+            load_dotenv()  # looks for .env in the working dir, then parents
+            self.client = OpenAI()
+        return self.client
 
-    def generate(self, step_back: Dict[str, Any]) -> Dict[str, Any]:
+    def generate(self, step_back: Dict[str, Any],
+                 on_field: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
+        """
+        on_field(name, text): when given, the completion is streamed and called
+        once per query field as soon as that field's value is complete (also on
+        a cache hit), so callers can start searching before the rest arrives.
+        """
         generalized_query = step_back.get("generalized_query", "")
         constraints: List[str] = step_back.get("constraints", [])
         invariants: List[str]  = step_back.get("invariants", [])
@@ -75,11 +120,43 @@ class QueryRewriter:
         GENERALIZED_QUERY:
         {generalized_query}
         """
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        rewrites = _extract_json_block(resp.choices[0].message.content.strip())
+        emitted = set()
+
+        def emit(field: str, value: str) -> None:
+            if on_field is not None and field not in emitted:
+                emitted.add(field)
+                on_field(field, value)
+
+        def call() -> Dict[str, Any]:
+            if on_field is None:
+                resp = self._get_client().chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                )
+                return _extract_json_block(resp.choices[0].message.content.strip())
+
+            parser = StreamedFields()
+            stream = self._get_client().chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    for field, value in parser.feed(chunk.choices[0].delta.content or ""):
+                        emit(field, value)
+            return _extract_json_block(parser.buffer.strip())
+
+        if self.cache_path:
+            # Only the fields the prompt is built from are part of the key
+            payload = {"generalized_query": generalized_query, "constraints": constraints,
+                       "invariants": invariants}
+            rewrites = self._response_cache().cached_call(
+                self.model, PROMPT_VERSION, payload, call, bypass=self.bypass_cache)
+        else:
+            rewrites = call()
+        for field in QUERY_FIELDS:   # cache hits, or fields the stream parser missed
+            emit(field, rewrites[field])
 
         return {
             "queries": {
@@ -0,0 +1,41 @@
+# rerank_cache.py
+"""
+Persistent cross-encoder score cache. Scores are keyed by (reranker model,
+normalized query, hash of the exact text that was scored) — document IDs in
+this repo are content-addressed, so the text hash identifies the same document
+or passage across runs. Backed by a size-bounded DiskLRUCache.
+"""
+from __future__ import annotations
+import os
+import re
+import struct
+from typing import Dict, Optional, Sequence
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskLRUCache, text_hash
+
+DEFAULT_RERANK_CACHE = os.path.join(DEFAULT_CACHE_DIR, "rerank_scores.sqlite")
+
+_WS = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    return _WS.sub(" ", query or "").strip().casefold()
+
+class RerankScoreCache:
+    def __init__(self, model_name: str, path: str = DEFAULT_RERANK_CACHE, max_entries: int = 500_000):
+        self.model_name = model_name
+        self.store = DiskLRUCache(path, namespace="rerank_scores", max_entries=max_entries)
+
+    def _keys(self, query: str, texts: Sequence[str]):
+        q = text_hash(normalize_query(query))
+        return [text_hash(self.model_name, q, text_hash(t)) for t in texts]
+
+    def get_many(self, query: str, texts: Sequence[str]) -> Dict[int, float]:
+        """Returns {position_in_texts: score} for the pairs already scored."""
+        keys = self._keys(query, texts)
+        found = self.store.get_many(keys)
+        return {i: struct.unpack("<d", found[k])[0] for i, k in enumerate(keys) if k in found}
+
+    def put_many(self, query: str, texts: Sequence[str], scores: Sequence[float]) -> None:
+        self.store.put_many({
+            k: struct.pack("<d", float(s)) for k, s in zip(self._keys(query, texts), scores)
+        })
@@ -0,0 +1,147 @@
+# retrieval.py
+"""
+Single-pass multi-query retrieval.
+
+All query variants (recall / precise / HyDE / ...) are embedded in one model
+batch and searched with one `collection.query` call; the per-variant rankings
+are then fused with a vectorized weighted RRF (or min-max score fusion) and
+returned in fused order, with documents/metadatas taken from the query results
+so no extra `collection.get` round trip is needed (except for hits that only an
+extra, non-dense ranking such as BM25 contributed).
+
+dense_search searches the variants (all at once, or one by one as they become
+available); fuse_results fuses the collected rankings at the end.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+def fuse_rankings(
+    id_lists: Sequence[Sequence[str]],
+    weights: Optional[Sequence[float]] = None,
+    method: str = "rrf",
+    scores: Optional[Sequence[Sequence[float]]] = None,
+    c: int = 60,
+) -> Tuple[List[str], np.ndarray]:
+    """
+    Fuse several ranked ID lists into one. Returns (ids, scores), best first.
+
+    method="rrf":   score(d) = sum_q w_q / (c + rank_q(d))
+    method="score": score(d) = sum_q w_q * minmax(score_q(d))   (needs `scores`, higher = better)
+    Ties keep first-seen order.
+    """
+    weights = list(weights) if weights is not None else [1.0] * len(id_lists)
+    flat_ids: List[str] = []
+    contrib: List[np.ndarray] = []
+    for q, ids in enumerate(id_lists):
+        if not len(ids):
+            continue
+        flat_ids.extend(ids)
+        if method == "rrf":
+            contrib.append(weights[q] / (c + np.arange(len(ids), dtype=np.float64)))
+        elif method == "score":
+            if scores is None:
+                raise ValueError("fuse_rankings: method='score' needs scores")
+            sim = np.asarray(scores[q], dtype=np.float64)
+            span = sim.max() - sim.min()
+            norm = (sim - sim.min()) / span if span > 0 else np.ones_like(sim)
+            contrib.append(weights[q] * norm)
+        else:
+            raise ValueError(f"fuse_rankings: unknown method {method!r}")
+    if not flat_ids:
+        return [], np.zeros(0)
+
+    uniq, first, inverse = np.unique(np.asarray(flat_ids, dtype=object), return_index=True, return_inverse=True)
+    fused = np.bincount(inverse, weights=np.concatenate(contrib), minlength=len(uniq))
+    order = np.lexsort((first, -fused))
+    return [uniq[i] for i in order], fused[order]
+
+Ranking = Dict[str, List[Any]]   # one variant: {"ids", "scores" (higher = better), ["documents", "metadatas"]}
+
+def dense_search(
+    collection,
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    queries: Dict[str, str],
+    n_results: int = 40,
+    where: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Ranking]:
+    """
+    Embed all non-empty `queries` in one model batch and search them with one
+    `collection.query` call. Returns {variant_name: Ranking}.
+    """
+    names = [n for n, q in queries.items() if q]
+    if not names:
+        return {}
+    embeddings = embed_fn([queries[n] for n in names])   # one model batch
+    kwargs: Dict[str, Any] = {}
+    if where:
+        kwargs["where"] = where
+    res = collection.query(
+        query_embeddings=embeddings,                      # one search call
+        n_results=n_results,
+        include=["documents", "metadatas", "distances"],
+        **kwargs,
+    )
+    out: Dict[str, Ranking] = {}
+    for q, name in enumerate(names):
+        ids = (res.get("ids") or [[]] * len(names))[q]
+        out[name] = {
+            "ids": list(ids),
+            "scores": [-d for d in (res.get("distances") or [[]] * len(names))[q]],
+            "documents": list((res.get("documents") or [[]] * len(names))[q]),
+            "metadatas": list((res.get("metadatas") or [[]] * len(names))[q]),
+        }
+    return out
+
+def fuse_results(
+    collection,
+    rankings: Dict[str, Ranking],
+    weights: Optional[Dict[str, float]] = None,
+    k: int = 12,
+    fusion: str = "rrf",
+    where: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fuse per-variant rankings (dense_search output and/or ID-only rankings from
+    other retrievers) into up to k hits: [{"id","document","metadata","score"}].
+    Documents come from the dense results; IDs only an ID-only ranking found
+    are fetched with one `collection.get` (same `where`, so filtered-out hits drop).
+    """
+    names = list(rankings)
+    fused_ids, scores = fuse_rankings(
+        [rankings[n]["ids"] for n in names],
+        weights=[(weights or {}).get(n, 1.0) for n in names],
+        method=fusion,
+        scores=[rankings[n]["scores"] for n in names],
+    )
+
+    # First occurrence of each ID carries its document/metadata
+    lookup: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    for n in names:
+        docs = rankings[n].get("documents")
+        if docs is None:
+            continue
+        metas = rankings[n].get("metadatas") or []
+        for j, _id in enumerate(rankings[n]["ids"]):
+            if _id not in lookup:
+                doc = docs[j] if j < len(docs) else ""
+                meta = metas[j] if j < len(metas) else {}
+                lookup[_id] = (doc or "", meta or {})
+
+    missing = [i for i in fused_ids if i not in lookup]
+    if missing:
+        got = collection.get(ids=missing, include=["documents", "metadatas"], **({"where": where} if where else {}))
+        for _id, doc, meta in zip(got.get("ids", []), got.get("documents") or [], got.get("metadatas") or []):
+            lookup[_id] = (doc or "", meta or {})
+        fused = [(i, s) for i, s in zip(fused_ids, scores) if i in lookup]
+        fused_ids, scores = [i for i, _ in fused], [s for _, s in fused]
+
+    return [
+        {"id": _id, "document": lookup[_id][0], "metadata": lookup[_id][1], "score": float(s)}
+        for _id, s in zip(fused_ids[:k], scores[:k])
+    ]
+
+def id_ranking(ranking: List[Tuple[str, float]]) -> Ranking:
+    """[(id, score), ...] from a non-dense retriever (e.g. BM25) as a Ranking."""
+    return {"ids": [i for i, _ in ranking], "scores": [s for _, s in ranking]}
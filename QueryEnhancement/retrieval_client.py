@@ -0,0 +1,40 @@
+# retrieval_client.py
+"""
+Thin client for retrieval_server.py (stdlib only, so the CLI can talk to a warm
+server without importing chromadb / sentence-transformers itself).
+"""
+from __future__ import annotations
+import json
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+class RetrievalClient:
+    def __init__(self, base_url: str = DEFAULT_URL, timeout: float = 600.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = None if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(
+            self.base_url + path, data=data,
+            headers={"Content-Type": "application/json"},
+            method="GET" if body is None else "POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            detail = json.loads(e.read() or b"{}").get("error", e.reason)
+            raise RuntimeError(f"retrieval server {path} failed ({e.code}): {detail}") from e
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("/health")
+
+    def run(self, profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self._request("/run", {} if profile is None else {"profile": profile})
+
+    def rerank(self, query: str, documents: List[str], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._request("/rerank", {"query": query, "documents": documents, "top_k": top_k})["results"]
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# retrieval_server.py
+"""
+Resident retrieval server: keeps the Chroma collection, the embedding model and
+the cross-encoder loaded so each request only pays for the LLM calls, the
+search and the rerank (no client/model start-up).
+
+Endpoints (JSON over HTTP, one thread per connection):
+  GET  /health                                  -> {"status", "collection", "count", "semantic_cache"}
+  POST /run     {"profile": {...}}              -> QueryEnhancement.run() payload
+                (omit "profile" to use the server's --profile file)
+  POST /rerank  {"query", "documents", "top_k"} -> {"results": [{"index","doc","score"}]}
+
+Usage:
+  python retrieval_server.py --persist ./wcag_chroma --port 8765
+  python query_enhancement.py --server http://127.0.0.1:8765   (uses retrieval_client.py)
+"""
+from __future__ import annotations
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+from model_registry import get_cross_encoder, get_embedder, start_idle_reaper
+from query_enhancement import QueryEnhancement, RERANK_MODEL
+
+class RetrievalService:
+    def __init__(self, qe: QueryEnhancement):
+        self.qe = qe
+
+    def warm(self) -> None:
+        """Open the collection and load the embedder + cross-encoder up front."""
+        t0 = time.perf_counter()
+        self.qe._collection()
+        # Same registry entries QueryEnhancement and rerank_docs resolve to
+        get_embedder(self.qe.embed_model, self.qe.backend).load()
+        if self.qe.reranker is None:
+            get_cross_encoder(RERANK_MODEL, self.qe.backend).load()
+        print(f"[server] models warm in {time.perf_counter() - t0:.2f}s")
+
+    def health(self) -> Dict[str, Any]:
+        return {"status": "ok", "collection": self.qe.collection_name, "count": self.qe._collection().count(),
+                "semantic_cache": self.qe.semantic_cache_stats()}
+
+    def run(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return self.qe.run(profile=body.get("profile"))
+
+    def rerank(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(body.get("query"), str) or not isinstance(body.get("documents"), list):
+            raise ValueError('rerank expects {"query": str, "documents": [str, ...]}')
+        return {"results": self.qe.rerank(body["query"], body["documents"], top_k=body.get("top_k"))}
+
+def _make_handler(service: RetrievalService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, service.health())
+            else:
+                self._send(404, {"error": f"unknown endpoint {self.path}"})
+
+        def do_POST(self):
+            routes = {"/run": service.run, "/rerank": service.rerank}
+            if self.path not in routes:
+                self._send(404, {"error": f"unknown endpoint {self.path}"})
+                return
+            try:
+                n = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(n) or b"{}")
+                self._send(200, routes[self.path](body))
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, fmt, *args):
+            print(f"[server] {self.address_string()} {fmt % args}")
+
+    return Handler
+
+def serve(qe: QueryEnhancement, host: str = "127.0.0.1", port: int = 8765,
+          unload_idle_s: float = 0) -> None:
+    service = RetrievalService(qe)
+    service.warm()
+    if unload_idle_s > 0:
+        start_idle_reaper(unload_idle_s)
+    httpd = ThreadingHTTPServer((host, port), _make_handler(service))
+    print(f"[server] listening on http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+# -------- CLI --------
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Resident retrieval server with warm models")
+    ap.add_argument("--profile", default="init_profile.json", help="Default profile for /run")
+    ap.add_argument("--persist", default="./wcag_chroma")
+    ap.add_argument("--collection", default="wcag_docs")
+    ap.add_argument("--k", type=int, default=20)
+    ap.add_argument("--backend", choices=["torch", "onnx-int8"], default="torch")
+    ap.add_argument("--pipelined", action="store_true",
+                    help="Overlap /run searches with streamed rewriter output")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--unload-idle", type=float, default=0,
+                    help="Free models unused for this many seconds (0 = keep warm forever)")
+    args = ap.parse_args()
+
+    serve(
+        QueryEnhancement(
+            profile_path=args.profile,
+            chroma_path=args.persist,
+            collection_name=args.collection,
+            top_k=args.k,
+            backend=args.backend,
+            pipelined=args.pipelined,
+        ),
+        host=args.host,
+        port=args.port,
+        unload_idle_s=args.unload_idle,
+    )
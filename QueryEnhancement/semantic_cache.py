@@ -0,0 +1,116 @@
+# semantic_cache.py
+"""
+Semantic cache for retrieval results (fused + reranked), in front of the
+collection.
+
+An entry is the set of query-variant embeddings (recall / precise / HyDE ...)
+that produced a result list. A new search hits when it has the same variant
+names and retrieval settings (`context`: filter, k, fusion, weights...) and
+every variant is within `threshold` cosine similarity of the cached one.
+
+Entries are scoped to an index version (collection id + the index_version
+chroma_init.py stamps on every rebuild), so rebuilding the collection
+invalidates them automatically. Vectors are kept in memory for the lookup;
+both vectors and results persist in DiskLRUCache tables (LRU-bounded).
+"""
+from __future__ import annotations
+import base64
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskLRUCache, text_hash
+
+DEFAULT_SEMANTIC_CACHE = os.path.join(DEFAULT_CACHE_DIR, "semantic_queries.sqlite")
+
+def index_version(collection) -> str:
+    """Changes whenever chroma_init.py rebuilds or updates the collection."""
+    return f"{getattr(collection, 'id', '')}:{(collection.metadata or {}).get('index_version', '')}"
+
+class SemanticQueryCache:
+    def __init__(self, version: str, path: str = DEFAULT_SEMANTIC_CACHE, threshold: float = 0.95,
+                 max_entries: int = 1000):
+        import numpy as np
+        self._np = np
+        self.version = version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.keys = DiskLRUCache(path, namespace="semantic_keys", max_entries=max_entries)
+        self.results = DiskLRUCache(path, namespace="semantic_results", max_entries=max_entries)
+        self.hits = self.misses = self.evictions = 0
+        # key -> (group, unit vectors (V x d)); group = context + variant names
+        self._entries: Dict[str, Tuple[str, Any]] = {}
+        self._lock = threading.Lock()   # the retrieval server searches from several threads
+        self._load()
+
+    def _load(self) -> None:
+        # Other versions (older builds, other collections) are skipped; an
+        # outdated build's entries never hit again and age out through the LRU
+        for key, raw in self.keys.items():
+            entry = json.loads(raw)
+            if entry["version"] != self.version:
+                continue
+            vecs = self._np.frombuffer(base64.b64decode(entry["vecs"]), dtype=self._np.float32)
+            self._entries[key] = (entry["group"], vecs.reshape(len(entry["names"]), -1))
+
+    def _unit(self, vectors: Sequence[Sequence[float]]):
+        m = self._np.asarray(vectors, dtype=self._np.float32)
+        return m / self._np.clip(self._np.linalg.norm(m, axis=1, keepdims=True), 1e-12, None)
+
+    @staticmethod
+    def _group(context: Dict[str, Any], names: Sequence[str]) -> str:
+        return text_hash(json.dumps(context, sort_keys=True, default=str), *names)
+
+    def get(self, context: Dict[str, Any], names: Sequence[str],
+            vectors: Sequence[Sequence[float]]) -> Optional[List[Dict[str, Any]]]:
+        """Cached results for the closest matching entry, or None (counts a hit/miss)."""
+        group = self._group(context, names)
+        q = self._unit(vectors)
+        best_key, best_sim = None, -1.0
+        with self._lock:
+            candidates = [(k, v) for k, (g, v) in self._entries.items() if g == group]
+        for key, vecs in candidates:
+            sim = float((vecs * q).sum(axis=1).min())   # every variant must be close
+            if sim > best_sim:
+                best_key, best_sim = key, sim
+        if best_key is not None and best_sim >= self.threshold:
+            raw = self.results.get(best_key)
+            if raw is not None:
+                self.keys.get(best_key)   # bump LRU
+                self.hits += 1
+                print(f"[semantic-cache] hit (cos={best_sim:.3f})")
+                return json.loads(raw)
+            with self._lock:
+                self._entries.pop(best_key, None)   # results evicted on disk
+        self.misses += 1
+        return None
+
+    def put(self, context: Dict[str, Any], names: Sequence[str], vectors: Sequence[Sequence[float]],
+            results: List[Dict[str, Any]]) -> None:
+        group = self._group(context, names)
+        vecs = self._unit(vectors)
+        key = text_hash(self.version, group, base64.b64encode(vecs.tobytes()).decode("ascii"))
+        self.keys.put(key, json.dumps({
+            "version": self.version, "group": group, "names": list(names),
+            "vecs": base64.b64encode(vecs.tobytes()).decode("ascii"),
+        }).encode("utf-8"))
+        self.results.put(key, json.dumps(results, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._entries[key] = (group, vecs)
+            over = len(self._entries) > self.max_entries
+        if over:
+            # Keep the in-memory index in line with the disk LRU
+            live = set(k for k, _ in self.keys.items())
+            with self._lock:
+                for k in [k for k in self._entries if k not in live]:
+                    del self._entries[k]
+                    self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+            "evictions": self.evictions, "hit_rate": (self.hits / total) if total else 0.0,
+            "threshold": self.threshold, "index_version": self.version,
+        }
@@ -9,23 +9,36 @@ Outputs:
 
 from __future__ import annotations
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Dict, Optional
-from openai import OpenAI  # pip install openai
 
-from dotenv import load_dotenv
-import os
+from llm_cache import DEFAULT_LLM_CACHE, LLMResponseCache, shared_cache
 
-load_dotenv()  # looks for .env in the working dir, then parents
-api_key = os.getenv("OPENAI_API_KEY")
+PROMPT_VERSION = "step_back@1"   # bump when the prompt below changes (invalidates cached plans)
 
 @dataclass
 class StepBackPrompter:
     model: str = "gpt-5"
     client: Optional[Any] = None
+    cache_path: Optional[str] = DEFAULT_LLM_CACHE   # None disables the response cache
+    bypass_cache: bool = False                      # always call the model (still refreshes the cache)
+    _cache: Optional[LLMResponseCache] = field(default=None, init=False, repr=False)
 
-    def __post_init__(self):
-        self.client = self.client or OpenAI()
+    def _response_cache(self) -> LLMResponseCache:
+        """Opened on first use and kept (one connection per cache path per process)."""
+        if self._cache is None:
+            self._cache = shared_cache(self.cache_path)
+        return self._cache
+
+    def _get_client(self):
+        """The OpenAI client, created on the first cache miss (cache hits need no API key)."""
+        if self.client is None:
+            # openai/dotenv are imported lazily so importing this module stays cheap
+            from dotenv import load_dotenv
+            from openai import OpenAI  # pip install openai
+            load_dotenv()  # looks for .env in the working dir, then parents
+            self.client = OpenAI()
+        return self.client
 
     def generate(self, profile: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -55,12 +68,18 @@ class StepBackPrompter:
         Do NOT invent Success Criterion IDs. Each field ≤ 40 words.
         USER_PROFILE: {json.dumps(profile, ensure_ascii=False)}
         """
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        text = resp.choices[0].message.content.strip()
-        i, j = text.find("{"), text.rfind("}")
-        if i == -1 or j == -1:
-            raise ValueError("StepBackPrompter: model did not return JSON.")
-        return json.loads(text[i:j+1])
\ No newline at end of file
+        def call() -> Dict[str, Any]:
+            resp = self._get_client().chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            text = resp.choices[0].message.content.strip()
+            i, j = text.find("{"), text.rfind("}")
+            if i == -1 or j == -1:
+                raise ValueError("StepBackPrompter: model did not return JSON.")
+            return json.loads(text[i:j+1])
+
+        if not self.cache_path:
+            return call()
+        return self._response_cache().cached_call(
+            self.model, PROMPT_VERSION, profile, call, bypass=self.bypass_cache)
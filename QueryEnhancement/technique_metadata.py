@@ -0,0 +1,164 @@
+# technique_metadata.py
+"""
+Structured metadata for WCAG technique documents, parsed at index time by
+chroma_init.py, and the mapping from step-back plan constraints to a Chroma
+`where` filter used by QueryEnhancement.
+
+Per document (copied onto every passage in section mode):
+  family            "ARIA", "C", "F", "G", "H", "PDF", "SCR", "SM", "SVR", "T"
+  success_criteria  linked SC numbers as ",1.3.1,3.3.2," (Chroma metadata is scalar)
+  min_level         lowest conformance level among the linked SCs: 1=A, 2=AA, 3=AAA (0 = none)
+  min_wcag          earliest WCAG version containing a linked SC: 2.0, 2.1 or 2.2 (0 = none)
+  is_sufficient / is_advisory / is_failure
+                    how the technique relates to at least one of its SCs
+  technology        "all", "html", "css", "aria", "pdf", "script", "smil", "server", "text" or "other"
+  applies_to        the "This technique applies to ..." sentence
+
+    constraints_to_where(["WCAG 2.2 AA", "HTML techniques"])
+    -> {"$and": [{"min_level": {"$lte": 2}}, {"min_wcag": {"$lte": 2.2}},
+                 {"technology": {"$in": ["html", "all"]}}]}
+"""
+from __future__ import annotations
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+METADATA_VERSION = 1   # bump when fields change so --incremental re-writes unchanged docs
+
+LEVELS = {"A": 1, "AA": 2, "AAA": 3}
+
+# WCAG 2.2 success criteria: number -> (level, version introduced)
+SC_TABLE: Dict[str, tuple] = {
+    "1.1.1": ("A", 2.0),
+    "1.2.1": ("A", 2.0), "1.2.2": ("A", 2.0), "1.2.3": ("A", 2.0), "1.2.4": ("AA", 2.0),
+    "1.2.5": ("AA", 2.0), "1.2.6": ("AAA", 2.0), "1.2.7": ("AAA", 2.0), "1.2.8": ("AAA", 2.0),
+    "1.2.9": ("AAA", 2.0),
+    "1.3.1": ("A", 2.0), "1.3.2": ("A", 2.0), "1.3.3": ("A", 2.0), "1.3.4": ("AA", 2.1),
+    "1.3.5": ("AA", 2.1), "1.3.6": ("AAA", 2.1),
+    "1.4.1": ("A", 2.0), "1.4.2": ("A", 2.0), "1.4.3": ("AA", 2.0), "1.4.4": ("AA", 2.0),
+    "1.4.5": ("AA", 2.0), "1.4.6": ("AAA", 2.0), "1.4.7": ("AAA", 2.0), "1.4.8": ("AAA", 2.0),
+    "1.4.9": ("AAA", 2.0), "1.4.10": ("AA", 2.1), "1.4.11": ("AA", 2.1), "1.4.12": ("AA", 2.1),
+    "1.4.13": ("AA", 2.1),
+    "2.1.1": ("A", 2.0), "2.1.2": ("A", 2.0), "2.1.3": ("AAA", 2.0), "2.1.4": ("A", 2.1),
+    "2.2.1": ("A", 2.0), "2.2.2": ("A", 2.0), "2.2.3": ("AAA", 2.0), "2.2.4": ("AAA", 2.0),
+    "2.2.5": ("AAA", 2.0), "2.2.6": ("AAA", 2.1),
+    "2.3.1": ("A", 2.0), "2.3.2": ("AAA", 2.0), "2.3.3": ("AAA", 2.1),
+    "2.4.1": ("A", 2.0), "2.4.2": ("A", 2.0), "2.4.3": ("A", 2.0), "2.4.4": ("A", 2.0),
+    "2.4.5": ("AA", 2.0), "2.4.6": ("AA", 2.0), "2.4.7": ("AA", 2.0), "2.4.8": ("AAA", 2.0),
+    "2.4.9": ("AAA", 2.0), "2.4.10": ("AAA", 2.0), "2.4.11": ("AA", 2.2), "2.4.12": ("AAA", 2.2),
+    "2.4.13": ("AAA", 2.2),
+    "2.5.1": ("A", 2.1), "2.5.2": ("A", 2.1), "2.5.3": ("A", 2.1), "2.5.4": ("A", 2.1),
+    "2.5.5": ("AAA", 2.1), "2.5.6": ("AAA", 2.1), "2.5.7": ("AA", 2.2), "2.5.8": ("AA", 2.2),
+    "3.1.1": ("A", 2.0), "3.1.2": ("AA", 2.0), "3.1.3": ("AAA", 2.0), "3.1.4": ("AAA", 2.0),
+    "3.1.5": ("AAA", 2.0), "3.1.6": ("AAA", 2.0),
+    "3.2.1": ("A", 2.0), "3.2.2": ("A", 2.0), "3.2.3": ("AA", 2.0), "3.2.4": ("AA", 2.0),
+    "3.2.5": ("AAA", 2.0), "3.2.6": ("A", 2.2),
+    "3.3.1": ("A", 2.0), "3.3.2": ("A", 2.0), "3.3.3": ("AA", 2.0), "3.3.4": ("AA", 2.0),
+    "3.3.5": ("AAA", 2.0), "3.3.6": ("AAA", 2.0), "3.3.7": ("A", 2.2), "3.3.8": ("AA", 2.2),
+    "3.3.9": ("AAA", 2.2),
+    "4.1.1": ("A", 2.0), "4.1.2": ("A", 2.0), "4.1.3": ("AA", 2.1),
+}
+
+_FAMILY = re.compile(r"^(ARIA|PDF|SCR|SVR|SM|C|F|G|H|T)\d+$", re.I)
+# "[1.3.1: Info and Relationships](url) (Sufficient when used with ...)"
+_SC_LINK = re.compile(r"\[([1-4]\.\d{1,2}\.\d{1,2}):[^\]]*\]\([^)]*\)\s*\((Sufficient|Advisory|Failure)", re.I)
+_APPLIES = re.compile(r"^This (?:technique|failure) applies to (.+?)$", re.M)
+_MD_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+
+# First match wins; checked against the lower-cased "applies to" sentence
+_TECHNOLOGIES = [
+    ("pdf", ("pdf",)),
+    ("aria", ("aria",)),
+    ("smil", ("smil",)),
+    ("server", ("server",)),
+    ("script", ("script",)),
+    ("css", ("css",)),
+    ("html", ("html",)),
+    ("text", ("plain text",)),
+    ("all", ("all technologies", "any technology", "all web technologies", "all content")),
+]
+
+def _technology(applies_to: str) -> str:
+    low = applies_to.lower()
+    for tech, needles in _TECHNOLOGIES:
+        if any(n in low for n in needles):
+            return tech
+    return "other" if applies_to else "all"
+
+def extract_metadata(filename: str, text: str) -> Dict[str, Any]:
+    """Technique metadata from a wcag_techniques/*.md file (see module docstring)."""
+    stem = os.path.splitext(filename)[0]
+    m = _FAMILY.match(stem)
+    family = re.sub(r"\d+$", "", stem).upper() if m else ""
+
+    # Only the "About this Technique" block lists the technique's own SCs
+    about = text.split("\n## Description", 1)[0]
+    links = _SC_LINK.findall(about)
+    numbers = list(dict.fromkeys(n for n, _ in links))
+    statuses = {s.lower() for _, s in links}
+    known = [SC_TABLE[n] for n in numbers if n in SC_TABLE]
+
+    am = _APPLIES.search(about)
+    applies_to = _MD_LINK.sub(r"\1", am.group(1)).strip().rstrip(".") if am else ""
+
+    return {
+        "family": family,
+        "success_criteria": "," + ",".join(numbers) + "," if numbers else "",
+        "min_level": min((LEVELS[lvl] for lvl, _ in known), default=0),
+        "min_wcag": min((ver for _, ver in known), default=0.0),
+        "is_sufficient": "sufficient" in statuses,
+        "is_advisory": "advisory" in statuses,
+        "is_failure": "failure" in statuses or family == "F",
+        "technology": _technology(applies_to),
+        "applies_to": applies_to,
+        "meta_version": METADATA_VERSION,
+    }
+
+# -------- plan constraints -> Chroma where --------
+_WCAG_VERSION = re.compile(r"\bWCAG\s*(2\.[0-2])\b", re.I)
+# "A" alone is too ambiguous in free text; only "Level A" / "WCAG 2.2 A" count
+_LEVEL = re.compile(r"(?:\b(?:Level|WCAG\s*2\.[0-2])\s+(AAA|AA|A)|\b(AAA|AA))\b(?![-\w])", re.I)
+_CONSTRAINT_TECH = [
+    ("aria", re.compile(r"\b(WAI-?ARIA|ARIA)\b", re.I)),
+    ("pdf", re.compile(r"\bPDF\b", re.I)),
+    ("css", re.compile(r"\bCSS\b", re.I)),
+    ("html", re.compile(r"\bHTML\b", re.I)),
+    ("script", re.compile(r"\b(script|javascript|client-side)\b", re.I)),
+]
+_DOC_TYPES = [
+    ("is_failure", re.compile(r"\bfailures?\b", re.I)),
+    ("is_sufficient", re.compile(r"\bsufficient\b", re.I)),
+    ("is_advisory", re.compile(r"\badvisory\b", re.I)),
+]
+
+def constraints_to_where(constraints: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Translate step-back plan constraints into a Chroma metadata filter.
+    Recognized: WCAG version ("WCAG 2.1"), conformance level ("AA", "Level A"),
+    technologies (HTML/CSS/ARIA/PDF/script; "all technologies" techniques are
+    always kept) and doc types (failures / sufficient / advisory techniques).
+    Returns None when nothing is recognized.
+    """
+    clauses: List[Dict[str, Any]] = []
+    text = " ; ".join(c for c in constraints or [] if isinstance(c, str))
+
+    levels = [LEVELS[(a or b).upper()] for a, b in _LEVEL.findall(text)]
+    if levels:
+        clauses.append({"min_level": {"$lte": max(levels)}})
+    versions = [float(v) for v in _WCAG_VERSION.findall(text)]
+    if versions:
+        clauses.append({"min_wcag": {"$lte": max(versions)}})
+
+    techs = [t for t, rx in _CONSTRAINT_TECH if rx.search(text)]
+    if techs:
+        clauses.append({"technology": {"$in": techs + ["all"]}})
+
+    types = [{field: True} for field, rx in _DOC_TYPES if rx.search(text)]
+    if len(types) == 1:
+        clauses.append(types[0])
+    elif types:
+        clauses.append({"$or": types})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -1,8 +1,11 @@
 # UID_Generator.py
+from __future__ import annotations
 import hashlib, re
-from typing import Optional
-from selenium.webdriver.remote.webdriver import WebDriver
-from selenium.webdriver.remote.webelement import WebElement
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:  # selenium is only needed for type hints here
+    from selenium.webdriver.remote.webdriver import WebDriver
+    from selenium.webdriver.remote.webelement import WebElement
 
 # Normalize outerHTML: collapse whitespace and strip data-* attributes so
 # dynamic tracking junk doesn't break determinism.
@@ -44,8 +47,13 @@ class UIDGenerator:
     def id_for_element(driver: WebDriver, element: WebElement) -> str:
         dom_path: str = driver.execute_script(_JS_DOM_PATH, element) or ""
         outer: str = element.get_attribute("outerHTML") or ""
-        normalized = _normalize_html(outer)
-        return hashlib.sha1(f"{dom_path}||{normalized}".encode("utf-8")).hexdigest()[:16]
+        return UIDGenerator.uid_from_parts(dom_path, outer)
+
+    @staticmethod
+    def uid_from_parts(dom_path: str, outer_html: str) -> str:
+        """UID from an already-extracted DOM path + raw outerHTML (see dom_extract.py)."""
+        normalized = _normalize_html(outer_html or "")
+        return hashlib.sha1(f"{dom_path or ''}||{normalized}".encode("utf-8")).hexdigest()[:16]
 
     @staticmethod
     def element_type(element: WebElement) -> str:
@@ -68,13 +76,23 @@ class UIDGenerator:
         """
         Lightweight fallback 'descriptor' (you can swap in your GPT call elsewhere).
         """
-        tag = UIDGenerator.element_type(element)
-        cls = (element.get_attribute("class") or "").strip()
-        aria = (element.get_attribute("aria-label") or "").strip()
-        name = (element.get_attribute("name") or "").strip()
-        placeholder = (element.get_attribute("placeholder") or "").strip()
-        alt = (element.get_attribute("alt") or "").strip()
-        txt = UIDGenerator.short_text(element)
+        attrs = {n: element.get_attribute(n) for n in ("class", "aria-label", "name", "placeholder", "alt")}
+        return UIDGenerator.heuristic_from_fields(
+            UIDGenerator.element_type(element), attrs, UIDGenerator.short_text(element))
+
+    @staticmethod
+    def heuristic_from_fields(tag: str, attrs: Dict[str, Optional[str]], text: str, max_len: int = 80) -> str:
+        """
+        Same descriptor as heuristic_descriptor, from an already-captured
+        snapshot (tag, attributes, visible text) — no WebDriver round trips.
+        """
+        cls = (attrs.get("class") or "").strip()
+        aria = (attrs.get("aria-label") or "").strip()
+        name = (attrs.get("name") or "").strip()
+        placeholder = (attrs.get("placeholder") or "").strip()
+        alt = (attrs.get("alt") or "").strip()
+        txt = _WS.sub(" ", text or "").strip()
+        txt = (txt[: max_len - 1] + "…") if len(txt) > max_len else txt
 
         bits = [f"<{tag}>"]
         if cls: bits.append(f'class="{cls}"')
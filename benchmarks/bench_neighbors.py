@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# bench_neighbors.py
+"""
+Neighbor-engine benchmark on synthetic page layouts: rows of small controls
+on a tall page plus a few full-width containers, timed for each metric and
+scope, with the old all-pairs double loop as a baseline on the smaller sizes.
+
+Usage (from the repo root):
+  python benchmarks/bench_neighbors.py --sizes 1000 10000 --repeat 3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from element_neighbors import _center, _distance, container_key, nearest_neighbors  # noqa: E402
+
+def synthetic_page(n: int, seed: int = 0):
+    """n rects laid out in 1400px-wide rows, ~2% of them tall containers; plus dom paths."""
+    rng = random.Random(seed)
+    rects, paths = [], []
+    x, y, row_h, section = 0.0, 0.0, 0.0, 0
+    for i in range(n):
+        if rng.random() < 0.02:
+            rects.append({"x": 0.0, "y": y, "width": 1400.0, "height": rng.uniform(200, 4000)})
+            section += 1
+        else:
+            w, h = rng.uniform(20, 300), rng.uniform(12, 60)
+            if x + w > 1400:
+                x, y, row_h = 0.0, y + row_h + 8, 0.0
+            rects.append({"x": x, "y": y, "width": w, "height": h})
+            x, row_h = x + w + 6, max(row_h, h)
+        paths.append(f"html:nth-of-type(1)>body:nth-of-type(1)>section:nth-of-type({section + 1})"
+                     f">div:nth-of-type({i % 7 + 1})>span:nth-of-type({i + 1})")
+    return rects, paths
+
+def _all_pairs(rects, k):
+    ctrs = [_center(r) for r in rects]
+    out = []
+    for i, c in enumerate(ctrs):
+        dists = sorted((_distance(c, c2), j) for j, c2 in enumerate(ctrs) if j != i)
+        out.append([j for _, j in dists[:k]])
+    return out
+
+def _median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark nearest_neighbors")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--baseline-max", type=int, default=2000,
+                    help="Only run the all-pairs baseline up to this many elements")
+    args = ap.parse_args()
+
+    print(f"{'n':>7s} {'case':28s} {'median ms':>10s}")
+    for n in args.sizes:
+        rects, paths = synthetic_page(n)
+        cases = [(f"{m}/page", m, None) for m in ("center", "edge")]
+        cases.append(("center/landmark", "center", [container_key(p, "landmark") for p in paths]))
+        for label, metric, groups in cases:
+            ms = _median_ms(lambda: nearest_neighbors(rects, args.k, metric, groups), args.repeat)
+            print(f"{n:7d} {label:28s} {ms:10.1f}")
+        if n <= args.baseline_max:
+            ms = _median_ms(lambda: _all_pairs(rects, args.k), 1)
+            print(f"{n:7d} {'all-pairs sort (old)':28s} {ms:10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# bench_onnx.py
+"""
+fp32 PyTorch vs int8 ONNX benchmark + ranking-agreement check for the embedder
+(all-MiniLM-L6-v2) and the cross-encoder (ms-marco-MiniLM-L-6-v2).
+
+Each backend runs in its own subprocess, so the peak RSS it reports is just
+that backend. The parent process then compares the rankings:
+  - embedder:      mean overlap@k between the dense top-k of each query
+  - cross-encoder: mean overlap@k and mean Spearman correlation of the scores
+and exits with status 1 if agreement falls below the tolerances.
+
+Usage (from the repo root):
+  python benchmarks/bench_onnx.py --docs 200 --k 10
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "QueryEnhancement"))
+
+EMBED_MODEL = "all-MiniLM-L6-v2"
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+QUERIES = [
+    "text can be resized up to 200 percent without loss of content",
+    "minimum contrast ratio for text and images of text",
+    "larger touch targets for pointer input",
+    "screen reader accessible name for form inputs",
+    "aria-describedby descriptive label for controls",
+    "keyboard focus visible indicator",
+    "captions for prerecorded video",
+    "failure: using color alone to convey information",
+]
+
+def _load_docs(n: int):
+    folder = os.path.join(ROOT, "wcag_techniques")
+    names = sorted(f for f in os.listdir(folder) if f.endswith(".md"))[:n]
+    docs = []
+    for name in names:
+        with open(os.path.join(folder, name), "r", encoding="utf-8", errors="ignore") as f:
+            docs.append(f.read()[:2000])   # same cap rerank_docs uses
+    return docs
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def measure(backend: str, n_docs: int, k: int) -> dict:
+    import numpy as np
+    from model_registry import get_cross_encoder, get_embedder
+
+    docs = _load_docs(n_docs)
+    out = {"backend": backend}
+
+    t0 = time.perf_counter()
+    embed = get_embedder(EMBED_MODEL, backend).load()
+    ce = get_cross_encoder(RERANK_MODEL, backend).load()
+    out["load_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    doc_emb = np.asarray(embed(docs), dtype=np.float32)
+    out["embed_docs_per_s"] = len(docs) / (time.perf_counter() - t0)
+
+    q_emb = np.asarray(embed(QUERIES), dtype=np.float32)
+    doc_emb /= np.linalg.norm(doc_emb, axis=1, keepdims=True)
+    q_emb /= np.linalg.norm(q_emb, axis=1, keepdims=True)
+    out["dense_topk"] = np.argsort(-(q_emb @ doc_emb.T), axis=1)[:, :k].tolist()
+
+    pairs = [(q, d) for q in QUERIES for d in docs]
+    t0 = time.perf_counter()
+    scores = np.asarray(ce.predict(pairs), dtype=np.float64).reshape(len(QUERIES), len(docs))
+    out["rerank_pairs_per_s"] = len(pairs) / (time.perf_counter() - t0)
+    out["ce_scores"] = scores.tolist()
+
+    out["peak_rss_mb"] = _peak_rss_mb()
+    return out
+
+def _overlap(a, b, k: int) -> float:
+    return len(set(a[:k]) & set(b[:k])) / float(k)
+
+def _spearman(a, b) -> float:
+    import numpy as np
+    ra = np.argsort(np.argsort(a)).astype(np.float64)
+    rb = np.argsort(np.argsort(b)).astype(np.float64)
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+def compare(ref: dict, cand: dict, k: int) -> dict:
+    import numpy as np
+    dense = np.mean([_overlap(a, b, k) for a, b in zip(ref["dense_topk"], cand["dense_topk"])])
+    ce_top = np.mean([
+        _overlap(list(np.argsort(-np.asarray(a))), list(np.argsort(-np.asarray(b))), k)
+        for a, b in zip(ref["ce_scores"], cand["ce_scores"])
+    ])
+    rho = np.mean([_spearman(a, b) for a, b in zip(ref["ce_scores"], cand["ce_scores"])])
+    return {"dense_overlap": float(dense), "rerank_overlap": float(ce_top), "rerank_spearman": float(rho)}
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark and check int8 ONNX vs fp32 PyTorch")
+    ap.add_argument("--docs", type=int, default=200, help="Number of technique docs to embed/rerank")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--min-overlap", type=float, default=0.8, help="Minimum mean top-k overlap")
+    ap.add_argument("--min-spearman", type=float, default=0.95, help="Minimum mean rerank Spearman rho")
+    ap.add_argument("--measure", choices=["torch", "onnx-int8"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.measure:   # child process: one backend only
+        print(json.dumps(measure(args.measure, args.docs, args.k)))
+        return
+
+    results = {}
+    for backend in ("torch", "onnx-int8"):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--measure", backend, "--docs", str(args.docs), "--k", str(args.k)],
+            capture_output=True, text=True, check=True,
+        )
+        results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"{'backend':10s} {'load s':>8s} {'embed docs/s':>13s} {'rerank pairs/s':>15s} {'peak RSS MB':>12s}")
+    for backend, r in results.items():
+        print(f"{backend:10s} {r['load_s']:8.2f} {r['embed_docs_per_s']:13.1f} "
+              f"{r['rerank_pairs_per_s']:15.1f} {r['peak_rss_mb']:12.0f}")
+
+    agree = compare(results["torch"], results["onnx-int8"], args.k)
+    print(f"\nagreement vs fp32 (k={args.k}): dense overlap {agree['dense_overlap']:.3f}, "
+          f"rerank overlap {agree['rerank_overlap']:.3f}, rerank spearman {agree['rerank_spearman']:.3f}")
+
+    ok = (agree["dense_overlap"] >= args.min_overlap
+          and agree["rerank_overlap"] >= args.min_overlap
+          and agree["rerank_spearman"] >= args.min_spearman)
+    print("PASS" if ok else "FAIL: int8 rankings drift beyond tolerance")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# bench_startup.py
+"""
+CLI start-up benchmark: runs each entry point in a fresh interpreter (`--help`
+for the CLIs, a bare import for library modules) and reports the median
+wall-clock time. Use --importtime to also list the slowest imports of each.
+
+Usage (from the repo root):
+  python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QE = os.path.join(ROOT, "QueryEnhancement")
+
+# (label, cwd, argv after `python`)
+CASES = [
+    ("query_enhancement --help", QE, ["query_enhancement.py", "--help"]),
+    ("chroma_init --help", QE, ["chroma_init.py", "--help"]),
+    ("retrieval_server --help", QE, ["retrieval_server.py", "--help"]),
+    ("import step_back_prompter", QE, ["-c", "import step_back_prompter"]),
+    ("import query_rewriter", QE, ["-c", "import query_rewriter"]),
+    ("update_init_profile --help", ROOT, ["update_init_profile.py", "--help"]),
+    ("import initialize_element_dataset", ROOT, ["-c", "import initialize_element_dataset"]),
+    ("import element_neighbors", ROOT, ["-c", "import element_neighbors"]),
+    ("import element_feedback_loop", ROOT, ["-c", "import element_feedback_loop"]),
+    ("import element_dataset_pipeline", ROOT, ["-c", "import element_dataset_pipeline"]),
+]
+
+def _time_once(cwd: str, argv: list) -> float:
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable] + argv, cwd=cwd, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - t0
+
+def _slowest_imports(cwd: str, argv: list, top: int):
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + argv, cwd=cwd,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure CLI/module start-up time")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--importtime", action="store_true", help="Show the slowest imports per case")
+    ap.add_argument("--top", type=int, default=5)
+    args = ap.parse_args()
+
+    baseline = statistics.median(_time_once(ROOT, ["-c", "pass"]) for _ in range(args.repeat))
+    print(f"{'case':40s} {'median ms':>10s} {'min ms':>8s}   (bare interpreter: {baseline * 1000:.0f} ms)")
+    for label, cwd, argv in CASES:
+        times = [_time_once(cwd, argv) for _ in range(args.repeat)]
+        print(f"{label:40s} {statistics.median(times) * 1000:10.0f} {min(times) * 1000:8.0f}")
+        if args.importtime:
+            for us, name in _slowest_imports(cwd, argv, args.top):
+                print(f"    {us / 1000:8.1f} ms  {name.strip()}")
+
+if __name__ == "__main__":
+    main()
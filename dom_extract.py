@@ -0,0 +1,161 @@
+# dom_extract.py
+"""
+Single-round-trip DOM extraction shared by the three dataset stages
+(initialize_element_dataset, element_neighbors, element_feedback_loop).
+
+One execute_script call walks the DOM in the browser and returns, for every
+meaningful element in document order: tag, selected attributes, visible text,
+bounding rect, computed style facts, its :nth-of-type DOM path and outerHTML.
+UIDs are then computed in Python from (dom_path, outerHTML) exactly as
+UIDGenerator.id_for_element does, so IDs match the per-element path.
+
+extract_elements_static() builds the same records from the saved HTML file
+without a browser (static_dom.py); only the layout fields (rect, bbox,
+style) are None, so stages that need them still go through Chrome.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List
+
+from UID_Generator import UIDGenerator
+from static_dom import static_records
+
+MEANINGFUL = {
+    "a","button","input","select","textarea","label","img","svg","video","audio",
+    "nav","header","footer","main","aside","section","article","form","fieldset","legend",
+    "h1","h2","h3","h4","h5","h6","li","ul","ol","table","thead","tbody","tfoot","tr","td","th",
+    "div","span"
+}
+
+# Attributes included in the describer snapshot
+SNAPSHOT_ATTRS = ["id","class","name","type","href","value","placeholder","title","aria-label","role","alt"]
+
+# arguments[0]: meaningful tag names, arguments[1]: attribute names
+_JS_BULK_EXTRACT = """
+return (function(tags, attrNames){
+  const wanted = new Set(tags);
+  const out = [];
+
+  function domPath(el){
+    const parts = [];
+    let cur = el;
+    while (cur && cur.nodeType === 1 && cur.tagName) {
+      let idx = 1;
+      let sib = cur.previousElementSibling;
+      while (sib) {
+        if (sib.tagName === cur.tagName) idx++;
+        sib = sib.previousElementSibling;
+      }
+      parts.push(cur.tagName.toLowerCase() + ":nth-of-type(" + idx + ")");
+      cur = cur.parentElement;
+    }
+    return parts.reverse().join(">");
+  }
+  function parseRGB(s){
+    if(!s) return null;
+    const m = s.match(/rgba?\\((\\d+),\\s*(\\d+),\\s*(\\d+)(?:,\\s*([\\d\\.]+))?\\)/i);
+    if(!m) return null;
+    return {r:+m[1], g:+m[2], b:+m[3]};
+  }
+  function rgbToHsl(r,g,b){
+    r/=255; g/=255; b/=255;
+    const max=Math.max(r,g,b), min=Math.min(r,g,b);
+    let h,s,l=(max+min)/2;
+    if (max===min){ h=0; s=0; }
+    else {
+      const d=max-min;
+      s = l>0.5 ? d/(2-max-min) : d/(max+min);
+      switch(max){
+        case r: h=(g-b)/d + (g<b?6:0); break;
+        case g: h=(b-r)/d + 2; break;
+        case b: h=(r-g)/d + 4; break;
+      }
+      h/=6;
+    }
+    return {h:Math.round(h*360), s:Math.round(s*100), l:Math.round(l*100)};
+  }
+  // WebDriver's getAttribute returns the resolved property for these
+  function attr(el, name){
+    if ((name === "href" || name === "value") && typeof el[name] === "string") return el[name];
+    return el.getAttribute(name);
+  }
+
+  const all = document.getElementsByTagName("*");
+  for (let i = 0; i < all.length; i++) {
+    const el = all[i];
+    const tag = el.tagName.toLowerCase();
+    if (!wanted.has(tag)) continue;
+
+    const cs = window.getComputedStyle(el);
+    const rect = el.getBoundingClientRect();
+    const hidden = cs.display === "none" || cs.visibility === "hidden";
+    const attrs = {};
+    for (const n of attrNames) {
+      const v = attr(el, n);
+      if (v) attrs[n] = v;
+    }
+    const fg = parseRGB(cs.color);
+    const bg = parseRGB(cs.backgroundColor);
+    out.push({
+      tag: tag,
+      attrs: attrs,
+      text: hidden ? "" : ((el.innerText !== undefined ? el.innerText : el.textContent) || "").trim(),
+      rect: {x: rect.x, y: rect.y, width: rect.width, height: rect.height},
+      bbox: {x: Math.trunc(rect.left + window.scrollX), y: Math.trunc(rect.top + window.scrollY),
+             w: Math.trunc(rect.width), h: Math.trunc(rect.height)},
+      style: {
+        width: Math.round(rect.width),
+        height: Math.round(rect.height),
+        color: cs.color,
+        backgroundColor: cs.backgroundColor,
+        fontSize: cs.fontSize,
+        fontWeight: cs.fontWeight,
+        hslFG: fg ? rgbToHsl(fg.r, fg.g, fg.b) : null,
+        hslBG: bg ? rgbToHsl(bg.r, bg.g, bg.b) : null,
+        display: cs.display,
+        visibility: cs.visibility,
+        opacity: cs.opacity
+      },
+      dom_path: domPath(el),
+      outerHTML: el.outerHTML
+    });
+  }
+  return out;
+})(arguments[0], arguments[1]);
+"""
+
+def extract_elements(driver) -> List[Dict[str, Any]]:
+    """
+    All meaningful elements of the loaded page in document order, as dicts with
+    uid, tag, attrs, text, rect, bbox, style, dom_path and outerHTML.
+    """
+    records = driver.execute_script(_JS_BULK_EXTRACT, sorted(MEANINGFUL), SNAPSHOT_ATTRS) or []
+    for rec in records:
+        rec["uid"] = UIDGenerator.uid_from_parts(rec["dom_path"], rec["outerHTML"])
+    return records
+
+def load_page(driver, html_path: Path) -> List[Dict[str, Any]]:
+    """Navigate an existing (pooled) driver to a saved page and extract it."""
+    driver.get(Path(html_path).resolve().as_uri())
+    return extract_elements(driver)
+
+def extract_elements_static(html_path: Path) -> List[Dict[str, Any]]:
+    """extract_elements() for a saved page, without a browser (no layout fields)."""
+    html = Path(html_path).read_text(encoding="utf-8", errors="replace")
+    records = static_records(html, Path(html_path).resolve().as_uri(), sorted(MEANINGFUL), SNAPSHOT_ATTRS)
+    for rec in records:
+        rec["uid"] = UIDGenerator.uid_from_parts(rec["dom_path"], rec["outerHTML"])
+    return records
+
+def snapshot_from_record(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """The describer snapshot ({tag, text, attrs, bbox?, outerHTML?}) for an extracted element."""
+    snap = {"tag": rec["tag"], "text": rec["text"], "attrs": dict(rec["attrs"])}
+    if rec.get("bbox") is not None:   # static extraction has no layout
+        snap["bbox"] = dict(rec["bbox"])
+    outer = rec.get("outerHTML") or ""
+    if len(outer) <= 1200:
+        snap["outerHTML"] = outer
+    return snap
+
+def heuristic_from_record(rec: Dict[str, Any]) -> str:
+    return UIDGenerator.heuristic_from_fields(rec["tag"], rec["attrs"], rec["text"])
@@ -0,0 +1,332 @@
+# element_dataset.py
+"""
+Element dataset file format.
+
+Compact format (what the stages write):
+
+    {
+      "Format": "compact-v1",
+      "Elements": [
+        {
+          "ID": "825ad325b9d2ad80",
+          "Element_type": "div",
+          "Element_descriptor": "Sign in panel ...",      # base descriptor only
+          "Style": {"width": 220, "height": 20, "color": [51, 51, 51],
+                    "font_size_px": 12, "font_weight": 400, "saturation_fg": 0,
+                    "visibility": "visible", "opacity": 1},         # unknown fields omitted
+          "Neighbors": [{"ID": "a33e07f914821f8e", "distance": 14.5}, ...],
+          "Element feedback": ["..."]
+        }
+      ]
+    }
+
+The legacy format copied every neighbor's full descriptor into
+"Neighbor_elements" and baked the style facts into "Element_descriptor".
+ElementDataset reads either one (legacy files are converted on load) and
+resolves full descriptors / neighbor descriptors lazily, producing the same
+strings the legacy format stored.
+
+Convert an existing file:
+  python element_dataset.py element_dataset.json              # in place -> compact
+  python element_dataset.py element_dataset.json -o old.json --to-legacy
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+FORMAT = "compact-v1"
+
+# -------- style facts --------
+_RGB = re.compile(r"rgba?\(\s*([\d.]+)\s*,\s*([\d.]+)\s*,\s*([\d.]+)\s*(?:,\s*([\d.]+)\s*)?\)", re.I)
+_TRANSPARENT = "rgba(0, 0, 0, 0)"
+
+def _num(v: float) -> Union[int, float]:
+    return int(v) if float(v).is_integer() else float(v)
+
+def _parse_color(s: Optional[str]) -> Union[None, str, List[Union[int, float]]]:
+    """'rgb(51, 51, 51)' -> [51, 51, 51]; 'rgba(..., a)' -> [r, g, b, a]; other syntaxes kept as text."""
+    if not s:
+        return None
+    m = _RGB.fullmatch(s.strip())
+    if not m:
+        return s
+    return [_num(float(g)) for g in m.groups() if g is not None]
+
+def _format_color(c: Union[str, List[Union[int, float]]]) -> str:
+    if isinstance(c, str):
+        return c
+    return ("rgba(" if len(c) == 4 else "rgb(") + ", ".join(f"{v:g}" for v in c) + ")"
+
+def _parse_px(s: Optional[str]) -> Optional[Union[int, float]]:
+    m = re.fullmatch(r"\s*([\d.]+)px\s*", s or "")
+    return _num(float(m.group(1))) if m else None
+
+def style_fields(s: Dict[str, Any]) -> Dict[str, Any]:
+    """Structured "Style" fields from a dom_extract record's "style" dict."""
+    if not s:
+        return {}
+    w, h = s.get("width"), s.get("height")
+    bg = s.get("backgroundColor")
+    fw = s.get("fontWeight")
+    hsl_fg, hsl_bg = s.get("hslFG") or {}, s.get("hslBG") or {}
+    opacity = s.get("opacity")
+    fs = _parse_px(s.get("fontSize"))
+    fields = {
+        "width": w if isinstance(w, int) else None,
+        "height": h if isinstance(h, int) else None,
+        "color": _parse_color(s.get("color")),
+        "bg": None if not bg or bg == _TRANSPARENT else _parse_color(bg),
+        "font_size_px": fs if fs is not None else (s.get("fontSize") or None),
+        "font_weight": int(fw) if isinstance(fw, str) and fw.isdigit() else (fw or None),
+        "saturation_fg": int(hsl_fg["s"]) if isinstance(hsl_fg.get("s"), (int, float)) else None,
+        "saturation_bg": int(hsl_bg["s"]) if isinstance(hsl_bg.get("s"), (int, float)) else None,
+        "visibility": s.get("visibility") or None,
+        "opacity": _num(float(opacity)) if _is_number(opacity) else (opacity or None),
+    }
+    return {k: v for k, v in fields.items() if v is not None}
+
+def _is_number(v: Any) -> bool:
+    try:
+        float(v)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def format_style(f: Dict[str, Any]) -> str:
+    """The legacy style-facts text ("size=220x20px, color=rgb(...), ...") for "Style" fields."""
+    if not f:
+        return ""
+    parts: List[str] = []
+    if isinstance(f.get("width"), int) and isinstance(f.get("height"), int):
+        parts.append(f"size={f['width']}x{f['height']}px")
+    if f.get("color"):
+        parts.append(f"color={_format_color(f['color'])}")
+    if f.get("bg"):
+        parts.append(f"bg={_format_color(f['bg'])}")
+    fs = f.get("font_size_px")
+    if fs:
+        parts.append(f"font-size={fs:g}px" if isinstance(fs, (int, float)) else f"font-size={fs}")
+    if f.get("font_weight"):
+        parts.append(f"font-weight={f['font_weight']}")
+    if f.get("saturation_fg") is not None:
+        parts.append(f"saturation_fg={f['saturation_fg']}%")
+    if f.get("saturation_bg") is not None:
+        parts.append(f"saturation_bg={f['saturation_bg']}%")
+    if f.get("visibility") and f["visibility"] != "visible":
+        parts.append(f"visibility={f['visibility']}")
+    op = f.get("opacity")
+    if op is not None and op != "" and op != 1:
+        parts.append(f"opacity={op:g}" if isinstance(op, (int, float)) else f"opacity={op}")
+    return ", ".join(parts)
+
+# "size=..., color=rgb(1, 2, 3), font-size=12px" -> {"size": ..., ...}
+_FACT = re.compile(r"([a-z_-]+)=(rgba?\([^)]*\)|[^,]*)")
+_FACT_KEYS = {"size", "color", "bg", "font-size", "font-weight", "saturation_fg", "saturation_bg",
+              "visibility", "opacity"}
+
+def _split_legacy_descriptor(text: str):
+    """'base; size=..., color=...' -> (base, Style fields); (text, {}) when there are no facts."""
+    base, sep, tail = (text or "").rpartition("; ")
+    if not sep:
+        return text or "", {}
+    facts = dict(_FACT.findall(tail))
+    if not facts or not set(facts) <= _FACT_KEYS or format_style(_facts_to_fields(facts)) != tail:
+        return text, {}   # not (exactly) a style-facts suffix: keep the descriptor verbatim
+    return base, _facts_to_fields(facts)
+
+def _facts_to_fields(facts: Dict[str, str]) -> Dict[str, Any]:
+    w = h = None
+    m = re.fullmatch(r"(\d+)x(\d+)px", facts.get("size", ""))
+    if m:
+        w, h = int(m.group(1)), int(m.group(2))
+    sat = lambda k: int(facts[k].rstrip("%")) if facts.get(k, "").rstrip("%").isdigit() else None
+    fw = facts.get("font-weight")
+    op = facts.get("opacity")
+    fs = _parse_px(facts.get("font-size"))
+    fields = {
+        "width": w, "height": h,
+        "color": _parse_color(facts.get("color")),
+        "bg": _parse_color(facts.get("bg")),
+        "font_size_px": fs if fs is not None else facts.get("font-size"),
+        "font_weight": int(fw) if fw and fw.isdigit() else fw,
+        "saturation_fg": sat("saturation_fg"),
+        "saturation_bg": sat("saturation_bg"),
+        "visibility": facts.get("visibility", "visible"),
+        "opacity": _num(float(op)) if _is_number(op) else (op if op else 1),
+    }
+    return {k: v for k, v in fields.items() if v is not None}
+
+# -------- dataset --------
+def new_entry(uid: str, elem_type: str, descriptor: str = "",
+              style: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "ID": uid,
+        "Element_type": elem_type,
+        "Element_descriptor": descriptor,
+        "Style": style or {},
+        "Neighbors": [],
+        "Element feedback": [],
+    }
+
+class ElementDataset:
+    """An element dataset in the compact format, with lazily resolved descriptors."""
+
+    def __init__(self, doc: Optional[Dict[str, Any]] = None, path: Optional[Path] = None):
+        self.path = path   # where commit() writes (set by load())
+        doc = doc or {}
+        if doc.get("Format") != FORMAT and doc.get("Elements"):
+            doc = from_legacy(doc)
+        self.elements: List[Dict[str, Any]] = list(doc.get("Elements", []))
+        self.index: Dict[str, Dict[str, Any]] = {e["ID"]: e for e in self.elements}
+
+    @classmethod
+    def load(cls, path: Path) -> "ElementDataset":
+        path = Path(path)
+        if not path.exists():
+            return cls(path=path)
+        return cls(json.loads(path.read_text(encoding="utf-8")), path=path)
+
+    def save(self, path: Path, legacy: bool = False) -> None:
+        doc = self.to_legacy() if legacy else {"Format": FORMAT, "Elements": self.elements}
+        Path(path).write_text(json.dumps(doc, indent=2 if legacy else None, ensure_ascii=False,
+                                         separators=None if legacy else (",", ":")),
+                              encoding="utf-8")
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self.index
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def add(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        self.elements.append(entry)
+        self.index[entry["ID"]] = entry
+        return entry
+
+    def get(self, uid: str) -> Optional[Dict[str, Any]]:
+        return self.index.get(uid)
+
+    def uids(self) -> List[str]:
+        return [e["ID"] for e in self.elements]
+
+    # Same mutation API as element_store.ElementStore; changes reach the file on commit()
+    def reset(self) -> None:
+        self.elements, self.index = [], {}
+
+    def upsert_many(self, entries: List[Dict[str, Any]]) -> None:
+        for e in entries:
+            cur = self.index.get(e["ID"])
+            if cur is None:
+                self.add(dict(e))
+                continue
+            cur.update({k: e[k] for k in ("Element_type", "Element_descriptor", "Style") if k in e})
+            if e.get("Neighbors"):
+                cur["Neighbors"] = e["Neighbors"]
+
+    def upsert(self, entry: Dict[str, Any]) -> None:
+        self.upsert_many([entry])
+
+    def set_neighbors_many(self, neighbors: Dict[str, List[Dict[str, Any]]]) -> None:
+        for uid, nbrs in neighbors.items():
+            self.set_neighbors(uid, nbrs)
+
+    def append_feedback(self, uid: str, text: str) -> None:
+        self.index[uid].setdefault("Element feedback", []).append(text)
+
+    def transaction(self):
+        return contextlib.nullcontext(self)
+
+    def snapshot(self) -> "ElementDataset":
+        return self
+
+    def commit(self) -> None:
+        if self.path is not None:
+            self.save(self.path)
+
+    def close(self) -> None:
+        pass
+
+    def descriptor(self, uid: str) -> str:
+        """Full descriptor: base text + style facts (what the legacy format stored)."""
+        e = self.index.get(uid) or {}
+        base = e.get("Element_descriptor", "")
+        facts = format_style(e.get("Style") or {})
+        return f"{base}; {facts}" if facts else base
+
+    def neighbor_descriptors(self, uid: str) -> List[str]:
+        return [self.descriptor(n["ID"]) for n in (self.index.get(uid) or {}).get("Neighbors", [])
+                if n.get("ID") in self.index]
+
+    def set_neighbors(self, uid: str, neighbors: List[Dict[str, Any]]) -> None:
+        self.index[uid]["Neighbors"] = neighbors
+
+    def to_legacy(self) -> Dict[str, Any]:
+        return {"Elements": [{
+            "ID": e["ID"],
+            "Element_descriptor": self.descriptor(e["ID"]),
+            "Element_type": e.get("Element_type", ""),
+            "Neighbor_elements": self.neighbor_descriptors(e["ID"]),
+            "Element feedback": list(e.get("Element feedback", [])),
+        } for e in self.elements]}
+
+def open_dataset(path: Path):
+    """
+    ElementStore (SQLite, per-row transactional writes) for .sqlite / .db
+    paths, otherwise a JSON-file ElementDataset rewritten on commit().
+    """
+    path = Path(path)
+    if path.suffix.lower() in (".sqlite", ".db"):
+        from element_store import ElementStore
+        return ElementStore(path)
+    return ElementDataset.load(path)
+
+def load_dataset(path: Path) -> ElementDataset:
+    """Read-only snapshot of a dataset file of any kind (JSON or store)."""
+    ds = open_dataset(path)
+    try:
+        return ds.snapshot()
+    finally:
+        ds.close()
+
+def from_legacy(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Legacy document -> compact document (neighbor descriptors matched back to UIDs)."""
+    by_text: Dict[str, List[str]] = {}
+    for e in doc.get("Elements", []):
+        by_text.setdefault(e.get("Element_descriptor", ""), []).append(e["ID"])
+
+    out: List[Dict[str, Any]] = []
+    unmatched = 0
+    for e in doc.get("Elements", []):
+        base, style = _split_legacy_descriptor(e.get("Element_descriptor", ""))
+        entry = new_entry(e["ID"], e.get("Element_type", ""), base, style)
+        for text in e.get("Neighbor_elements", []) or []:
+            uid = next((u for u in by_text.get(text, []) if u != e["ID"]), None)
+            if uid is None:
+                unmatched += 1
+                continue
+            entry["Neighbors"].append({"ID": uid, "distance": None})   # not recorded in the old format
+        entry["Element feedback"] = list(e.get("Element feedback", []))
+        out.append(entry)
+    if unmatched:
+        print(f"[dataset] {unmatched} legacy neighbor descriptors matched no element; dropped")
+    return {"Format": FORMAT, "Elements": out}
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert an element dataset between the legacy and compact formats.")
+    ap.add_argument("path", type=Path)
+    ap.add_argument("-o", "--out", type=Path, default=None, help="Output path (default: overwrite input)")
+    ap.add_argument("--to-legacy", action="store_true", help="Write the legacy (copied descriptors) format")
+    args = ap.parse_args()
+
+    before = args.path.stat().st_size
+    ds = ElementDataset.load(args.path)
+    out = args.out or args.path
+    ds.save(out, legacy=args.to_legacy)
+    print(f"[dataset] {len(ds)} elements: {before} -> {out.stat().st_size} bytes ({out})")
+
+if __name__ == "__main__":
+    main()
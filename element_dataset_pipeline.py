@@ -1,22 +1,201 @@
 # element_dataset_pipeline.py
+import argparse
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+from urllib.request import url2pathname
+
 from initialize_element_dataset import build_initial_dataset
-from element_neighbors import add_neighbors
+from element_neighbors import METRICS, SCOPES, add_neighbors
 from element_feedback_loop import feedback_loop
+from element_dataset import load_dataset
+from element_store import ElementStore
+
+# ---------- multi-page crawl ----------
+
+def _new_driver(headless: bool = True):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    opts = Options()
+    if headless:
+        opts.add_argument("--headless=new")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--no-sandbox")
+    return webdriver.Chrome(options=opts)
+
+class ChromePool:
+    """
+    One long-lived headless Chrome per worker thread, created on first use and
+    reused for every page (and every stage) that thread processes.
+    """
+    def __init__(self, headless: bool = True):
+        self.headless = headless
+        self._local = threading.local()
+        self._drivers: List = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        driver = getattr(self._local, "driver", None)
+        if driver is None:
+            driver = _new_driver(self.headless)
+            self._local.driver = driver
+            with self._lock:
+                self._drivers.append(driver)
+        return driver
+
+    def discard(self) -> None:
+        """Drop this thread's driver (e.g. after a crash); the next get() starts a new one."""
+        driver = getattr(self._local, "driver", None)
+        self._local.driver = None
+        if driver is not None:
+            with self._lock:
+                self._drivers.remove(driver)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for d in drivers:
+            try:
+                d.quit()
+            except Exception:
+                pass
+
+def expand_pages(specs: List[str]) -> List[Path]:
+    """Paths, globs and file:// URLs -> unique existing HTML files (in the given order)."""
+    pages: Dict[Path, None] = {}
+    for spec in specs:
+        if spec.startswith("file://"):
+            matches = [url2pathname(unquote(urlparse(spec).path))]
+        else:
+            matches = sorted(glob.glob(spec, recursive=True)) or [spec]
+        for m in matches:
+            p = Path(m).resolve()
+            if p.is_file():
+                pages.setdefault(p, None)
+            else:
+                print(f"[crawl] skipping {m}: not a file")
+    return list(pages)
+
+def _dataset_paths(pages: List[Path], out_dir: Path) -> Dict[Path, Path]:
+    """<out_dir>/<stem>.sqlite, disambiguated with the parent dir name when stems collide."""
+    stems: Dict[str, int] = {}
+    for p in pages:
+        stems[p.stem] = stems.get(p.stem, 0) + 1
+    return {p: out_dir / (f"{p.stem}.sqlite" if stems[p.stem] == 1 else f"{p.parent.name}__{p.stem}.sqlite")
+            for p in pages}
+
+def crawl(pages: List[Path], out_dir: Path, workers: Optional[int] = None, k: int = 5,
+          static: bool = False, concurrency: int = 8, metric: str = "center",
+          scope: str = "page", incremental: bool = False) -> Dict[Path, Optional[str]]:
+    """
+    Initialize + neighbors for every page across a pool of `workers` Chrome
+    sessions (default: one per core). Both stages of a page run on the same
+    driver. Returns {page: error or None}. The interactive feedback loop is
+    not part of the crawl.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    targets = _dataset_paths(pages, out_dir)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pages)))
+    pool = ChromePool()
+    results: Dict[Path, Optional[str]] = {}
+
+    def run(page: Path) -> None:
+        driver = pool.get()
+        try:
+            build_initial_dataset(page, targets[page], concurrency=concurrency,
+                                  static=static, driver=driver, incremental=incremental)
+            add_neighbors(page, targets[page], k=k, driver=driver, metric=metric, scope=scope)
+        except Exception:
+            pool.discard()   # don't hand a possibly broken session to the next page
+            raise
+
+    t0 = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(run, p): p for p in pages}
+            for n, fut in enumerate(as_completed(futures), 1):
+                page = futures[fut]
+                err = fut.exception()
+                results[page] = None if err is None else f"{type(err).__name__}: {err}"
+                status = "ok" if err is None else f"FAILED ({results[page]})"
+                print(f"[crawl] {n}/{len(pages)} {page.name} -> {targets[page]} {status}")
+    finally:
+        pool.close()
+    dt = time.time() - t0
+    ok = sum(1 for e in results.values() if e is None)
+    print(f"[crawl] {ok}/{len(pages)} pages in {dt:.1f}s with {workers} workers "
+          f"({len(pages) / dt if dt else 0:.2f} pages/s)")
+    return results
 
 def main():
+    ap = argparse.ArgumentParser(description="Build the element dataset for a reviewable page.")
+    ap.add_argument("pages", nargs="*",
+                    help="Pages to crawl (paths, globs or file:// URLs). Default: the single "
+                         "interactive run on reviewable_page.html.")
+    ap.add_argument("--out-dir", default="element_datasets", help="Per-page datasets (crawl mode).")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Headless Chrome workers for crawl mode (default: CPU count).")
+    ap.add_argument("--static", action="store_true",
+                    help="Parse the saved HTML instead of launching Chrome where layout isn't needed "
+                         "(initialize + feedback; neighbors always use Chrome for positions).")
+    ap.add_argument("--neighbor-metric", choices=METRICS, default="center",
+                    help="Neighbor distance: rect centers or rect edges.")
+    ap.add_argument("--neighbor-scope", choices=SCOPES, default="page",
+                    help="Restrict neighbors to the same DOM parent / grouping container.")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Rebuild against the existing dataset: only new elements are described; "
+                         "descriptors, neighbors and feedback of unchanged ones are kept.")
+    ap.add_argument("--resume", action="store_true",
+                    help="Reuse the existing store and continue the interrupted feedback session.")
+    ap.add_argument("--skip-reviewed", action="store_true",
+                    help="Feedback loop: skip elements that already have feedback.")
+    args = ap.parse_args()
+
+    if args.pages:
+        pages = expand_pages(args.pages)
+        if not pages:
+            ap.error("no pages matched")
+        crawl(pages, Path(args.out_dir), workers=args.workers, static=args.static,
+              metric=args.neighbor_metric, scope=args.neighbor_scope, incremental=args.incremental)
+        return
+
     html = Path("reviewable_page.html")
-    out = Path("element_dataset.json")
+    out = Path("element_dataset.sqlite")   # transactional store; exported to JSON at the end
+    exported = Path("element_dataset.json")
 
-    # 1) Initialize dataset (IDs, types, base descriptors via Selenium)
-    build_initial_dataset(html, out)
+    if (args.incremental or args.resume) and not out.exists() and exported.exists():
+        # Datasets from before the store: diff / resume against the JSON instead of starting over
+        store = ElementStore(out)
+        try:
+            store.import_json(exported)
+            print(f"[pipeline] seeded {out} from {exported} ({len(store)} elements)")
+        finally:
+            store.close()
 
-    # 2) Find neighbors spatially and add their DESCRIPTORS
-    add_neighbors(html, out, k=5)
+    resume = args.resume and out.exists()
+    if not resume:
+        # 1) Initialize dataset (IDs, types, base descriptors via Selenium)
+        build_initial_dataset(html, out, static=args.static, incremental=args.incremental)
+
+        # 2) Find neighbors spatially and add their DESCRIPTORS
+        add_neighbors(html, out, k=5, metric=args.neighbor_metric, scope=args.neighbor_scope)
 
     # 3) Collect interactive feedback in terminal and persist
-    #    (Press Enter or 'no' to skip any given element.)
-    feedback_loop(html, out)
+    #    (Press Enter or 'no' to skip any given element; checkpointed per element.)
+    feedback_loop(html, out, static=args.static, resume=resume, skip_reviewed=args.skip_reviewed)
+
+    # 4) JSON export for downstream tools (update_init_profile.py also reads the store directly)
+    load_dataset(out).save(exported)
+    print("Exported element_dataset.json")
 
 if __name__ == "__main__":
     main()
@@ -1,18 +1,20 @@
 # element_feedback_loop.py
+from __future__ import annotations
+import argparse
 import json
+import os
+import time
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.remote.webelement import WebElement
-
-from UID_Generator import UIDGenerator
+from dom_extract import extract_elements, extract_elements_static, heuristic_from_record
+from element_dataset import new_entry, open_dataset
 
 # ---------- Selenium helpers ----------
 
 def _open_local_in_chrome(local_html: Path, headless: bool = True):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
     opts = Options()
     if headless:
         opts.add_argument("--headless=new")
@@ -22,76 +24,146 @@ def _open_local_in_chrome(local_html: Path, headless: bool = True):
     driver.get(local_html.resolve().as_uri())  # file:// URL
     return driver
 
-MEANINGFUL = {
-    "a","button","input","select","textarea","label","img","svg","video","audio",
-    "nav","header","footer","main","aside","section","article","form","fieldset","legend",
-    "h1","h2","h3","h4","h5","h6","li","ul","ol","table","thead","tbody","tfoot","tr","td","th",
-    "div","span"
-}
-
-def _collect_elements(driver) -> List[WebElement]:
-    elems = driver.find_elements(By.XPATH, "//*")
-    # same filter as initializer
-    elems = [e for e in elems if (e.tag_name or "").lower() in MEANINGFUL]
-    # OPTIONAL: only visible, to avoid 0x0 or hidden nodes
-    # elems = [e for e in elems if e.is_displayed()]
-    return elems
+# ---------- Session checkpoint ----------
+
+def checkpoint_path(dataset_json: Path) -> Path:
+    return Path(f"{dataset_json}.session")
+
+class SessionCheckpoint:
+    """
+    Append-only log of reviewed UIDs next to the dataset (one JSON line per
+    element, flushed + fsynced), so a session can be resumed after Ctrl-C or a
+    crash. A torn last line is ignored on load.
+    """
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = path
+        self.reviewed: Set[str] = self._load(path) if resume else set()
+        self._fh = open(path, "a" if resume else "w", encoding="utf-8")
+
+    @staticmethod
+    def _load(path: Path) -> Set[str]:
+        done: Set[str] = set()
+        if not path.exists():
+            return done
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                done.add(json.loads(line)["uid"])
+            except (ValueError, KeyError, TypeError):
+                continue
+        return done
+
+    def mark(self, uid: str) -> None:
+        self.reviewed.add(uid)
+        self._fh.write(json.dumps({"uid": uid, "at": round(time.time(), 3)}) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self, finished: bool = False) -> None:
+        self._fh.close()
+        if finished:   # nothing left to resume
+            self.path.unlink(missing_ok=True)
 
 # ---------- Feedback loop using stable IDs ----------
 
-def feedback_loop(reviewable_html: Path, dataset_json: Path, headless: bool = True) -> None:
-    # Load existing dataset (or start new)
-    if dataset_json.exists():
-        data = json.loads(dataset_json.read_text(encoding="utf-8"))
+def _prefetch(reviewable_html: Path, ds, headless: bool, static: bool) -> List[Dict[str, Any]]:
+    """
+    Everything the prompts need, resolved before the first one is shown:
+    UIDs from one bulk extraction, unknown elements added in one transaction,
+    then descriptors and existing feedback counts from one dataset snapshot.
+    """
+    if static:
+        elems = extract_elements_static(reviewable_html)
     else:
-        data = {"Elements": []}
-
-    # Index current JSON by ID for quick updates
-    idx: Dict[str, Dict[str, Any]] = {e["ID"]: e for e in data.get("Elements", [])}
-
-    driver = _open_local_in_chrome(reviewable_html, headless=headless)
+        driver = _open_local_in_chrome(reviewable_html, headless=headless)
+        try:
+            elems = extract_elements(driver)
+        finally:
+            driver.quit()   # the loop itself needs no browser
+
+    seen: Set[str] = set()
+    elems = [r for r in elems if not (r["uid"] in seen or seen.add(r["uid"]))]
+    new = [new_entry(r["uid"], r["tag"], heuristic_from_record(r))   # lightweight label (non-GPT)
+           for r in elems if r["uid"] not in ds]
+    if new:
+        with ds.transaction():
+            ds.upsert_many(new)
+        ds.commit()
+
+    snap = ds.snapshot()
+    return [{"uid": r["uid"],
+             "descriptor": snap.descriptor(r["uid"]),
+             "feedback": len((snap.get(r["uid"]) or {}).get("Element feedback", []) or [])}
+            for r in elems]
+
+def feedback_loop(reviewable_html: Path, dataset_json: Path, headless: bool = True,
+                  static: bool = False, resume: bool = False, skip_reviewed: bool = False) -> None:
+    """
+    static=True reads UIDs / tags / text from the saved HTML without a browser
+    (the loop only needs layout-independent facts).
+    resume=True continues the last session from its checkpoint;
+    skip_reviewed=True skips elements that already have feedback.
+    """
+    # Existing dataset (or a new one). With the SQLite store every new element
+    # and every feedback line is committed as it is entered.
+    ds = open_dataset(dataset_json)
     try:
-        elems = _collect_elements(driver)
-
-        print("\nFeedback loop")
-        print("For each element below, type feedback and press Enter.")
-        print("Press Enter on an empty line or type 'no' to skip.\n")
-
-        for i, el in enumerate(elems, 1):
-            # Compute stable UID from Selenium WebElement
-            uid = UIDGenerator.id_for_element(driver, el)
-
-            # Ensure the element exists in the JSON with required fields only
-            if uid not in idx:
-                elem_type = UIDGenerator.element_type(el)
-                descriptor = UIDGenerator.heuristic_descriptor(el)  # lightweight label (non-GPT)
-                idx[uid] = {
-                    "ID": uid,
-                    "Element_descriptor": descriptor,
-                    "Element_type": elem_type,
-                    "Neighbor_elements": [],
-                    "Element feedback": []
-                }
-                data["Elements"].append(idx[uid])
-
-            # Show descriptor to user and collect feedback
-            desc = idx[uid].get("Element_descriptor", "")
-            print(f"[{i}/{len(elems)}] {desc}")
+        items = _prefetch(reviewable_html, ds, headless, static)
+    except BaseException:
+        ds.close()
+        raise
+
+    ckpt = SessionCheckpoint(checkpoint_path(dataset_json), resume=resume)
+    done = [it for it in items if it["uid"] in ckpt.reviewed]
+    has_fb = [it for it in items if skip_reviewed and it["feedback"] and it["uid"] not in ckpt.reviewed]
+    todo = [it for it in items if it["uid"] not in ckpt.reviewed and not (skip_reviewed and it["feedback"])]
+    skipped = len(items) - len(todo)
+    if skipped:
+        print(f"[feedback] skipping {len(done)} checkpointed + {len(has_fb)} already reviewed elements")
+
+    print("\nFeedback loop")
+    print("For each element below, type feedback and press Enter.")
+    print("Press Enter on an empty line or type 'no' to skip; 'quit' stops (continue with --resume).\n")
+
+    finished = False
+    try:
+        for i, it in enumerate(todo, 1):
+            uid = it["uid"]
+            print(f"[{skipped + i}/{len(items)}] {it['descriptor']}")
+            if it["feedback"]:
+                print(f"   ({it['feedback']} feedback entries already)")
             while True:
                 fb = input(" - Feedback (or 'no' / empty to continue): ").strip()
                 if fb.lower() in {"no", "n", ""}:
                     break
-                idx[uid]["Element feedback"].append(fb)
+                if fb.lower() in {"quit", "q"}:
+                    raise KeyboardInterrupt
+                ds.append_feedback(uid, fb)
+            # Checkpoint: element done (JSON backend: rewrite the file first)
+            ds.commit()
+            ckpt.mark(uid)
             print()
-
-        # Persist updates
-        dataset_json.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
-        print(f"Saved feedback updates to {dataset_json}")
-
+        finished = True
+    except (KeyboardInterrupt, EOFError):
+        print(f"\n[feedback] stopped; {len(ckpt.reviewed)} elements checkpointed "
+              f"in {ckpt.path} (continue with --resume)")
     finally:
-        driver.quit()
+        # Store: already committed row by row. JSON: written per element, also on Ctrl-C.
+        ds.commit()
+        ds.close()
+        ckpt.close(finished=finished)
+    print(f"Saved feedback updates to {dataset_json}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Collect per-element feedback in the terminal.")
+    ap.add_argument("--page", type=Path, default=Path("reviewable_page.html"))
+    ap.add_argument("--dataset", type=Path, default=Path("element_dataset.json"),
+                    help="JSON dataset or .sqlite store")
+    ap.add_argument("--static", action="store_true", help="Parse the saved HTML instead of launching Chrome.")
+    ap.add_argument("--resume", action="store_true", help="Continue the last interrupted session.")
+    ap.add_argument("--skip-reviewed", action="store_true", help="Skip elements that already have feedback.")
+    args = ap.parse_args()
+    feedback_loop(args.page, args.dataset, headless=True, static=args.static,
+                  resume=args.resume, skip_reviewed=args.skip_reviewed)
 
 if __name__ == "__main__":
-    reviewable = Path("reviewable_page.html")
-    dataset = Path("element_dataset.json")
-    feedback_loop(reviewable, dataset, headless=True)
+    main()
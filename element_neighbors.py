@@ -1,15 +1,15 @@
 # element_neighbors.py
-import json, math
+from __future__ import annotations
+import heapq, math, time
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.remote.webelement import WebElement
+from typing import Dict, Any, List, Optional, Tuple
 
-from UID_Generator import UIDGenerator
+from dom_extract import extract_elements, load_page
+from element_dataset import open_dataset
 
 def _open_local_in_chrome(local_html: Path, headless: bool = True):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
     opts = Options()
     if headless:
         opts.add_argument("--headless=new")
@@ -19,10 +19,20 @@ def _open_local_in_chrome(local_html: Path, headless: bool = True):
     driver.get(local_html.resolve().as_uri())
     return driver
 
-def _collect_elements(driver) -> List[WebElement]:
-    return driver.find_elements(By.XPATH, "//*")
-
-_JS_RECT = "return arguments[0].getBoundingClientRect();"
+# ---------- neighbor engine ----------
+# metric:
+#   center  distance between rect centers
+#   edge    gap between rect edges (0 when boxes touch/overlap)
+# scope:
+#   page      any element on the page
+#   parent    only elements sharing the same DOM parent
+#   landmark  only elements inside the same nearest grouping container
+#             (form, fieldset, nav, section, table, list, ...)
+METRICS = ("center", "edge")
+SCOPES = ("page", "parent", "landmark")
+_LANDMARKS = {"form","fieldset","nav","header","footer","main","aside","section","article",
+              "table","ul","ol","dialog"}
+_BLOCK_ROWS = 256     # rows per distance block
 
 def _center(rect) -> Tuple[float, float]:
     return (rect["x"] + rect["width"]/2.0, rect["y"] + rect["height"]/2.0)
@@ -30,40 +40,169 @@ def _center(rect) -> Tuple[float, float]:
 def _distance(a: Tuple[float,float], b: Tuple[float,float]) -> float:
     return math.hypot(a[0]-b[0], a[1]-b[1])
 
-def add_neighbors(reviewable_html: Path, dataset_json: Path, k: int = 5) -> None:
-    data = json.loads(dataset_json.read_text(encoding="utf-8"))
-    idx: Dict[str, Dict[str, Any]] = {e["ID"]: e for e in data.get("Elements", [])}
+def rect_distance(a, b, metric: str = "center") -> float:
+    return _distance(_center(a), _center(b)) if metric == "center" else _edge_distance(a, b)
+
+def _edge_distance(a, b) -> float:
+    dx = max(0.0, b["x"] - (a["x"] + a["width"]), a["x"] - (b["x"] + b["width"]))
+    dy = max(0.0, b["y"] - (a["y"] + a["height"]), a["y"] - (b["y"] + b["height"]))
+    return math.hypot(dx, dy)
+
+def container_key(dom_path: str, scope: str) -> str:
+    """Group key for `scope` from a dom_extract :nth-of-type path."""
+    parts = (dom_path or "").split(">")
+    if scope == "parent":
+        return ">".join(parts[:-1])
+    if scope == "landmark":
+        for i in range(len(parts) - 2, -1, -1):
+            if parts[i].split(":", 1)[0] in _LANDMARKS:
+                return ">".join(parts[:i + 1])
+    return ""
+
+def nearest_neighbors(rects: List[Dict[str, float]], k: int = 5, metric: str = "center",
+                      groups: Optional[List[str]] = None) -> List[List[int]]:
+    """
+    For each rect, the indices of its k nearest other rects (closest first).
+    With `groups`, only rects in the same group qualify (each group is solved
+    on its own). Uses NumPy when available, else a pure-Python heap.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric {metric!r} (expected one of {METRICS})")
+    n = len(rects)
+    out: List[List[int]] = [[] for _ in range(n)]
+    if k <= 0:
+        return out
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    members: Dict[str, List[int]] = {}
+    for i in range(n):
+        members.setdefault("" if groups is None else groups[i], []).append(i)
+    for ids in members.values():
+        if len(ids) < 2:
+            continue
+        sub = [rects[i] for i in ids]
+        res = _nearest_numpy(np, sub, k, metric) if np is not None else _nearest_python(sub, k, metric)
+        for local, js in enumerate(res):
+            out[ids[local]] = [ids[j] for j in js]
+    return out
+
+def _nearest_numpy(np, rects, k: int, metric: str) -> List[List[int]]:
+    """
+    Exact k-NN by a sweep over elements sorted by top edge. Each block of rows
+    is first scored against a window of y-adjacent elements; the provisional
+    k-th distance then bounds the vertical band that can hold true neighbors
+    (both metrics are >= the vertical gap), and the block is rescored against
+    every element in that band if the window missed any.
+    """
+    box = np.array([[r["x"], r["y"], r["width"], r["height"]] for r in rects], dtype=np.float64)
+    n = len(box)
+    kk = min(k, n - 1)
+    if metric == "center":
+        cx, cy = box[:, 0] + box[:, 2] / 2.0, box[:, 1] + box[:, 3] / 2.0
+        lo = hi = cy
+    else:
+        x0, lo = box[:, 0], box[:, 1]
+        x1, hi = x0 + box[:, 2], lo + box[:, 3]
+
+    def sqdist(rows, cols):
+        if metric == "center":
+            dx = cx[rows, None] - cx[None, cols]
+            dy = cy[rows, None] - cy[None, cols]
+        else:
+            dx = np.maximum(0.0, np.maximum(x0[None, cols] - x1[rows, None], x0[rows, None] - x1[None, cols]))
+            dy = np.maximum(0.0, np.maximum(lo[None, cols] - hi[rows, None], lo[rows, None] - hi[None, cols]))
+        d = dx * dx + dy * dy
+        d[rows[:, None] == cols[None, :]] = np.inf   # never your own neighbor
+        return d
+
+    out: List[List[int]] = [[] for _ in range(n)]
+
+    def select(rows, cols, d) -> None:
+        part = np.argpartition(d, kk - 1, axis=1)[:, :kk]
+        for r, row in enumerate(rows):
+            cand = part[r]
+            out[int(row)] = [int(cols[cand[j]]) for j in np.lexsort((cols[cand], d[r, cand]))]
+
+    order = np.argsort(lo, kind="stable")
+    window = max(4 * kk, 64)
+    for start in range(0, n, _BLOCK_ROWS):
+        rows = order[start:start + _BLOCK_ROWS]
+        cols = order[max(0, start - window):start + _BLOCK_ROWS + window]
+        d = sqdist(rows, cols)
+        if len(cols) < n:
+            kth = np.sqrt(np.partition(d, kk - 1, axis=1)[:, kk - 1])
+            # kth == 0 (overlapping boxes, shared centers) can't be improved on
+            unsettled = kth > 0
+            if unsettled.any():
+                r_open, k_open = rows[unsettled], kth[unsettled]
+                band = (hi >= (lo[r_open] - k_open).min()) & (lo <= (hi[r_open] + k_open).max())
+                if band.sum() > band[cols].sum():
+                    band_cols = np.nonzero(band)[0]
+                    select(r_open, band_cols, sqdist(r_open, band_cols))
+                    rows, d = rows[~unsettled], d[~unsettled]
+        select(rows, cols, d)
+    return out
+
+def _nearest_python(rects, k: int, metric: str) -> List[List[int]]:
+    if metric == "center":
+        ctrs = [_center(r) for r in rects]
+        dist = lambda i, j: _distance(ctrs[i], ctrs[j])
+    else:
+        dist = lambda i, j: _edge_distance(rects[i], rects[j])
+    n = len(rects)
+    return [[j for _, j in heapq.nsmallest(k, ((dist(i, j), j) for j in range(n) if j != i))]
+            for i in range(n)]
+
+# ---------- dataset stage ----------
+
+def add_neighbors(reviewable_html: Path, dataset_json: Path, k: int = 5, driver=None,
+                  metric: str = "center", scope: str = "page") -> None:
+    """
+    `driver`: an already-open session to reuse (left open); otherwise one is launched.
+    metric / scope: see the neighbor engine above.
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"unknown scope {scope!r} (expected one of {SCOPES})")
+    ds = open_dataset(dataset_json)
+    known = set(ds.uids())
+
+    if driver is not None:
+        extracted = load_page(driver, reviewable_html)
+    else:
+        driver = _open_local_in_chrome(reviewable_html, headless=True)
+        try:
+            extracted = extract_elements(driver)   # one round trip: uid + rect for every element
+        finally:
+            driver.quit()
+
+    # Dataset elements only, first occurrence of each UID
+    kept: List[Dict[str, Any]] = []
+    seen = set()
+    for rec in extracted:
+        if rec["uid"] in known and rec["uid"] not in seen:
+            seen.add(rec["uid"])
+            kept.append(rec)
+
+    groups = None if scope == "page" else [container_key(r["dom_path"], scope) for r in kept]
+    t0 = time.perf_counter()
+    nbrs = nearest_neighbors([r["rect"] for r in kept], k=k, metric=metric, groups=groups)
+    print(f"[neighbors] {len(kept)} elements, k={k}, metric={metric}, scope={scope} "
+          f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
 
-    driver = _open_local_in_chrome(reviewable_html, headless=True)
+    # UID references; descriptors are resolved on read (ElementDataset.neighbor_descriptors)
     try:
-        elems = _collect_elements(driver)
-
-        # Precompute (uid, descriptor, center) for elements present in dataset
-        records: List[Tuple[str, str, Tuple[float,float]]] = []
-        for el in elems:
-            uid = UIDGenerator.id_for_element(driver, el)
-            if uid not in idx:
-                continue
-            rect = driver.execute_script(_JS_RECT, el)
-            ctr = _center(rect)
-            desc = idx[uid].get("Element_descriptor", "")
-            records.append((uid, desc, ctr))
-
-        # Build neighbor lists by distance
-        for i, (uid, _, ctr) in enumerate(records):
-            dists: List[Tuple[float, int]] = []
-            for j, (uid2, _, ctr2) in enumerate(records):
-                if i == j:
-                    continue
-                dists.append(( _distance(ctr, ctr2), j ))
-            dists.sort(key=lambda t: t[0])
-            top = [records[j][1] for _, j in dists[:k]]  # neighbor DESCRIPTORS
-            idx[uid]["Neighbor_elements"] = top
-
-        dataset_json.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
-        print(f"Updated neighbors in {dataset_json}")
+        ds.set_neighbors_many({
+            rec["uid"]: [{"ID": kept[j]["uid"],
+                          "distance": round(rect_distance(rec["rect"], kept[j]["rect"], metric), 1)}
+                         for j in js]
+            for rec, js in zip(kept, nbrs)})
+        ds.commit()
     finally:
-        driver.quit()
+        ds.close()
+    print(f"Updated neighbors in {dataset_json}")
 
 if __name__ == "__main__":
     add_neighbors(Path("reviewable_page.html"), Path("element_dataset.json"), k=5)
@@ -0,0 +1,235 @@
+# element_store.py
+"""
+Transactional element dataset store (SQLite, WAL).
+
+Same content as the compact JSON format (element_dataset.py), one row per
+element / neighbor / feedback record, so a stage only writes what it changes:
+
+    elements (uid PK, ord, type, descriptor, style JSON, updated)
+    neighbors(uid, rank, neighbor_uid, distance)      PK (uid, rank)
+    feedback (id PK autoincrement, uid, text, created)
+
+Feedback is appended and committed one record at a time, so an interrupted
+session keeps everything typed so far. WAL lets readers (exports, the
+profile updater) run while a stage is writing.
+
+    python element_store.py export element_dataset.sqlite -o element_dataset.json [--legacy]
+    python element_store.py import element_dataset.json -o element_dataset.sqlite
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from element_dataset import FORMAT, ElementDataset, format_style
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS elements (
+    uid TEXT PRIMARY KEY, ord INTEGER NOT NULL, type TEXT NOT NULL DEFAULT '',
+    descriptor TEXT NOT NULL DEFAULT '', style TEXT NOT NULL DEFAULT '{}', updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS elements_ord ON elements(ord);
+CREATE TABLE IF NOT EXISTS neighbors (
+    uid TEXT NOT NULL, rank INTEGER NOT NULL, neighbor_uid TEXT NOT NULL, distance REAL,
+    PRIMARY KEY (uid, rank)
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, uid TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS feedback_uid ON feedback(uid);
+"""
+
+class ElementStore:
+    def __init__(self, path: Path):
+        path = Path(path)
+        os.makedirs(path.parent.resolve(), exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()   # reentrant: reads/writes inside transaction()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False,
+                                     isolation_level=None)   # explicit BEGIN/COMMIT below
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._depth = 0
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Group several writes into one commit (nested calls join the outer one)."""
+        with self._lock:
+            outer = self._depth == 0
+            if outer:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self._conn
+            except BaseException:
+                self._depth -= 1
+                if outer:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if outer:
+                self._conn.execute("COMMIT")
+
+    # -------- writes --------
+    def reset(self) -> None:
+        with self.transaction() as c:
+            c.execute("DELETE FROM elements")
+            c.execute("DELETE FROM neighbors")
+            c.execute("DELETE FROM feedback")
+
+    def upsert_many(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """
+        Insert or update elements (type / descriptor / style, plus neighbors when
+        given); new ones go to the end. An entry's feedback is only imported for
+        elements that aren't stored yet — use append_feedback() for new records.
+        """
+        now = time.time()
+        with self.transaction() as c:
+            (next_ord,) = c.execute("SELECT COALESCE(MAX(ord), -1) + 1 FROM elements").fetchone()
+            for e in entries:
+                is_new = c.execute("SELECT 1 FROM elements WHERE uid=?", (e["ID"],)).fetchone() is None
+                c.execute(
+                    "INSERT INTO elements (uid, ord, type, descriptor, style, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(uid) DO UPDATE SET type=excluded.type, descriptor=excluded.descriptor, "
+                    "style=excluded.style, updated=excluded.updated",
+                    (e["ID"], next_ord, e.get("Element_type", ""), e.get("Element_descriptor", ""),
+                     json.dumps(e.get("Style") or {}, separators=(",", ":")), now))
+                next_ord += 1
+                if e.get("Neighbors"):
+                    self._write_neighbors(c, e["ID"], e["Neighbors"])
+                for text in (e.get("Element feedback", []) or []) if is_new else []:
+                    c.execute("INSERT INTO feedback (uid, text, created) VALUES (?, ?, ?)", (e["ID"], text, now))
+
+    def upsert(self, entry: Dict[str, Any]) -> None:
+        self.upsert_many([entry])
+
+    def set_neighbors_many(self, neighbors: Dict[str, List[Dict[str, Any]]]) -> None:
+        with self.transaction() as c:
+            for uid, nbrs in neighbors.items():
+                self._write_neighbors(c, uid, nbrs)
+
+    def set_neighbors(self, uid: str, neighbors: List[Dict[str, Any]]) -> None:
+        self.set_neighbors_many({uid: neighbors})
+
+    @staticmethod
+    def _write_neighbors(c: sqlite3.Connection, uid: str, nbrs: List[Dict[str, Any]]) -> None:
+        c.execute("DELETE FROM neighbors WHERE uid=?", (uid,))
+        c.executemany("INSERT INTO neighbors (uid, rank, neighbor_uid, distance) VALUES (?, ?, ?, ?)",
+                      [(uid, r, n["ID"], n.get("distance")) for r, n in enumerate(nbrs)])
+
+    def append_feedback(self, uid: str, text: str) -> None:
+        """One committed row per feedback entry."""
+        with self.transaction() as c:
+            c.execute("INSERT INTO feedback (uid, text, created) VALUES (?, ?, ?)", (uid, text, time.time()))
+
+    def commit(self) -> None:
+        """Writes are committed as they happen; kept for parity with ElementDataset."""
+
+    # -------- reads --------
+    def __contains__(self, uid: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM elements WHERE uid=?", (uid,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM elements").fetchone()[0]
+
+    def uids(self) -> List[str]:
+        with self._lock:
+            return [u for (u,) in self._conn.execute("SELECT uid FROM elements ORDER BY ord")]
+
+    def get(self, uid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT uid, type, descriptor, style FROM elements WHERE uid=?",
+                                     (uid,)).fetchone()
+            if row is None:
+                return None
+            nbrs = self._conn.execute("SELECT neighbor_uid, distance FROM neighbors WHERE uid=? ORDER BY rank",
+                                      (uid,)).fetchall()
+            fb = self._conn.execute("SELECT text FROM feedback WHERE uid=? ORDER BY id", (uid,)).fetchall()
+        return _entry(row, nbrs, [t for (t,) in fb])
+
+    def descriptor(self, uid: str) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT descriptor, style FROM elements WHERE uid=?", (uid,)).fetchone()
+        if row is None:
+            return ""
+        facts = format_style(json.loads(row[1]))
+        return f"{row[0]}; {facts}" if facts else row[0]
+
+    def snapshot(self) -> ElementDataset:
+        """A consistent in-memory copy of the whole dataset (one read transaction)."""
+        with self._lock:
+            outer = self._depth == 0
+            if outer:
+                self._conn.execute("BEGIN")
+            try:
+                rows = self._conn.execute("SELECT uid, type, descriptor, style FROM elements ORDER BY ord").fetchall()
+                nbrs: Dict[str, List] = {}
+                for uid, n_uid, dist in self._conn.execute(
+                        "SELECT uid, neighbor_uid, distance FROM neighbors ORDER BY uid, rank"):
+                    nbrs.setdefault(uid, []).append((n_uid, dist))
+                fb: Dict[str, List[str]] = {}
+                for uid, text in self._conn.execute("SELECT uid, text FROM feedback ORDER BY id"):
+                    fb.setdefault(uid, []).append(text)
+            finally:
+                if outer:
+                    self._conn.execute("COMMIT")
+        return ElementDataset({"Format": FORMAT,
+                               "Elements": [_entry(r, nbrs.get(r[0], []), fb.get(r[0], [])) for r in rows]})
+
+    def export_json(self, path: Path, legacy: bool = False) -> None:
+        self.snapshot().save(path, legacy=legacy)
+
+    def import_json(self, path: Path) -> None:
+        """Replace the store's contents with a JSON dataset (compact or legacy), atomically."""
+        ds = ElementDataset.load(path)
+        with self.transaction():
+            self.reset()
+            self.upsert_many(ds.elements)
+
+    def close(self) -> None:
+        self._conn.close()
+
+def _entry(row, nbrs, feedback: List[str]) -> Dict[str, Any]:
+    uid, etype, desc, style = row
+    return {
+        "ID": uid,
+        "Element_type": etype,
+        "Element_descriptor": desc,
+        "Style": json.loads(style),
+        "Neighbors": [{"ID": n, "distance": d} for n, d in nbrs],
+        "Element feedback": feedback,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Export / import the SQLite element dataset store.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="store -> JSON")
+    ex.add_argument("store", type=Path)
+    ex.add_argument("-o", "--out", type=Path, default=Path("element_dataset.json"))
+    ex.add_argument("--legacy", action="store_true", help="Write the legacy (copied descriptors) JSON shape")
+    im = sub.add_parser("import", help="JSON (compact or legacy) -> store (replaces its contents)")
+    im.add_argument("json", type=Path)
+    im.add_argument("-o", "--out", type=Path, default=Path("element_dataset.sqlite"))
+    args = ap.parse_args()
+
+    if args.cmd == "export":
+        store = ElementStore(args.store)
+        store.export_json(args.out, legacy=args.legacy)
+        print(f"[store] exported {len(store)} elements to {args.out}")
+    else:
+        store = ElementStore(args.out)
+        store.import_json(args.json)
+        print(f"[store] imported {len(store)} elements into {args.out}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,20 @@
 # initialize_element_dataset.py
-import os, json, time
+from __future__ import annotations
+import os, json, time, asyncio
 from pathlib import Path
 from typing import Dict, Any, List, Optional
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.remote.webelement import WebElement
-
-from openai import OpenAI  # pip install openai>=1.0.0
 
 from UID_Generator import UIDGenerator
+from dom_extract import (extract_elements, extract_elements_static, heuristic_from_record, load_page,
+                         snapshot_from_record)
+from element_dataset import new_entry, open_dataset, style_fields
 
-MEANINGFUL = {
-    "a","button","input","select","textarea","label","img","svg","video","audio",
-    "nav","header","footer","main","aside","section","article","form","fieldset","legend",
-    "h1","h2","h3","h4","h5","h6","li","ul","ol","table","thead","tbody","tfoot","tr","td","th",
-    "div","span"
-}
+# selenium / openai are imported where they are used, so importing this module
+# (e.g. from the pipeline or for JSON-only work) doesn't pay for them.
 
 def _open_local_in_chrome(local_html: Path, headless: bool = True):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
     opts = Options()
     if headless:
         opts.add_argument("--headless=new")
@@ -28,224 +24,321 @@ def _open_local_in_chrome(local_html: Path, headless: bool = True):
     driver.get(local_html.resolve().as_uri())  # file:// URL
     return driver
 
-def _collect_elements(driver) -> List[WebElement]:
-    elems = driver.find_elements(By.XPATH, "//*")
-    return [e for e in elems if (e.tag_name or "").lower() in MEANINGFUL]
+# ---------- GPT describer (snapshot -> descriptor, heuristic fallback) ----------
 
-# ---------- GPT describer (function-only, with safe fallback) ----------
+_DESCRIBER_SYSTEM = (
+    "You are an accessibility-savvy UI describer. "
+    "Given an element snapshot, write ONE concise, human-friendly descriptor (<= 20 words). "
+    "Prefer user-facing semantics over technical markup. "
+    "If link or button, summarize purpose using visible text/aria/alt. "
+    "If image, prefer alt text; if missing, summarize visible content. "
+    "Avoid raw IDs/classes or code. No quotes. No trailing punctuation."
+)
 
-def _safe_client() -> Optional[OpenAI]:
+def _describer_messages(snapshot: Dict[str, Any]) -> List[Dict[str, str]]:
+    user_msg = "Element snapshot (JSON):\n" + json.dumps(snapshot, ensure_ascii=False)
+    return [
+        {"role": "system", "content": _DESCRIBER_SYSTEM},
+        {"role": "user", "content": user_msg},
+    ]
+
+def _clean_descriptor(content: Optional[str]) -> str:
+    desc = (content or "").strip()
+    if not desc:
+        raise ValueError("Empty description")
+    words = desc.split()
+    if len(words) > 20:
+        desc = " ".join(words[:20])
+    return desc
+
+def _heuristic_from_snapshot(snapshot: Dict[str, Any]) -> str:
+    return UIDGenerator.heuristic_from_fields(snapshot.get("tag", ""), snapshot.get("attrs", {}),
+                                              snapshot.get("text", ""))
+
+# ---------- concurrent describer (asyncio) ----------
+
+class _AdaptiveLimit:
+    """
+    Concurrency limit that halves on a rate-limit response and creeps back up
+    by one after `recover_after` consecutive successes (AIMD), bounded by
+    [1, max_limit]. Also holds a shared cool-down so every task backs off
+    together after a 429.
+    """
+    def __init__(self, max_limit: int, recover_after: int = 10):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.recover_after = recover_after
+        self.active = 0
+        self.successes = 0
+        self.resume_at = 0.0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def ok(self) -> None:
+        self.successes += 1
+        if self.successes >= self.recover_after and self.limit < self.max_limit:
+            self.limit += 1
+            self.successes = 0
+
+    def rate_limited(self, retry_after: float) -> None:
+        self.limit = max(1, self.limit // 2)
+        self.successes = 0
+        self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+
+def _retry_after(exc: Exception, default: float) -> float:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
     try:
-        if not os.getenv("OPENAI_API_KEY"):
-            return None
-        return OpenAI()
-    except Exception:
-        return None
-
-def _build_snapshot(el: WebElement) -> Dict[str, Any]:
+        return float(headers.get("retry-after", default))
+    except (TypeError, ValueError):
+        return default
+
+async def _describe_one(client, limit: _AdaptiveLimit, snapshot: Dict[str, Any], model: str,
+                        max_retries: int) -> str:
+    from openai import APIConnectionError, APITimeoutError, RateLimitError
+
+    for attempt in range(max_retries + 1):
+        async with limit:
+            try:
+                resp = await client.chat.completions.create(model=model, messages=_describer_messages(snapshot))
+                desc = _clean_descriptor(resp.choices[0].message.content)
+                limit.ok()
+                return desc
+            except RateLimitError as e:
+                limit.rate_limited(_retry_after(e, 2.0 ** attempt))
+            except (APIConnectionError, APITimeoutError):
+                await asyncio.sleep(min(2.0 ** attempt, 30.0))
+            except Exception:
+                break   # bad request / empty answer: retrying won't help
+    return _heuristic_from_snapshot(snapshot)
+
+# ---------- batched describer (many elements per request) ----------
+
+_BATCH_SYSTEM = (
+    _DESCRIBER_SYSTEM + " "
+    "You will receive a JSON array of element snapshots, each with an \"id\". "
+    "Return ONLY a JSON array with one object per input element, in any order: "
+    '[{"id": "<id>", "descriptor": "<descriptor>"}]. Use the ids exactly as given.'
+)
+
+def _estimate_tokens(obj: Any) -> int:
+    # ~4 characters per token for JSON-ish English; good enough for packing
+    return len(json.dumps(obj, ensure_ascii=False)) // 4 + 8
+
+def _pack_batches(items: List[Dict[str, Any]], token_budget: int, max_items: int = 40) -> List[List[Dict[str, Any]]]:
+    """Greedy, order-preserving packing of {"id", ...snapshot} items under `token_budget` each."""
+    budget = max(1, token_budget - _estimate_tokens(_BATCH_SYSTEM))
+    batches: List[List[Dict[str, Any]]] = []
+    cur: List[Dict[str, Any]] = []
+    used = 0
+    for item in items:
+        cost = _estimate_tokens(item)
+        if cur and (used + cost > budget or len(cur) >= max_items):
+            batches.append(cur)
+            cur, used = [], 0
+        cur.append(item)
+        used += cost
+    if cur:
+        batches.append(cur)
+    return batches
+
+def _parse_batch(content: Optional[str], expected: List[str]) -> Dict[str, str]:
+    """Valid descriptors from a batch answer, keyed by id; unknown/invalid items are dropped."""
+    text = (content or "").strip()
+    i, j = text.find("["), text.rfind("]")
+    if i == -1 or j == -1:
+        return {}
     try:
-        tag = (el.tag_name or "").lower()
-    except Exception:
-        tag = ""
-
-    def ga(name: str) -> Optional[str]:
+        rows = json.loads(text[i:j + 1])
+    except ValueError:
+        return {}
+    wanted = set(expected)
+    out: Dict[str, str] = {}
+    for row in rows if isinstance(rows, list) else []:
+        if not isinstance(row, dict) or row.get("id") not in wanted or not isinstance(row.get("descriptor"), str):
+            continue
         try:
-            return el.get_attribute(name)
-        except Exception:
-            return None
+            out[row["id"]] = _clean_descriptor(row["descriptor"])
+        except ValueError:
+            continue
+    return out
 
-    attrs = {}
-    for name in ["id","class","name","type","href","value","placeholder","title","aria-label","role","alt"]:
-        v = ga(name)
-        if v:
-            attrs[name] = v
+async def _describe_batch(client, limit: _AdaptiveLimit, items: List[Dict[str, Any]], model: str,
+                          max_retries: int) -> Dict[str, str]:
+    """
+    Describe a batch in one request; ids missing from (or invalid in) the
+    answer are re-sent on their own in the next attempt. Returns what succeeded.
+    """
+    from openai import APIConnectionError, APITimeoutError, RateLimitError
+
+    done: Dict[str, str] = {}
+    pending = items
+    for attempt in range(max_retries + 1):
+        async with limit:
+            try:
+                resp = await client.chat.completions.create(model=model, messages=[
+                    {"role": "system", "content": _BATCH_SYSTEM},
+                    {"role": "user", "content": json.dumps(pending, ensure_ascii=False)},
+                ])
+                limit.ok()
+                done.update(_parse_batch(resp.choices[0].message.content, [it["id"] for it in pending]))
+            except RateLimitError as e:
+                limit.rate_limited(_retry_after(e, 2.0 ** attempt))
+            except (APIConnectionError, APITimeoutError):
+                await asyncio.sleep(min(2.0 ** attempt, 30.0))
+            except Exception:
+                break
+        pending = [it for it in pending if it["id"] not in done]
+        if not pending:
+            break
+    return done
+
+async def _describe_batched(client, limit: _AdaptiveLimit, snapshots: List[Dict[str, Any]], keys: List[str],
+                            model: str, max_retries: int, batch_tokens: int) -> List[str]:
+    items = [{"id": k, **snap} for k, snap in zip(keys, snapshots)]
+    batches = _pack_batches(items, batch_tokens)
+    results = await asyncio.gather(*(_describe_batch(client, limit, b, model, max_retries) for b in batches))
+    found: Dict[str, str] = {}
+    for r in results:
+        found.update(r)
+    print(f"batched describer: {len(batches)} requests for {len(items)} elements, "
+          f"{len(items) - len(found)} heuristic fallbacks")
+    return [found.get(k) or _heuristic_from_snapshot(snap) for k, snap in zip(keys, snapshots)]
+
+async def describe_snapshots_async(snapshots: List[Dict[str, Any]], concurrency: int = 8,
+                                   model: str = "gpt-5", max_retries: int = 4,
+                                   uids: Optional[List[str]] = None, batch_tokens: int = 0) -> List[str]:
+    """
+    Describe element snapshots concurrently (at most `concurrency` requests in
+    flight, reduced adaptively on rate limits). Returns descriptors in input
+    order; any element whose request ultimately fails gets the heuristic one.
 
+    batch_tokens > 0 packs many snapshots into each request (keyed by `uids`,
+    or positions) up to roughly that many prompt tokens, instead of one
+    request per element.
+    """
+    if not snapshots:
+        return []
+    if not os.getenv("OPENAI_API_KEY"):
+        return [_heuristic_from_snapshot(s) for s in snapshots]
     try:
-        text = (el.text or "").strip()
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(max_retries=0)   # retries/backoff are handled here
     except Exception:
-        text = ""
+        return [_heuristic_from_snapshot(s) for s in snapshots]
 
+    limit = _AdaptiveLimit(concurrency)
+    t0 = time.perf_counter()
     try:
-        size = el.size or {}
-        loc = el.location or {}
-        bbox = {"x": int(loc.get("x", 0)), "y": int(loc.get("y", 0)),
-                "w": int(size.get("width", 0)), "h": int(size.get("height", 0))}
-    except Exception:
-        bbox = {"x": 0, "y": 0, "w": 0, "h": 0}
+        if batch_tokens > 0:
+            keys = list(uids) if uids is not None else [str(i) for i in range(len(snapshots))]
+            descs = await _describe_batched(client, limit, snapshots, keys, model, max_retries, batch_tokens)
+        else:
+            descs = await asyncio.gather(*(_describe_one(client, limit, s, model, max_retries) for s in snapshots))
+    finally:
+        await client.close()
+    print(f"described {len(snapshots)} elements in {time.perf_counter() - t0:.1f}s "
+          f"(concurrency {concurrency}, final limit {limit.limit})")
+    return list(descs)
 
-    try:
-        outer = ga("outerHTML") or ""
-        outer_short = outer if len(outer) <= 1200 else ""
-    except Exception:
-        outer_short = ""
-
-    snap = {"tag": tag, "text": text, "attrs": attrs, "bbox": bbox}
-    if outer_short:
-        snap["outerHTML"] = outer_short
-    return snap
-
-def gpt_describer(el: WebElement) -> str:
-    snapshot = _build_snapshot(el)
-    client = _safe_client()
-    if not client:
-        return UIDGenerator.heuristic_descriptor(el)
-
-    system_msg = (
-        "You are an accessibility-savvy UI describer. "
-        "Given an element snapshot, write ONE concise, human-friendly descriptor (<= 20 words). "
-        "Prefer user-facing semantics over technical markup. "
-        "If link or button, summarize purpose using visible text/aria/alt. "
-        "If image, prefer alt text; if missing, summarize visible content. "
-        "Avoid raw IDs/classes or code. No quotes. No trailing punctuation."
-    )
-    user_msg = "Element snapshot (JSON):\n" + json.dumps(snapshot, ensure_ascii=False)
+def describe_snapshots(snapshots: List[Dict[str, Any]], concurrency: int = 8, model: str = "gpt-5",
+                       uids: Optional[List[str]] = None, batch_tokens: int = 0) -> List[str]:
+    return asyncio.run(describe_snapshots_async(snapshots, concurrency=concurrency, model=model,
+                                                uids=uids, batch_tokens=batch_tokens))
 
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-5",
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg},
-            ],
-        )
-        desc = (resp.choices[0].message.content or "").strip()
-        if not desc:
-            raise ValueError("Empty description")
-        words = desc.split()
-        if len(words) > 20:
-            desc = " ".join(words[:20])
-        return desc
-    except Exception:
-        return UIDGenerator.heuristic_descriptor(el)
-    finally:
-        time.sleep(0.03)
-
-# ---------- Computed styles (color/size/saturation/etc.) ----------
-
-# this is to get the color and the saturation of the element (hsl_)
-_JS_STYLE_SNAPSHOT = """
-return (function(el){
-  const cs = window.getComputedStyle(el);
-  const rect = el.getBoundingClientRect();
-
-  function parseRGB(s){
-    if(!s) return null;
-    const m = s.match(/rgba?\\((\\d+),\\s*(\\d+),\\s*(\\d+)(?:,\\s*([\\d\\.]+))?\\)/i);
-    if(!m) return null;
-    return {r:+m[1], g:+m[2], b:+m[3]};
-  }
-  function rgbToHsl(r,g,b){
-    r/=255; g/=255; b/=255;
-    const max=Math.max(r,g,b), min=Math.min(r,g,b);
-    let h,s,l=(max+min)/2;
-    if (max===min){ h=0; s=0; }
-    else {
-      const d=max-min;
-      s = l>0.5 ? d/(2-max-min) : d/(max+min);
-      switch(max){
-        case r: h=(g-b)/d + (g<b?6:0); break;
-        case g: h=(b-r)/d + 2; break;
-        case b: h=(r-g)/d + 4; break;
-      }
-      h/=6;
-    }
-    return {h:Math.round(h*360), s:Math.round(s*100), l:Math.round(l*100)};
-  }
-
-  const fg = parseRGB(cs.color);
-  const bg = parseRGB(cs.backgroundColor);
-  const hsl_fg = fg ? rgbToHsl(fg.r, fg.g, fg.b) : null;
-  const hsl_bg = bg ? rgbToHsl(bg.r, bg.g, bg.b) : null;
-
-  return {
-    width: Math.round(rect.width),
-    height: Math.round(rect.height),
-    color: cs.color,
-    backgroundColor: cs.backgroundColor,
-    fontSize: cs.fontSize,
-    fontWeight: cs.fontWeight,
-    hslFG: hsl_fg,
-    hslBG: hsl_bg,
-    display: cs.display,
-    visibility: cs.visibility,
-    opacity: cs.opacity
-  };
-})(arguments[0]);
-"""
-
-def _style_summary(driver, el: WebElement) -> str:
+# ---------- main dataset build ----------
+
+def build_initial_dataset(reviewable_html: Path, out_json: Path, concurrency: int = 8,
+                          batch_tokens: int = 3000, static: bool = False, driver=None,
+                          incremental: bool = False) -> None:
     """
-    Returns a concise, readable string summarizing key style facts:
-    size, colors, font, and saturation (FG/BG).
+    1) Snapshot every meaningful element (UID, type, snapshot, style facts)
+       with one bulk DOM extraction (dom_extract) — the only browser round trip.
+    2) Describe all snapshots concurrently (describe_snapshots), packed into
+       multi-element requests of ~batch_tokens prompt tokens (0 = one request
+       per element), falling back to the heuristic descriptor per element.
+    Writes the dataset (SQLite store for .sqlite/.db, else compact JSON), in element order.
+
+    static=True parses the saved HTML instead of launching Chrome: same UIDs,
+    types and snapshots, but no bbox and no computed-style facts in the
+    descriptors (those need layout). A `driver` passed in (crawl worker pool)
+    is navigated to the page and left open.
+
+    incremental=True diffs against the existing dataset by UID: elements that
+    are still on the page keep their descriptor, neighbors and feedback (style
+    facts are refreshed), only new UIDs go to the describer, and elements that
+    are gone are dropped. Stored descriptors that are just the heuristic
+    fallback are described again.
     """
-    try:
-        s = driver.execute_script(_JS_STYLE_SNAPSHOT, el) or {}
-    except Exception:
-        return ""
-
-    def add_if(val, fmt):
-        return [fmt.format(val)] if val else []
-
-    parts: List[str] = []
-    # size
-    w, h = s.get("width"), s.get("height")
-    if isinstance(w, int) and isinstance(h, int):
-        parts += add_if(True, f"size={w}x{h}px")
-    # colors
-    parts += add_if(s.get("color"), "color={}")
-    if s.get("backgroundColor") and s["backgroundColor"] != "rgba(0, 0, 0, 0)":
-        parts += add_if(s.get("backgroundColor"), "bg={}")
-    # font
-    parts += add_if(s.get("fontSize"), "font-size={}")
-    parts += add_if(s.get("fontWeight"), "font-weight={}")
-    # saturation
-    hsl_fg, hsl_bg = s.get("hslFG"), s.get("hslBG")
-    if hsl_fg and isinstance(hsl_fg.get("s"), (int, float)):
-        parts.append(f"saturation_fg={int(hsl_fg['s'])}%")
-    if hsl_bg and isinstance(hsl_bg.get("s"), (int, float)):
-        parts.append(f"saturation_bg={int(hsl_bg['s'])}%")
-    # visibility/opacity if relevant
-    if s.get("visibility") and s["visibility"] != "visible":
-        parts.append(f"visibility={s['visibility']}")
-    if s.get("opacity") and s["opacity"] != "1":
-        parts.append(f"opacity={s['opacity']}")
-
-    return ", ".join(parts)
-
-# ---------- main dataset build ----------
+    if static:
+        records = extract_elements_static(reviewable_html)
+    elif driver is not None:
+        records = load_page(driver, reviewable_html)
+    else:
+        driver = _open_local_in_chrome(reviewable_html, headless=True)
+        try:
+            records = extract_elements(driver)
+        finally:
+            driver.quit()
 
-def build_initial_dataset(reviewable_html: Path, out_json: Path) -> None:
-    driver = _open_local_in_chrome(reviewable_html, headless=True)
+    print("num elements: ", len(records))
+    ds = open_dataset(out_json)
     try:
-        print("num elements: ", _collect_elements(driver).__len__())
-        seen: Dict[str, Dict[str, Any]] = {}
-        for el in _collect_elements(driver):
-            uid = UIDGenerator.id_for_element(driver, el)
-            if uid in seen:
+        prev = ds.snapshot() if incremental else None
+        entries: Dict[str, Dict[str, Any]] = {}
+        pending: List[str] = []   # UIDs that need a descriptor
+        snapshots: List[Dict[str, Any]] = []
+        for rec in records:
+            uid = rec["uid"]
+            if uid in entries:
                 continue
-
-            elem_type = UIDGenerator.element_type(el)
-
-            # 1) High-level descriptor via GPT (fallback handled inside)
-            base_desc = gpt_describer(el)
-
-            # 2) Style facts via computed styles (JS)
-            style_facts = _style_summary(driver, el)
-            descriptor = f"{base_desc}; {style_facts}" if style_facts else base_desc
-
-            seen[uid] = {
-                "ID": uid,
-                "Element_descriptor": descriptor,
-                "Element_type": elem_type,
-                "Neighbor_elements": [],
-                "Element feedback": []
-            }
-
-        payload = {"Elements": list(seen.values())}
-        out_json.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
-        print(f"Wrote {out_json}")
+            # Style facts are kept as structured fields; readers append them to the descriptor
+            style = style_fields(rec["style"] or {})
+            old = prev.get(uid) if prev is not None else None
+            if old is not None:
+                entries[uid] = {**old, "Element_type": rec["tag"], "Style": style}
+                desc = old.get("Element_descriptor", "")
+                # a heuristic placeholder is worth another try once an API key is available
+                if desc and (desc != heuristic_from_record(rec) or not os.getenv("OPENAI_API_KEY")):
+                    continue
+            else:
+                entries[uid] = new_entry(uid, rec["tag"], style=style)
+            pending.append(uid)
+            snapshots.append(snapshot_from_record(rec))
+
+        # High-level descriptors via GPT, concurrently (fallback handled per element)
+        base_descs = describe_snapshots(snapshots, concurrency=concurrency,
+                                        uids=pending, batch_tokens=batch_tokens)
+        for uid, base_desc in zip(pending, base_descs):
+            entries[uid]["Element_descriptor"] = base_desc
+
+        if prev is not None:
+            kept = [u for u in entries if u in prev]
+            removed = len(prev) - len(kept)
+            for e in entries.values():   # neighbor links into removed elements are dropped
+                e["Neighbors"] = [n for n in e.get("Neighbors", []) if n.get("ID") in entries]
+            print(f"[init] incremental: {len(entries) - len(kept)} added, {removed} removed, "
+                  f"{len(kept)} unchanged; described {len(pending)} "
+                  f"({len(pending) - (len(entries) - len(kept))} re-described)")
+
+        with ds.transaction():   # the rebuilt dataset replaces the old one atomically
+            ds.reset()
+            ds.upsert_many(list(entries.values()))
+        ds.commit()
     finally:
-        driver.quit()
+        ds.close()
+    print(f"Wrote {out_json}")
 
 if __name__ == "__main__":
     reviewable = Path("reviewable_page.html")
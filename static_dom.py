@@ -0,0 +1,616 @@
+# static_dom.py
+"""
+Browserless DOM for saved pages: builds the element tree a browser would
+build from an HTML file (stdlib html.parser + the tree-construction rules that
+matter for real pages: implied html/head/body, optional end tags, implied
+tbody/tr, foster parenting, raw-text elements, SVG/MathML case fixups) and
+serializes elements the way outerHTML does.
+
+static_records() yields the layout-independent part of dom_extract's records
+(tag, attrs, text, dom_path, outerHTML), so UIDs computed from them match
+UIDGenerator.id_for_element on the same file.
+
+Not emulated: stylesheets (visibility only honors the hidden attribute and
+inline display/visibility), the adoption agency for misnested formatting
+tags, and layout (rect, bbox, computed style stay with Chrome).
+"""
+from __future__ import annotations
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, Optional, Union
+from urllib.parse import urljoin
+
+VOID = {
+    "area","base","basefont","bgsound","br","col","embed","frame","hr","img","input",
+    "keygen","link","meta","param","source","track","wbr",
+}
+# Children serialized verbatim (scripting enabled, as in Chrome)
+RAW_TEXT = {"style","script","xmp","iframe","noembed","noframes","plaintext","noscript"}
+_HEAD_TAGS = {"base","basefont","bgsound","link","meta","title","noscript","noframes","style","script","template"}
+
+# Start tags that close an open <p>
+_CLOSES_P = {
+    "address","article","aside","blockquote","center","details","dialog","dir","div","dl",
+    "fieldset","figcaption","figure","footer","header","hgroup","main","menu","nav","ol","p",
+    "search","section","summary","ul","h1","h2","h3","h4","h5","h6","pre","listing","form",
+    "table","hr","xmp","plaintext","li","dd","dt",
+}
+_HEADINGS = {"h1","h2","h3","h4","h5","h6"}
+_IMPLIED_END = {"dd","dt","li","optgroup","option","p","rb","rp","rt","rtc"}
+_SPECIAL = {
+    "address","applet","area","article","aside","base","basefont","bgsound","blockquote","body",
+    "br","button","caption","center","col","colgroup","dd","details","dir","div","dl","dt",
+    "embed","fieldset","figcaption","figure","footer","form","frame","frameset","h1","h2","h3",
+    "h4","h5","h6","head","header","hgroup","hr","html","iframe","img","input","keygen","li",
+    "link","listing","main","marquee","menu","meta","nav","noembed","noframes","noscript",
+    "object","ol","p","param","plaintext","pre","script","search","section","select","source",
+    "style","summary","table","tbody","td","template","textarea","tfoot","th","thead","title",
+    "tr","track","ul","wbr","xmp",
+}
+_SCOPE = {"applet","caption","html","table","td","th","marquee","object","template"}
+_TABLE_CTX = {"table","tbody","thead","tfoot","tr"}
+_TABLE_SECTIONS = {"tbody","thead","tfoot"}
+_TABLE_CONTENT = {"caption","colgroup","col","tbody","thead","tfoot","tr","td","th",
+                  "script","style","template","form"}
+# HTML start tags that leave SVG/MathML content
+_BREAKOUT = {
+    "b","big","blockquote","body","br","center","code","dd","div","dl","dt","em","embed",
+    "h1","h2","h3","h4","h5","h6","head","hr","i","img","li","listing","menu","meta","nobr",
+    "ol","p","pre","ruby","s","small","span","strong","strike","sub","sup","table","tt","u",
+    "ul","var",
+}
+_HTML_INTEGRATION = {"foreignobject","desc","title"}
+
+_SVG_TAGS = {t.lower(): t for t in (
+    "altGlyph altGlyphDef altGlyphItem animateColor animateMotion animateTransform clipPath "
+    "feBlend feColorMatrix feComponentTransfer feComposite feConvolveMatrix feDiffuseLighting "
+    "feDisplacementMap feDistantLight feDropShadow feFlood feFuncA feFuncB feFuncG feFuncR "
+    "feGaussianBlur feImage feMerge feMergeNode feMorphology feOffset fePointLight "
+    "feSpecularLighting feSpotLight feTile feTurbulence foreignObject glyphRef linearGradient "
+    "radialGradient textPath").split()}
+_SVG_ATTRS = {a.lower(): a for a in (
+    "attributeName attributeType baseFrequency baseProfile calcMode clipPathUnits "
+    "diffuseConstant edgeMode filterUnits glyphRef gradientTransform gradientUnits kernelMatrix "
+    "kernelUnitLength keyPoints keySplines keyTimes lengthAdjust limitingConeAngle markerHeight "
+    "markerUnits markerWidth maskContentUnits maskUnits numOctaves pathLength "
+    "patternContentUnits patternTransform patternUnits pointsAtX pointsAtY pointsAtZ "
+    "preserveAlpha preserveAspectRatio primitiveUnits refX refY repeatCount repeatDur "
+    "requiredExtensions requiredFeatures specularConstant specularExponent spreadMethod "
+    "startOffset stdDeviation stitchTiles surfaceScale systemLanguage tableValues targetX "
+    "targetY textLength viewBox viewTarget xChannelSelector yChannelSelector zoomAndPan").split()}
+
+class Comment(str):
+    pass
+
+class Element:
+    __slots__ = ("tag", "ns", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, ns: str = "html", attrs: Optional[Dict[str, str]] = None):
+        self.tag = tag          # qualified name as serialized ("div", "linearGradient")
+        self.ns = ns            # "html", "svg" or "math"
+        self.attrs: Dict[str, str] = attrs or {}
+        self.children: List[Union["Element", str]] = []
+        self.parent: Optional[Element] = None
+
+    @property
+    def name(self) -> str:
+        return self.tag.lower()
+
+    @property
+    def tag_name(self) -> str:
+        """DOM tagName: upper-cased for HTML elements."""
+        return self.tag.upper() if self.ns == "html" else self.tag
+
+    def append(self, node: Union["Element", str]) -> None:
+        self.insert(len(self.children), node)
+
+    def insert(self, i: int, node: Union["Element", str]) -> None:
+        if type(node) is str and i > 0 and type(self.children[i - 1]) is str:
+            self.children[i - 1] += node   # adjacent text merges into one node
+            return
+        if isinstance(node, Element):
+            node.parent = self
+        self.children.insert(i, node)
+
+    def element_children(self) -> List["Element"]:
+        return [c for c in self.children if isinstance(c, Element)]
+
+# -------- tree construction --------
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html: Optional[Element] = None
+        self.head: Optional[Element] = None
+        self.body: Optional[Element] = None
+        self.stack: List[Element] = []
+        self.mode = "initial"
+
+    @property
+    def current(self) -> Element:
+        return self.stack[-1]
+
+    # ----- helpers -----
+    def _ensure_html(self, attrs=None) -> None:
+        if self.html is None:
+            self.html = Element("html", attrs=dict(attrs or {}))
+            self.stack = [self.html]
+            self.mode = "before_head"
+
+    def _ensure_head(self) -> None:
+        self._ensure_html()
+        if self.head is None:
+            self.head = Element("head")
+            self.html.append(self.head)
+            self.stack.append(self.head)
+            self.mode = "in_head"
+
+    def _ensure_body(self) -> None:
+        self._ensure_head()
+        if self.mode == "in_head":
+            self._pop_until("head")
+        if self.body is None:
+            self.body = Element("body")
+            self.html.append(self.body)
+            self.stack.append(self.body)
+        self.mode = "in_body"
+
+    def _in_scope(self, names, extra=()) -> Optional[int]:
+        for i in range(len(self.stack) - 1, -1, -1):
+            el = self.stack[i]
+            if el.ns == "html" and el.name in names:
+                return i
+            if (el.ns == "html" and (el.name in _SCOPE or el.name in extra)) or \
+               (el.ns == "svg" and el.name in _HTML_INTEGRATION):
+                return None
+        return None
+
+    def _pop_until(self, *names: str) -> None:
+        while len(self.stack) > 1:
+            el = self.stack.pop()
+            if el.name in names:
+                return
+
+    def _close_p(self) -> None:
+        if self._in_scope({"p"}, extra={"button"}) is not None:
+            self._pop_until("p")
+
+    def _foster_target(self):
+        """Parent + index for content that is not allowed directly inside a table."""
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].name == "table" and self.stack[i].parent is not None:
+                table = self.stack[i]
+                return table.parent, table.parent.children.index(table)
+        return self.current, len(self.current.children)
+
+    def _insert(self, node: Union[Element, str], push: bool) -> None:
+        cur = self.current
+        foster = (cur.ns == "html" and cur.name in _TABLE_CTX and self.mode == "in_body" and (
+            (isinstance(node, Element) and not (node.ns == "html" and node.name in _TABLE_CONTENT)
+             and not (node.name == "input" and node.attrs.get("type", "").lower() == "hidden"))
+            or (type(node) is str and node.strip())))
+        if foster:
+            parent, i = self._foster_target()
+            parent.insert(i, node)
+        else:
+            cur.append(node)
+        if push and isinstance(node, Element):
+            self.stack.append(node)
+
+    def _child_ns(self, tag: str) -> str:
+        cur = self.current
+        if cur.ns == "svg" and cur.name not in _HTML_INTEGRATION:
+            return "html" if tag in _BREAKOUT else "svg"
+        if cur.ns == "math":
+            return "html" if tag in _BREAKOUT else "math"
+        return {"svg": "svg", "math": "math"}.get(tag, "html")
+
+    # ----- tokens -----
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, self_closing=False)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, self_closing=True)
+
+    def _start(self, tag: str, attrs, self_closing: bool) -> None:
+        amap: Dict[str, str] = {}
+        for k, v in attrs:
+            amap.setdefault(k, "" if v is None else v)   # first duplicate wins
+
+        if tag == "html":
+            if self.html is None:
+                self._ensure_html(amap)
+            else:
+                for k, v in amap.items():
+                    self.html.attrs.setdefault(k, v)
+            return
+        if self.html is None:
+            self._ensure_html()
+        if self.mode == "before_head":
+            if tag == "head":
+                self._ensure_head()
+                self.head.attrs.update(amap)
+                return
+            self._ensure_head()
+        if self.mode in ("in_head", "after_head") and tag in _HEAD_TAGS:
+            parent = self.current if self.mode == "in_head" else self.head
+            el = Element(tag, attrs=amap)
+            parent.append(el)
+            if tag not in VOID:
+                self.stack.append(el)
+                self._raw_text(tag)
+            return
+        if tag == "head":
+            return
+        if tag == "body":
+            if self.body is None:
+                self._ensure_body()
+                self.body.attrs.update(amap)
+            else:
+                for k, v in amap.items():
+                    self.body.attrs.setdefault(k, v)
+            return
+        if self.mode != "in_body":
+            self._ensure_body()
+
+        ns = self._child_ns(tag)
+        if ns != "html":
+            if ns == "svg":
+                tag = _SVG_TAGS.get(tag, tag)
+                amap = {_SVG_ATTRS.get(k, k): v for k, v in amap.items()}
+            elif "definitionurl" in amap:
+                amap = {("definitionURL" if k == "definitionurl" else k): v for k, v in amap.items()}
+            el = Element(tag, ns, amap)
+            self._insert(el, push=not self_closing)
+            return
+
+        # Leaving foreign content on an HTML breakout tag
+        while self.current.ns != "html" and not (self.current.ns == "svg" and self.current.name in _HTML_INTEGRATION):
+            self.stack.pop()
+
+        if tag == "image":
+            tag = "img"
+        if tag in _CLOSES_P:
+            self._close_p()
+        if tag in _HEADINGS and self.current.name in _HEADINGS:
+            self.stack.pop()
+        elif tag == "li":
+            self._close_list_item({"li"})
+        elif tag in ("dd", "dt"):
+            self._close_list_item({"dd", "dt"})
+        elif tag in ("option", "optgroup"):
+            if self.current.name == "option":
+                self.stack.pop()
+        elif tag == "button" and self._in_scope({"button"}) is not None:
+            self._pop_until("button")
+        elif tag == "a" and any(e.name == "a" for e in self.stack[self._last_marker():]):
+            self._pop_until("a")
+        elif tag in ("td", "th"):
+            if self._in_scope({"td", "th"}, extra=()) is not None:
+                self._pop_until("td", "th")
+            if self.current.name in {"table"} | _TABLE_SECTIONS:
+                if self.current.name == "table":
+                    self._insert(Element("tbody"), push=True)
+                self._insert(Element("tr"), push=True)
+        elif tag == "tr":
+            if self._in_scope({"td", "th"}) is not None:
+                self._pop_until("td", "th")
+            if self._in_scope({"tr"}) is not None:
+                self._pop_until("tr")
+            if self.current.name == "table":
+                self._insert(Element("tbody"), push=True)
+        elif tag in _TABLE_SECTIONS or tag in ("caption", "colgroup"):
+            while self.current.name in {"td", "th", "tr"} | _TABLE_SECTIONS:
+                self.stack.pop()
+        elif tag == "col" and self.current.name == "table":
+            self._insert(Element("colgroup"), push=True)
+
+        el = Element(tag, attrs=amap)
+        self._insert(el, push=tag not in VOID)
+        if tag not in VOID:
+            self._raw_text(tag)
+
+    def _raw_text(self, tag: str) -> None:
+        if tag in RAW_TEXT and tag not in ("script", "style"):   # html.parser already handles those
+            self.set_cdata_mode(tag)
+
+    def _last_marker(self) -> int:
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].name in _SCOPE:
+                return i
+        return 0
+
+    def _close_list_item(self, names) -> None:
+        for i in range(len(self.stack) - 1, -1, -1):
+            el = self.stack[i]
+            if el.name in names:
+                del self.stack[i:]
+                break
+            if el.name in _SPECIAL and el.name not in ("address", "div", "p"):
+                break
+        self._close_p()
+
+    def handle_endtag(self, tag):
+        if self.html is None:
+            self._ensure_html()
+        if tag in ("body", "html"):
+            if self.mode in ("before_head", "in_head", "after_head"):
+                self._ensure_body()
+            self.mode = "after_body"
+            return
+        if self.mode == "before_head":
+            if tag != "br":
+                return
+            self._ensure_head()
+        if self.mode == "in_head":
+            if tag == "head":
+                self._pop_until("head")
+                self.mode = "after_head"
+                return
+            if self.current is not self.head and self.current.name == tag:
+                self.stack.pop()
+                return
+            if tag != "br":
+                return
+            self._ensure_body()
+        if self.mode == "after_head":
+            if tag != "br":
+                return
+            self._ensure_body()
+        if self.mode == "after_body":
+            self.mode = "in_body"
+
+        if tag == "br":
+            self._start("br", [], self_closing=True)
+            return
+        if tag == "p" and self._in_scope({"p"}, extra={"button"}) is None:
+            self._start("p", [], self_closing=False)
+        if tag == "table" or tag in _TABLE_SECTIONS or tag == "tr":
+            if self._in_scope({tag}) is not None:
+                self._pop_until(tag)
+            return
+        if tag in _SPECIAL and tag not in _IMPLIED_END or tag in ("p", "li", "dd", "dt"):
+            if self._in_scope({tag}) is not None:
+                self._pop_until(tag)
+            return
+        # Any other end tag (formatting elements, unknown tags, foreign content)
+        for i in range(len(self.stack) - 1, 0, -1):
+            el = self.stack[i]
+            if el.name == tag:
+                del self.stack[i:]
+                return
+            if el.ns == "html" and el.name in _SPECIAL:
+                return
+
+    def handle_data(self, data):
+        if self.html is None or self.mode in ("before_head", "after_head") or \
+                (self.mode == "in_head" and self.current is self.head):
+            if not data.strip():
+                if self.mode == "in_head":
+                    self.head.append(data)
+                elif self.mode == "after_head":
+                    self.html.append(data)
+                return
+            self._ensure_body()
+        elif self.mode == "after_body":
+            if data.strip():
+                self.mode = "in_body"
+        cur = self.current
+        if cur.name in ("pre", "textarea", "listing") and not cur.children and data.startswith("\n"):
+            data = data[1:]   # the parser drops a newline right after these start tags
+            if not data:
+                return
+        self._insert(data, push=False)
+
+    def handle_comment(self, data):
+        if self.html is None:
+            return
+        target = self.html if self.mode == "after_body" else self.current
+        target.append(Comment(data))
+
+def parse_html(html: str) -> Element:
+    """The <html> element of the document the browser would build from `html`."""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    builder._ensure_body()
+    return builder.html
+
+# -------- serialization (outerHTML) --------
+def _escape_text(s: str) -> str:
+    return s.replace("&", "&amp;").replace("\xa0", "&nbsp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def _escape_attr(s: str) -> str:
+    # Current Chrome also escapes < and > in attribute values
+    return (s.replace("&", "&amp;").replace("\xa0", "&nbsp;").replace('"', "&quot;")
+             .replace("<", "&lt;").replace(">", "&gt;"))
+
+def outer_html(el: Element) -> str:
+    out: List[str] = []
+    _serialize(el, out)
+    return "".join(out)
+
+def _serialize(el: Element, out: List[str]) -> None:
+    out.append("<" + el.tag)
+    for k, v in el.attrs.items():
+        out.append(f' {k}="{_escape_attr(v)}"')
+    out.append(">")
+    if el.ns == "html" and el.name in VOID:
+        return
+    raw = el.ns == "html" and el.name in RAW_TEXT
+    for child in el.children:
+        if isinstance(child, Element):
+            _serialize(child, out)
+        elif isinstance(child, Comment):
+            out.append(f"<!--{child}-->")
+        else:
+            out.append(child if raw else _escape_text(child))
+    out.append(f"</{el.tag}>")
+
+# -------- element facts --------
+def dom_path(el: Element) -> str:
+    """Same :nth-of-type path as UID_Generator's _JS_DOM_PATH."""
+    parts: List[str] = []
+    cur: Optional[Element] = el
+    while cur is not None:
+        idx = 1
+        if cur.parent is not None:
+            for sib in cur.parent.element_children():
+                if sib is cur:
+                    break
+                if sib.tag_name == cur.tag_name:
+                    idx += 1
+        parts.append(f"{cur.name}:nth-of-type({idx})")
+        cur = cur.parent
+    return ">".join(reversed(parts))
+
+def iter_elements(root: Element) -> Iterator[Element]:
+    """Document order, like getElementsByTagName('*') (template contents excluded)."""
+    stack = [root]
+    while stack:
+        el = stack.pop()
+        yield el
+        if el.name != "template":
+            stack.extend(reversed(el.element_children()))
+
+def text_content(el: Element) -> str:
+    parts: List[str] = []
+    for child in el.children:
+        if isinstance(child, Element):
+            parts.append(text_content(child))
+        elif not isinstance(child, Comment):
+            parts.append(child)
+    return "".join(parts)
+
+_NOT_RENDERED = {"head","script","style","template","noscript","title","meta","link","base","datalist"}
+_BLOCK = {
+    "address","article","aside","blockquote","details","dialog","div","dl","dd","dt","fieldset",
+    "figcaption","figure","footer","form","h1","h2","h3","h4","h5","h6","header","hgroup","hr",
+    "li","main","nav","ol","option","p","pre","section","summary","table","tr","ul","caption",
+    "thead","tbody","tfoot","legend","listing","menu",
+}
+def _inline_style(prop: str, values: str):
+    return re.compile(r"(?:^|;)\s*%s\s*:\s*(%s)\s*(?:!important\s*)?(?:;|$)" % (prop, values), re.I)
+
+_DISPLAY_NONE = _inline_style("display", "none")
+_VISIBILITY = _inline_style("visibility", "hidden|collapse|visible")
+_WS = re.compile(r"[ \t\n\r\f]+")
+
+def display_none(el: Element) -> bool:
+    """Own computed display is 'none' (UA defaults, hidden attribute, inline style)."""
+    if el.ns == "html" and (el.name in _NOT_RENDERED or "hidden" in el.attrs):
+        return True
+    if el.name == "input" and el.attrs.get("type", "").lower() == "hidden":
+        return True
+    return bool(_DISPLAY_NONE.search(el.attrs.get("style", "")))
+
+def visibility_hidden(el: Element) -> bool:
+    """visibility is inherited: the nearest inline declaration decides."""
+    cur: Optional[Element] = el
+    while cur is not None:
+        m = _VISIBILITY.search(cur.attrs.get("style", ""))
+        if m:
+            return m.group(1).lower() != "visible"
+        cur = cur.parent
+    return False
+
+def inner_text(el: Element) -> str:
+    """Approximation of HTMLElement.innerText without layout."""
+    cur = el.parent
+    while cur is not None:
+        if display_none(cur):
+            return text_content(el)   # not being rendered: innerText falls back to textContent
+        cur = cur.parent
+    parts: List[str] = []
+    _rendered_text(el, parts, pre=el.name in ("pre", "textarea", "listing"))
+    lines = [ln.strip(" ") for ln in "".join(parts).split("\n")]
+    return "\n".join(ln for ln in lines if ln)
+
+def _rendered_text(el: Element, parts: List[str], pre: bool) -> None:
+    for child in el.children:
+        if isinstance(child, Comment):
+            continue
+        if not isinstance(child, Element):
+            parts.append(child if pre else _WS.sub(" ", child))
+            continue
+        if display_none(child) or visibility_hidden(child):
+            continue
+        if child.name == "br":
+            parts.append("\n")
+            continue
+        block = child.ns == "html" and child.name in _BLOCK
+        if block:
+            parts.append("\n")
+        _rendered_text(child, parts, pre or child.name in ("pre", "textarea", "listing"))
+        if block:
+            parts.append("\n")
+
+def _control_value(el: Element) -> Optional[str]:
+    """The string .value property (WebDriver's getAttribute prefers it), or None."""
+    name = el.name if el.ns == "html" else ""
+    if name == "input":
+        if "value" in el.attrs:
+            return el.attrs["value"]
+        return "on" if el.attrs.get("type", "").lower() in ("checkbox", "radio") else ""
+    if name == "textarea":
+        return text_content(el)
+    if name == "select":
+        options = [o for o in iter_elements(el) if o.name == "option"]
+        chosen = [o for o in options if "selected" in o.attrs]
+        if not chosen and options and "multiple" not in el.attrs:
+            chosen = options[:1]
+        if not chosen:
+            return ""
+        o = chosen[0]
+        return o.attrs["value"] if "value" in o.attrs else _WS.sub(" ", text_content(o)).strip()
+    if name == "output":
+        return text_content(el)
+    if name in ("button", "option", "data", "param"):
+        return el.attrs.get("value", "")
+    return None
+
+def _document_base(root: Element, url: str) -> str:
+    for el in iter_elements(root):
+        if el.name == "base" and "href" in el.attrs:
+            return urljoin(url, el.attrs["href"].strip())
+    return url
+
+def _get_attribute(el: Element, name: str, base: str) -> Optional[str]:
+    if name == "href" and el.ns == "html" and el.name in ("a", "area", "link"):
+        href = el.attrs.get("href")
+        return urljoin(base, href.strip()) if href is not None else ""
+    if name == "value":
+        v = _control_value(el)
+        if v is not None:
+            return v
+    return el.attrs.get(name)
+
+def static_records(html: str, url: str, tags, attr_names: List[str]) -> List[Dict[str, Any]]:
+    """
+    dom_extract's per-element record for every element whose tag is in `tags`,
+    in document order, without the layout fields (rect, bbox, style are None).
+    `url` is the page URL (file://...) that relative hrefs resolve against.
+    """
+    root = parse_html(html)
+    base = _document_base(root, url)
+    wanted = set(tags)
+    out: List[Dict[str, Any]] = []
+    for el in iter_elements(root):
+        if el.name not in wanted:
+            continue
+        attrs = {}
+        for n in attr_names:
+            v = _get_attribute(el, n, base)
+            if v:
+                attrs[n] = v
+        hidden = display_none(el) or visibility_hidden(el)
+        out.append({
+            "tag": el.name,
+            "attrs": attrs,
+            "text": "" if hidden else inner_text(el).strip(),
+            "rect": None,
+            "bbox": None,
+            "style": None,
+            "dom_path": dom_path(el),
+            "outerHTML": outer_html(el),
+        })
+    return out
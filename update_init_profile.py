@@ -20,15 +20,114 @@ Usage:
       --elements element_dataset.json \
       --model gpt-5 \
       --dry-run
+
+Identical (profile, element feedback, model) inputs are answered from the shared
+LLM response cache (QueryEnhancement/llm_cache.py); --bypass-llm-cache forces a
+fresh call.
+
+Prompt assembly: elements are ranked by information value (feedback first,
+then how much of it), compressed (short base descriptor, compact style,
+deduped feedback, nearby elements for context) and packed to
+--token-budget. When the elements with feedback don't fit in one prompt,
+they are split into budget-sized chunks that are summarized in parallel
+(map); the summaries are condensed in further parallel rounds until they fit
+the budget, and one final call merges them into the updated list (reduce).
 """
 
 import os
+import sys
 import json
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
-from openai import OpenAI
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "QueryEnhancement"))
+from llm_cache import DEFAULT_LLM_CACHE, LLMResponseCache
+from element_dataset import FORMAT, ElementDataset, load_dataset
+
+PROMPT_VERSION = "update_profile@2"  # bump when the prompt in _call_gpt_for_updated_list changes
+MAP_PROMPT_VERSION = "update_profile_map@1"  # bump when the prompt in _summarize_chunk changes
+CONDENSE_PROMPT_VERSION = "update_profile_condense@1"  # bump when the prompt in _condense_chunk changes
+
+
+def _estimate_tokens(obj: Any) -> int:
+    # ~4 characters per token for JSON-ish English; good enough for packing
+    return len(json.dumps(obj, ensure_ascii=False)) // 4 + 1
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def _pack_to_budget(items: List[Any], budget: int) -> List[List[Any]]:
+    """Greedy, order-preserving chunks of `items` of at most ~`budget` tokens each."""
+    chunks: List[List[Any]] = []
+    cur: List[Any] = []
+    used = 0
+    for it in items:
+        cost = _estimate_tokens(it)
+        if cur and used + cost > budget:
+            chunks.append(cur)
+            cur, used = [], 0
+        cur.append(it)
+        used += cost
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def _fit_item(item: Dict[str, Any], budget: int) -> Dict[str, Any]:
+    """
+    Shrink a prompt item to ~`budget` tokens: drop "near", then clip the
+    feedback texts evenly, dropping the last ones if they get too short.
+    """
+    if _estimate_tokens(item) <= budget:
+        return item
+    item = {k: v for k, v in item.items() if k != "near"}
+    feedback = list(item.get("feedback", []))
+    while feedback:
+        room = budget * 4 - len(json.dumps({**item, "feedback": []}, ensure_ascii=False)) - 8 * len(feedback)
+        per = room // len(feedback)
+        if per >= 40:
+            item["feedback"] = [_clip(f, per) for f in feedback]
+            if _estimate_tokens(item) <= budget:
+                return item
+        feedback = feedback[:-1]
+    item["feedback"] = []
+    return item
+
+
+def _compact_color(c: Any) -> str:
+    """[r, g, b(, a)] -> "#rrggbb" (+ "/a" when translucent); keywords pass through."""
+    if isinstance(c, list) and len(c) >= 3:
+        hexed = "#%02x%02x%02x" % tuple(int(v) for v in c[:3])
+        return hexed + (f"/{c[3]:g}" if len(c) > 3 else "")
+    return str(c)
+
+
+def _compact_style(f: Dict[str, Any]) -> str:
+    """"238x136 fg#333333 bg#ffffff 12px/400" — the style facts without the legacy verbosity."""
+    parts: List[str] = []
+    if isinstance(f.get("width"), int) and isinstance(f.get("height"), int):
+        parts.append(f"{f['width']}x{f['height']}")
+    if f.get("color"):
+        parts.append("fg" + _compact_color(f["color"]))
+    if f.get("bg"):
+        parts.append("bg" + _compact_color(f["bg"]))
+    fs = f.get("font_size_px")
+    if fs:
+        fs = f"{fs:g}px" if isinstance(fs, (int, float)) else str(fs)
+        parts.append(f"{fs}/{f['font_weight']}" if f.get("font_weight") else fs)
+    if f.get("visibility") and f["visibility"] != "visible":
+        parts.append(str(f["visibility"]))
+    op = f.get("opacity")
+    if op is not None and op != "" and op != 1:
+        parts.append(f"opacity={op}")
+    return " ".join(parts)
 
 
 @dataclass
@@ -37,9 +136,14 @@ class UpdateConfig:
     elements_path: Path
     model: str = "gpt-5"
     dry_run: bool = False
-    max_elements_for_prompt: int = 150  # cap to keep prompts sane
+    max_elements_for_prompt: Optional[int] = None  # optional hard cap after ranking (None: budget only)
     max_feedback_per_element: int = 5   # cap per element
+    prompt_token_budget: int = 6000     # per model call (system + payload), estimated at ~4 chars/token
+    map_workers: int = 4                # parallel chunk summaries when the feedback exceeds the budget
+    max_descriptor_chars: int = 160     # descriptors are clipped to this in the prompt
     dedupe_casefold: bool = True        # dedupe user_description strings by lowercase
+    llm_cache_path: Optional[str] = DEFAULT_LLM_CACHE  # None disables the response cache
+    bypass_llm_cache: bool = False      # always call the model (fresh response is still cached)
 
 
 class UpdateInitProfile:
@@ -51,23 +155,47 @@ class UpdateInitProfile:
 
     def __init__(self, cfg: UpdateConfig):
         self.cfg = cfg
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise RuntimeError("OPENAI_API_KEY is not set in environment.")
-        self.client = OpenAI(api_key=api_key)
+        # Both opened on first use (a run answered from the cache needs no API key)
+        # and shared by the map workers
+        self.client: Optional[Any] = None
+        self._llm_cache: Optional[LLMResponseCache] = None
+        self._lazy_lock = threading.Lock()
+
+    def _get_client(self):
+        """The OpenAI client, created on the first cache miss."""
+        with self._lazy_lock:
+            if self.client is None:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise RuntimeError("OPENAI_API_KEY is not set in environment.")
+                from openai import OpenAI  # imported lazily so --help / --dry-run parsing stays fast
+                self.client = OpenAI(api_key=api_key)
+            return self.client
 
     # ---------- Public API ----------
     def update_user_description(self) -> List[str]:
         profile = self._load_json(self.cfg.init_profile_path)
-        elements = self._load_json(self.cfg.elements_path)
+        elements = self._load_elements(self.cfg.elements_path)
 
         current_desc = self._get_current_user_description(profile)
         elem_feedback = self._extract_element_feedback(elements)
 
-        updated_list = self._call_gpt_for_updated_list(
-            current_desc=current_desc,
-            elem_feedback=elem_feedback,
-        )
+        sample, chunks = self._plan_prompt(current_desc, elem_feedback)
+        if chunks:
+            # Map: summarize budget-sized chunks in parallel; condense the summaries
+            # until they fit one prompt; reduce: one merge call
+            summaries = self._parallel(self._summarize_chunk, chunks, "map")
+            summaries = self._condense_to_budget(summaries, self._budget_after(self._update_overhead(current_desc)))
+            updated_list = self._call_gpt_for_updated_list(
+                current_desc=current_desc,
+                elem_feedback=[],
+                feedback_summaries=summaries,
+            )
+        else:
+            updated_list = self._call_gpt_for_updated_list(
+                current_desc=current_desc,
+                elem_feedback=sample,
+            )
 
         # Validate strictly (no fallback)
         if not isinstance(updated_list, list) or not all(isinstance(s, str) for s in updated_list):
@@ -95,6 +223,15 @@ class UpdateInitProfile:
         with path.open("r", encoding="utf-8") as f:
             return json.load(f)
 
+    @staticmethod
+    def _load_elements(path: Path) -> Dict[str, Any]:
+        """element_dataset.json (compact or legacy) or the SQLite store (.sqlite / .db)."""
+        if path.suffix.lower() not in (".sqlite", ".db"):
+            return UpdateInitProfile._load_json(path)
+        if not path.exists():
+            raise FileNotFoundError(f"File not found: {path}")
+        return {"Format": FORMAT, "Elements": load_dataset(path).elements}
+
     def _persist_user_description(self, profile: Dict[str, Any], updated: List[str]) -> None:
         if "intial_profile" not in profile or not isinstance(profile["intial_profile"], dict):
             raise ValueError('Expected top-level key "intial_profile" in init_profile.json')
@@ -120,97 +257,211 @@ class UpdateInitProfile:
 
     def _extract_element_feedback(self, elements_doc: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
-        Return a compact list of element feedback entries with:
-        - id
+        Return every element as a compact prompt item, ranked by information
+        value (elements with feedback first, the most feedback first; file order
+        breaks ties):
         - type
-        - descriptor
-        - feedback (subset)
+        - desc (base descriptor, clipped)
+        - style (compact style facts)
+        - near (base descriptors of the two nearest neighbors; feedback items only)
+        - feedback (deduped subset; omitted when empty)
         """
-        items: List[Dict[str, Any]] = []
         raw = elements_doc.get("Elements", [])
         if not isinstance(raw, list):
-            return items
-
-        for el in raw[: self.cfg.max_elements_for_prompt]:
-            if not isinstance(el, dict):
-                continue
-            items.append({
-                "id": el.get("ID"),
-                "type": el.get("Element_type"),
-                "descriptor": el.get("Element_descriptor"),
-                "feedback": list(el.get("Element feedback", []))[: self.cfg.max_feedback_per_element],
-            })
-        return items
+            return []
+
+        # Compact or legacy file
+        ds = ElementDataset({**elements_doc, "Elements": [el for el in raw if isinstance(el, dict)]})
+        limit = self.cfg.max_descriptor_chars
+        ranked = []
+        for pos, el in enumerate(ds.elements):
+            feedback = self._dedupe_and_strip(list(el.get("Element feedback", []) or []),
+                                              casefold=self.cfg.dedupe_casefold)
+            item: Dict[str, Any] = {"type": el.get("Element_type")}
+            item["desc"] = _clip(el.get("Element_descriptor", ""), limit)
+            style = _compact_style(el.get("Style") or {})
+            if style:
+                item["style"] = style
+            if feedback:
+                near = [_clip(ds.get(n["ID"])["Element_descriptor"], limit // 2)
+                        for n in el.get("Neighbors", []) if n.get("ID") in ds][:2]
+                if near:
+                    item["near"] = near
+                item["feedback"] = feedback[: self.cfg.max_feedback_per_element]
+            ranked.append(((-len(feedback), -sum(len(f) for f in feedback), pos), item))
+        ranked.sort(key=lambda r: r[0])
+        return [item for _, item in ranked][: self.cfg.max_elements_for_prompt]
+
+    def _plan_prompt(self, current_desc: List[str], items: List[Dict[str, Any]]):
+        """
+        (sample, None) when every element with feedback fits the budget in one
+        prompt (the rest of the budget is filled with feedback-less elements in
+        rank order), else (None, chunks) of feedback elements for map-reduce.
+        """
+        overhead = self._update_overhead(current_desc)
+        budget = self._budget_after(overhead)
+        with_fb = [it for it in items if it.get("feedback")]
+        costs = [_estimate_tokens(it) for it in items]
+        fb_cost = sum(c for it, c in zip(items, costs) if it.get("feedback"))
+
+        if fb_cost <= budget:
+            sample, used = [], 0
+            for it, cost in zip(items, costs):   # feedback items come first and all fit
+                if used + cost > budget:
+                    break
+                sample.append(it)
+                used += cost
+            print(f"[update-profile] prompt: {len(sample)}/{len(items)} elements "
+                  f"({len(with_fb)} with feedback), ~{used + overhead} tokens")
+            return sample, None
+
+        map_budget = self._budget_after(_estimate_tokens(self._MAP_SYSTEM))
+        chunks = _pack_to_budget([_fit_item(it, map_budget) for it in with_fb], map_budget)
+        print(f"[update-profile] {len(with_fb)} elements with feedback (~{fb_cost} tokens) exceed "
+              f"the {self.cfg.prompt_token_budget}-token budget: map-reduce over {len(chunks)} chunks")
+        return None, chunks
+
+    def _update_overhead(self, current_desc: List[str]) -> int:
+        return _estimate_tokens({"system": self._UPDATE_SYSTEM, "current": current_desc,
+                                 "instruction": self._UPDATE_INSTRUCTION})
+
+    def _budget_after(self, overhead: int) -> int:
+        """Payload tokens left in one call after `overhead` (never below a usable minimum)."""
+        return max(256, self.cfg.prompt_token_budget - overhead)
+
+    def _condense_to_budget(self, summaries: List[str], budget: int) -> List[str]:
+        """
+        Further reduce rounds: while the observations don't fit `budget`, merge
+        budget-sized chunks of them in parallel. Stops (keeping the top-ranked
+        prefix that fits) if a round no longer shrinks them.
+        """
+        chunk_budget = self._budget_after(_estimate_tokens(self._CONDENSE_SYSTEM))
+        rounds = 0
+        while _estimate_tokens(summaries) > budget:
+            rounds += 1
+            clipped = [_clip(o, chunk_budget * 2) for o in summaries]   # one observation <= half a chunk
+            condensed = self._parallel(self._condense_chunk, _pack_to_budget(clipped, chunk_budget),
+                                       f"condense round {rounds}")
+            if _estimate_tokens(condensed) >= _estimate_tokens(summaries):
+                keep = _pack_to_budget(condensed, budget)[0]
+                print(f"[update-profile] condense made no progress; keeping {len(keep)}/{len(condensed)} "
+                      f"observations")
+                return keep
+            summaries = condensed
+        return summaries
 
     # ---------- GPT Call ----------
+    _UPDATE_SYSTEM = (
+        "You are an accessibility and HCI assistant. "
+        "Given a current user description and observed UI element feedback "
+        "(element descriptors and feedback texts, or summaries of them), return ONLY a strict JSON object:\n"
+        '{ "updated_list": [ ... ] }\n'
+        "Rules:\n"
+        "- Output must be strictly valid JSON (no commentary, no trailing commas).\n"
+        "- The list should be short, descriptive tags/phrases about the user's needs/preferences.\n"
+        "- You MAY add, remove, or revise entries. Avoid duplicates and vague phrases.\n"
+        "- Prefer actionable, concrete statements (e.g., 'prefers high contrast', "
+        "'needs larger touch targets', 'uses screen reader: VoiceOver').\n"
+    )
+    _UPDATE_INSTRUCTION = (
+        "Return JSON ONLY in the shape {\"updated_list\": [ ... ]}. "
+        "Consider current_user_description and element_feedback_sample (or feedback_summaries). "
+        "Elements are {type, desc, style: 'WxH fg bg font-size/weight', near: nearby elements, feedback}. "
+        "If feedback suggests changes (e.g., struggles with small text, "
+        "needs larger hit areas, prefers condensed content, needs captions, "
+        "motion sensitivity, etc.), incorporate or refine accordingly. "
+        "Also consider the surrounding context such as neighboring elements for the user description."
+    )
+    _MAP_SYSTEM = (
+        "You are an accessibility and HCI assistant. "
+        "Given UI elements with a user's feedback ({type, desc, style: 'WxH fg bg font-size/weight', "
+        "near: nearby elements, feedback}), return ONLY a strict JSON object:\n"
+        '{ "observations": [ ... ] }\n'
+        "- At most 12 short, concrete statements about the user's needs, preferences or difficulties "
+        "that the feedback supports (mention the kind of element and style facts when relevant).\n"
+        "- No duplicates, no commentary, strictly valid JSON.\n"
+    )
+    _CONDENSE_SYSTEM = (
+        "You are an accessibility and HCI assistant. "
+        "Given observations about a user's needs, preferences and difficulties, return ONLY a strict JSON object:\n"
+        '{ "observations": [ ... ] }\n'
+        "- Merge duplicates and near-duplicates into at most 12 short, concrete statements, "
+        "keeping the best-supported ones.\n"
+        "- No commentary, strictly valid JSON.\n"
+    )
+
     def _call_gpt_for_updated_list(
         self,
         current_desc: List[str],
         elem_feedback: List[Dict[str, Any]],
+        feedback_summaries: Optional[List[str]] = None,
     ) -> List[str]:
         """
         Ask GPT for a JSON object strictly shaped as:
             { "updated_list": [ <strings> ] }
         The model may add/remove/rewrite entries to better reflect user needs implied
-        by element descriptors + feedback, preserving meaning when possible.
+        by element descriptors + feedback (or the map step's summaries of them),
+        preserving meaning when possible.
         """
-        system = (
-            "You are an accessibility and HCI assistant. "
-            "Given a current user description and observed UI element feedback "
-            "(element descriptors and feedback texts), return ONLY a strict JSON object:\n"
-            '{ "updated_list": [ ... ] }\n'
-            "Rules:\n"
-            "- Output must be strictly valid JSON (no commentary, no trailing commas).\n"
-            "- The list should be short, descriptive tags/phrases about the user's needs/preferences.\n"
-            "- You MAY add, remove, or revise entries. Avoid duplicates and vague phrases.\n"
-            "- Prefer actionable, concrete statements (e.g., 'prefers high contrast', "
-            "'needs larger touch targets', 'uses screen reader: VoiceOver').\n"
-        )
-
-        compact_feedback = []
-        for s in elem_feedback:
-            compact_feedback.append({
-                "id": s.get("id"),
-                "type": s.get("type"),
-                "descriptor": s.get("descriptor"),
-                "feedback": s.get("feedback"),
-            })
-
-        user_payload = {
-            "current_user_description": current_desc,
-            "element_feedback_sample": compact_feedback,
-            "instruction": (
-                "Return JSON ONLY in the shape {\"updated_list\": [ ... ]}. "
-                "Consider both current_user_description and element_feedback_sample. "
-                "If feedback suggests changes (e.g., struggles with small text, "
-                "needs larger hit areas, prefers condensed content, needs captions, "
-                "motion sensitivity, etc.), incorporate or refine accordingly."
-                "Also consider the surronding context such as neighboring elements for the user description."
-            ),
-        }
-
-        # Strict JSON mode using response_format
-        resp = self.client.chat.completions.create(
-            model=self.cfg.model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
-            ],
-        )
-        content = resp.choices[0].message.content
-
-        try:
-            data = json.loads(content)
-        except Exception as e:
-            raise RuntimeError(f"Model returned non-JSON content: {e}\nRaw:\n{content}") from e
-
-        updated = data.get("updated_list", None)
-        if not isinstance(updated, list) or not all(isinstance(s, str) for s in updated):
-            raise RuntimeError(
-                "Model JSON missing valid 'updated_list': list[str]. "
-                f"Received: {json.dumps(data, ensure_ascii=False)}"
+        user_payload: Dict[str, Any] = {"current_user_description": current_desc}
+        if feedback_summaries is not None:
+            user_payload["feedback_summaries"] = feedback_summaries
+        else:
+            user_payload["element_feedback_sample"] = elem_feedback
+        user_payload["instruction"] = self._UPDATE_INSTRUCTION
+        return self._json_list_call(self._UPDATE_SYSTEM, user_payload, "updated_list", PROMPT_VERSION)
+
+    def _summarize_chunk(self, chunk: List[Dict[str, Any]]) -> List[str]:
+        return self._json_list_call(self._MAP_SYSTEM, {"elements": chunk}, "observations", MAP_PROMPT_VERSION)
+
+    def _condense_chunk(self, chunk: List[str]) -> List[str]:
+        return self._json_list_call(self._CONDENSE_SYSTEM, {"observations": chunk}, "observations",
+                                    CONDENSE_PROMPT_VERSION)
+
+    def _parallel(self, fn, chunks: List[List[Any]], stage: str) -> List[str]:
+        """Run `fn` over the chunks on `map_workers` threads; deduped observations in chunk (rank) order."""
+        workers = max(1, min(self.cfg.map_workers, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(fn, chunks))
+        summaries = self._dedupe_and_strip([o for r in results for o in r], casefold=self.cfg.dedupe_casefold)
+        print(f"[update-profile] {stage}: {len(chunks)} chunks -> {len(summaries)} observations")
+        return summaries
+
+    def _json_list_call(self, system: str, user_payload: Dict[str, Any], key: str, template: str) -> List[str]:
+        """One chat call whose answer must be {key: [str, ...]}; validated answers are cached."""
+        def call() -> List[str]:
+            resp = self._get_client().chat.completions.create(
+                model=self.cfg.model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
+                ],
             )
-        return updated
+            content = resp.choices[0].message.content
+
+            try:
+                data = json.loads(content)
+            except Exception as e:
+                raise RuntimeError(f"Model returned non-JSON content: {e}\nRaw:\n{content}") from e
+
+            values = data.get(key, None) if isinstance(data, dict) else None
+            if not isinstance(values, list) or not all(isinstance(s, str) for s in values):
+                raise RuntimeError(
+                    f"Model JSON missing valid '{key}': list[str]. "
+                    f"Received: {json.dumps(data, ensure_ascii=False)}"
+                )
+            return values
+
+        # Only validated responses reach the cache (call() raises otherwise)
+        if not self.cfg.llm_cache_path:
+            return call()
+        with self._lazy_lock:
+            if self._llm_cache is None:
+                self._llm_cache = LLMResponseCache(self.cfg.llm_cache_path)
+        return self._llm_cache.cached_call(
+            self.cfg.model, template, {"system": system, **user_payload}, call,
+            bypass=self.cfg.bypass_llm_cache,
+        )
 
     # ---------- Utilities ----------
     @staticmethod
@@ -233,9 +484,14 @@ class UpdateInitProfile:
 def parse_args() -> UpdateConfig:
     p = argparse.ArgumentParser(description="Update init_profile.json user_description using element_dataset.json + GPT (strict).")
     p.add_argument("--init", default="QueryEnhancement/init_profile.json", type=Path, help="Path to init_profile.json")
-    p.add_argument("--elements", default="element_dataset.json", type=Path, help="Path to element_dataset.json")
+    p.add_argument("--elements", default="element_dataset.json", type=Path, help="Path to element_dataset.json or the element_dataset.sqlite store")
     p.add_argument("--model", default="gpt-5", help="Model name (default: gpt-5)")
     p.add_argument("--dry-run", action="store_true", help="Print updated_list without writing file")
+    p.add_argument("--token-budget", type=int, default=6000,
+                   help="Estimated prompt tokens per model call; larger feedback sets are map-reduced")
+    p.add_argument("--map-workers", type=int, default=4, help="Parallel chunk summaries in map-reduce mode")
+    p.add_argument("--bypass-llm-cache", action="store_true",
+                   help="Call the model even if a cached response for these inputs exists")
     args = p.parse_args()
 
     return UpdateConfig(
@@ -243,6 +499,9 @@ def parse_args() -> UpdateConfig:
         elements_path=args.elements,
         model=args.model,
         dry_run=args.dry_run,
+        prompt_token_budget=args.token_budget,
+        map_workers=args.map_workers,
+        bypass_llm_cache=args.bypass_llm_cache,
     )
 
 